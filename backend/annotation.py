@@ -0,0 +1,99 @@
+import zlib
+import cv2
+import numpy as np
+from config import *
+
+DEFAULT_COLOR = (0, 255, 0)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_OFFSET = 10  # píxeles entre la línea base del texto y el borde superior de la caja
+
+def label_color(label: str, color_by_label: bool = RENDER_COLOR_BY_LABEL, colors: dict = None):
+    """Color BGR de una etiqueta: configurado, derivado del nombre (estable entre ejecuciones) o verde"""
+    colors = RENDER_LABEL_COLORS if colors is None else colors
+    if label in colors:
+        return tuple(int(channel) for channel in colors[label])
+    if not color_by_label:
+        return DEFAULT_COLOR
+    hue = zlib.crc32(label.encode()) % 180
+    hsv = np.uint8([[[hue, 200, 255]]])
+    return tuple(int(channel) for channel in cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)[0, 0])
+
+class AnnotationRenderer:
+    """Anota frames con cajas y textos pre-renderizados, reutilizable entre frames y videos
+
+    Cada texto "<etiqueta> <confianza>" se rasteriza una sola vez por (etiqueta, centésima
+    de confianza) como sprite de color + máscara y después solo se copia sobre el frame.
+    Las cajas de un frame se dibujan con una llamada a cv2.polylines por color.
+    """
+
+    def __init__(self, labels, thickness: int = RENDER_BOX_THICKNESS, font_scale: float = RENDER_FONT_SCALE,
+                 color_by_label: bool = RENDER_COLOR_BY_LABEL, colors: dict = None):
+        self.labels = list(labels)
+        self.thickness = thickness
+        self.font_scale = font_scale
+        self.colors = [label_color(label, color_by_label, colors) for label in self.labels]
+
+        # Paleta de colores distintos e índice de color por etiqueta
+        self._palette = sorted(set(self.colors)) or [DEFAULT_COLOR]
+        self._label_colors = np.array([self._palette.index(color) for color in self.colors] or [0], dtype=np.intp)
+
+        # Un trazo grueso equivale a rectángulos concéntricos de 1 px (más baratos que líneas gruesas);
+        # cv2.rectangle con grosor t > 1 cubre (t + 1) // 2 píxeles a cada lado del borde
+        half = 0 if thickness <= 1 else (thickness + 1) // 2
+        offsets = np.arange(-half, half + 1)
+        self._ring_offsets = np.stack([
+            np.stack([-offsets, -offsets], axis=1), np.stack([offsets, -offsets], axis=1),
+            np.stack([offsets, offsets], axis=1), np.stack([-offsets, offsets], axis=1)
+        ], axis=1)  # (anillos, 4 esquinas, xy)
+        self._sprites = {}
+
+    def _sprite(self, label_id: int, bucket: int):
+        """(sprite BGR, máscara, desplazamiento x, desplazamiento y) respecto al origen del texto"""
+        key = (label_id, bucket)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            text = f"{self.labels[label_id]} {bucket / 100:.2f}"
+            (width, height), baseline = cv2.getTextSize(text, FONT, self.font_scale, self.thickness)
+            # Margen para el grosor del trazo alrededor del texto
+            pad = self.thickness
+            mask = np.zeros((height + baseline + 2 * pad, width + 2 * pad), dtype=np.uint8)
+            cv2.putText(mask, text, (pad, height + pad), FONT, self.font_scale, 255, self.thickness, cv2.LINE_8)
+            # OpenCV 5 suaviza siempre el texto: la máscara binaria conserva los píxeles con cobertura >= 50 %
+            mask = (mask >= 128).astype(np.uint8)
+            image = np.empty(mask.shape + (3,), dtype=np.uint8)
+            image[:] = self.colors[label_id]
+            sprite = (image, mask, -pad, -(height + pad))
+            self._sprites[key] = sprite
+        return sprite
+
+    def draw(self, frame, rows):
+        """Anotar en el frame los registros de detecciones (label_id, conf, box) de ese frame"""
+        if len(rows) == 0:
+            return frame
+        frame_height, frame_width = frame.shape[:2]
+        boxes = rows["box"].astype(np.int32)
+        label_ids = rows["label_id"].astype(np.intp)
+        x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+
+        # Cajas: esquinas de todos los anillos de todas las cajas y una llamada a polylines por color
+        corners = np.stack([
+            np.stack([x1, y1], axis=1), np.stack([x2, y1], axis=1),
+            np.stack([x2, y2], axis=1), np.stack([x1, y2], axis=1)
+        ], axis=1)  # (cajas, 4, xy)
+        rings = (corners[:, None] + self._ring_offsets[None]).astype(np.int32)  # (cajas, anillos, 4, xy)
+        color_ids = self._label_colors[label_ids]
+        for color_index in np.unique(color_ids).tolist():
+            polygons = rings[color_ids == color_index].reshape(-1, 4, 2)
+            cv2.polylines(frame, list(polygons), True, self._palette[color_index], 1)
+
+        # Textos: copiar el sprite de cada caja recortándolo a los bordes del frame
+        buckets = np.rint(rows["conf"].astype(np.float32) * 100).astype(np.int32)
+        for label_id, bucket, x, y in zip(label_ids.tolist(), buckets.tolist(), x1.tolist(), (y1 - LABEL_OFFSET).tolist()):
+            image, mask, dx, dy = self._sprite(label_id, bucket)
+            sx, sy = x + dx, y + dy
+            cx1, cy1 = max(sx, 0), max(sy, 0)
+            cx2, cy2 = min(sx + mask.shape[1], frame_width), min(sy + mask.shape[0], frame_height)
+            if cx1 < cx2 and cy1 < cy2:
+                region = (slice(cy1 - sy, cy2 - sy), slice(cx1 - sx, cx2 - sx))
+                cv2.copyTo(image[region], mask[region], frame[cy1:cy2, cx1:cx2])
+        return frame
@@ -0,0 +1,319 @@
+import os
+import argparse
+import asyncio
+import logging
+import queue
+import signal
+import socket
+import threading
+import time
+import uuid
+from config import *
+from catalog import is_video_name, record_video
+from database import (
+    BATCH_FINAL_STATES, init_database, create_batch, claim_batch_video, update_batch_video,
+    heartbeat_batch_videos, get_batch
+)
+from versioning import plan_stages
+from gcs import get_blob, list_blobs, NotFound
+from metrics import JOBS, QUEUE_DEPTH
+from jobs import job_registry, current_job, Draining, JobInterrupted
+
+logger = logging.getLogger(__name__)
+
+def batch_status(batch, include_videos: bool = False):
+    """Resumen de un lote (registro de get_batch) con throughput agregado y tiempo estimado restante"""
+    counts = {}
+    frames = 0
+    finished_at = None
+    for video in batch["videos"]:
+        counts[video["state"]] = counts.get(video["state"], 0) + 1
+        if video["state"] == "processed":
+            frames += video["frames"]
+    total = len(batch["videos"])
+    done = sum(counts.get(state, 0) for state in BATCH_FINAL_STATES)
+    if done == total:
+        finished_at = max((video["updated_at"] for video in batch["videos"]), default=batch["created_at"])
+    elapsed = (finished_at or batch["now"]) - batch["created_at"]
+    processed = counts.get("processed", 0)
+
+    # ETA a partir del ritmo observado: las etapas se solapan, así que se mide el lote completo
+    rate = done / elapsed if elapsed > 0 else 0
+    status = {
+        "batch_id": batch["batch_id"],
+        "status": "completed" if finished_at else "processing",
+        "total": total,
+        "done": done,
+        "counts": counts,
+        "progress": round(100 * done / total) if total else 100,
+        "elapsed_seconds": round(elapsed, 1),
+        "throughput": {
+            "videos_per_minute": round(60 * processed / elapsed, 2) if elapsed > 0 else 0,
+            "frames_per_second": round(frames / elapsed, 2) if elapsed > 0 else 0
+        },
+        "eta_seconds": round((total - done) / rate, 1) if rate > 0 and done < total else (0 if done == total else None)
+    }
+    if include_videos:
+        status["videos"] = {
+            video["video_name"]: {field: video[field] for field in ("state", "stages", "frames", "seconds", "error")}
+            for video in batch["videos"]
+        }
+    return status
+
+def submit_batch(videos, force: bool = False) -> str:
+    """Encolar un lote de videos en PostgreSQL y devolver su id (lo procesan los procesos worker)"""
+    batch_id = uuid.uuid4().hex[:12]
+    create_batch(batch_id, videos, force=force)
+    logger.info(f"Batch {batch_id} queued with {len(videos)} videos")
+    return batch_id
+
+def load_batch_status(batch_id: str, include_videos: bool = False):
+    """Estado de un lote desde PostgreSQL (visible desde cualquier worker de la API), o None si no existe"""
+    batch = get_batch(batch_id)
+    return batch_status(batch, include_videos=include_videos) if batch else None
+
+class BatchItem:
+    """Video reclamado por este proceso, de la descarga a la subida"""
+
+    def __init__(self, batch_id: str, video_name: str, force: bool):
+        self.batch_id = batch_id
+        self.video_name = video_name
+        self.force = force
+        self.started = time.time()
+        self.workspace = None
+
+    def update(self, state: str, **fields):
+        update_batch_video(self.batch_id, self.video_name, state, **fields)
+
+class BatchScheduler:
+    """Pool fijo de workers por etapa (descarga → inferencia → render/subida) unidas por colas acotadas
+
+    Se ejecuta en el proceso `python batch.py worker`, no en la API: los workers de descarga
+    reclaman videos de la cola en PostgreSQL y todas las etapas comparten el modelo cargado por
+    inference.get_backend() en este proceso. Las colas acotadas limitan los videos descargados
+    en espera en disco mientras la descarga y la subida de unos videos se solapan con la
+    inferencia de otros. Con el backend 'torch' conviene un único worker de inferencia.
+    """
+
+    def __init__(self, download_workers: int = BATCH_DOWNLOAD_WORKERS, inference_workers: int = BATCH_INFERENCE_WORKERS,
+                 upload_workers: int = BATCH_UPLOAD_WORKERS, prefetch: int = BATCH_PREFETCH,
+                 poll_interval: float = BATCH_POLL_INTERVAL, lease_seconds: int = BATCH_LEASE_SECONDS):
+        self.workers = {"download": download_workers, "inference": inference_workers, "upload": upload_workers}
+        self.inference_queue = queue.Queue(maxsize=prefetch)
+        self.upload_queue = queue.Queue(maxsize=prefetch)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    def start(self):
+        stages = {
+            "download": self._download_worker,
+            "inference": self._inference_worker,
+            "upload": self._upload_worker,
+        }
+        for stage, count in self.workers.items():
+            for index in range(max(1, count)):
+                threading.Thread(target=stages[stage], name=f"batch-{stage}-{index}", daemon=True).start()
+        threading.Thread(target=self._heartbeat, name="batch-heartbeat", daemon=True).start()
+        logger.info(f"Batch worker {self.worker_id} started ({self.workers})")
+
+    def _heartbeat(self):
+        # Los videos de un worker que deja de latir los reclama otro tras lease_seconds
+        while True:
+            time.sleep(self.lease_seconds / 4)
+            try:
+                heartbeat_batch_videos(self.worker_id)
+            except Exception as e:
+                logger.error(f"Batch heartbeat error: {str(e)}")
+
+    def _claim(self):
+        """Siguiente video de la cola; None al drenar o si la cola está vacía"""
+        if job_registry.draining:
+            return None
+        try:
+            claimed = claim_batch_video(self.worker_id, self.lease_seconds)
+        except Exception as e:
+            logger.error(f"Error claiming batch video: {str(e)}")
+            return None
+        return BatchItem(*claimed) if claimed else None
+
+    def _paths(self, item: BatchItem):
+        return item.workspace.path(item.video_name), item.workspace.path(f"processed_{item.video_name}")
+
+    def _fail(self, item: BatchItem, error: Exception):
+        # Los videos que el cierre del worker detiene o no deja empezar vuelven a la cola
+        interrupted = isinstance(error, (Draining, JobInterrupted))
+        logger.error(f"Batch {item.batch_id}: error processing {item.video_name}: {str(error)}")
+        try:
+            record_video(item.video_name, state="interrupted" if interrupted else "error")
+        except Exception as e:
+            logger.error(f"Error recording failure for {item.video_name}: {str(e)}")
+        try:
+            if interrupted:
+                item.update("queued", error=str(error))
+            else:
+                item.update("failed", error=str(error), seconds=round(time.time() - item.started, 1))
+        except Exception as e:
+            logger.error(f"Error updating batch {item.batch_id} for {item.video_name}: {str(e)}")
+        JOBS.labels("interrupted" if interrupted else "failed").inc()
+        self._cleanup(item)
+
+    def _cleanup(self, item: BatchItem):
+        if item.workspace is not None:
+            job_registry.close(item.workspace)
+            item.workspace = None
+
+    def _download_worker(self):
+        from pipeline import fetch_video
+
+        while True:
+            item = self._claim()
+            if item is None:
+                time.sleep(self.poll_interval)
+                continue
+            video_name = item.video_name
+            try:
+                blob = get_blob(ORIGINAL_VIDEOS_BUCKET, video_name)
+                if blob is None:
+                    raise NotFound(f"Video {video_name} not found in original bucket")
+
+                # Omitir los videos cuyas salidas ya corresponden al contenido, modelo y configuración actuales
+                stages, versions = plan_stages(video_name, blob, force=item.force)
+                if not stages:
+                    item.update("skipped", seconds=0)
+                    JOBS.labels("skipped").inc()
+                    continue
+
+                # Directorio propio del video hasta su subida (rechazado al drenar o sin disco)
+                item.workspace = job_registry.open(video_name, size_hint=blob.size or 0)
+
+                probe = None
+                if stages & {"inference", "video", "heatmap"}:
+                    item.update("downloading", stages=sorted(stages))
+                    video_path, _ = self._paths(item)
+                    probe = fetch_video(video_name, video_path, blob)
+                    item.workspace.check_quota()
+                item.update("waiting_inference", stages=sorted(stages),
+                            frames=probe.get("frame_count") or 0 if probe else 0)
+
+                # Bloquea si la etapa de inferencia va por detrás (contrapresión)
+                self.inference_queue.put((item, probe, stages, versions))
+                QUEUE_DEPTH.labels("batch_inference").inc()
+            except Exception as e:
+                self._fail(item, e)
+
+    def _inference_worker(self):
+        from pipeline import prepare_detections
+
+        while True:
+            item, probe, stages, versions = self.inference_queue.get()
+            QUEUE_DEPTH.labels("batch_inference").dec()
+            token = current_job.set(item.workspace)
+            try:
+                item.update("inference")
+                video_path, _ = self._paths(item)
+                detections = prepare_detections(item.video_name, video_path, stages, versions)
+                item.update("waiting_upload")
+                self.upload_queue.put((item, probe, stages, versions, detections))
+                QUEUE_DEPTH.labels("batch_upload").inc()
+            except Exception as e:
+                self._fail(item, e)
+            finally:
+                current_job.reset(token)
+                self.inference_queue.task_done()
+
+    def _upload_worker(self):
+        from pipeline import render_video, publish_heatmap
+
+        async def publish(video_name, video_path, processed_path, probe, stages, versions, detections):
+            if "video" in stages:
+                await render_video(video_name, video_path, processed_path, detections, probe, versions)
+            if "heatmap" in stages:
+                await publish_heatmap(video_name, video_path, probe, detections, versions)
+
+        while True:
+            item, probe, stages, versions, detections = self.upload_queue.get()
+            QUEUE_DEPTH.labels("batch_upload").dec()
+            token = current_job.set(item.workspace)
+            try:
+                item.update("uploading")
+                video_path, processed_path = self._paths(item)
+                asyncio.run(publish(item.video_name, video_path, processed_path, probe, stages, versions, detections))
+                record_video(item.video_name, state="processed")
+                item.update("processed", seconds=round(time.time() - item.started, 1))
+                JOBS.labels("processed").inc()
+                self._cleanup(item)
+            except Exception as e:
+                self._fail(item, e)
+            finally:
+                current_job.reset(token)
+                self.upload_queue.task_done()
+
+def run_worker(metrics_port: int = BATCH_METRICS_PORT):
+    """Proceso worker de lotes: procesa la cola hasta SIGTERM y drena los trabajos en curso"""
+    from prometheus_client import start_http_server
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    init_database()
+    if metrics_port:
+        start_http_server(metrics_port)
+    # Igual que la API: directorios huérfanos de cierres abruptos y drenaje al recibir la marca del preStop
+    job_registry.cleanup_orphans()
+    job_registry.start_drain_watcher()
+    BatchScheduler().start()
+
+    stop.wait()
+    remaining = job_registry.drain()
+    if remaining:
+        logger.warning(f"Batch worker stopping with {remaining} job(s) running; they will be requeued")
+    return remaining
+
+def resolve_videos(videos=None, prefix: str = None):
+    """Lista de videos del lote: nombres explícitos (sin duplicados) y/o todos los del prefijo en GCS"""
+    names = list(dict.fromkeys(videos or []))
+    if prefix is not None:
+        seen = set(names)
+        for blob in list_blobs(ORIGINAL_VIDEOS_BUCKET, prefix=prefix):
+            if is_video_name(blob.name) and blob.name not in seen:
+                names.append(blob.name)
+                seen.add(blob.name)
+    return names
+
+if __name__ == "__main__":
+    logging.basicConfig(level=LOG_LEVEL)
+    parser = argparse.ArgumentParser(description="Lotes de videos: encolarlos o procesarlos con un modelo compartido")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    worker_parser = subparsers.add_parser("worker", help="procesar los videos en cola hasta recibir SIGTERM")
+    worker_parser.add_argument("--metrics-port", type=int, default=BATCH_METRICS_PORT, help="puerto de /metrics (0 = sin métricas)")
+
+    submit_parser = subparsers.add_parser("submit", help="encolar un lote y seguir su progreso")
+    submit_parser.add_argument("videos", nargs="*", help="nombres de los videos en el bucket original")
+    submit_parser.add_argument("--prefix", help="procesar todos los videos con este prefijo")
+    submit_parser.add_argument("--force", action="store_true", help="reprocesar aunque ya estén procesados")
+    submit_parser.add_argument("--interval", type=float, default=10, help="segundos entre informes de progreso")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        run_worker(args.metrics_port)
+        raise SystemExit(0)
+
+    names = resolve_videos(args.videos, args.prefix)
+    if not names:
+        parser.error("no videos to process")
+
+    batch_id = submit_batch(names, force=args.force)
+    print(f"Batch {batch_id} queued with {len(names)} videos", flush=True)
+    while True:
+        status = load_batch_status(batch_id)
+        eta = f"{status['eta_seconds']}s" if status["eta_seconds"] is not None else "?"
+        print(f"[{status['done']}/{status['total']}] {status['counts']} "
+              f"{status['throughput']['videos_per_minute']} videos/min, "
+              f"{status['throughput']['frames_per_second']} fps, ETA {eta}", flush=True)
+        if status["status"] == "completed":
+            break
+        time.sleep(args.interval)
+    raise SystemExit(1 if status["counts"].get("failed") else 0)
@@ -0,0 +1,95 @@
+"""Comparar memoria y tiempo de lectura de detecciones: JSON anidado vs formato binario columnar
+
+Uso (desde backend/):
+    python benchmarks/bench_detections_format.py --frames 27000 --objects 8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detections import encode_detections, to_bytes, from_buffer, save, open_memmap, summarize_by_label
+
+LABELS = ["person", "car", "bicycle", "truck", "dog", "bus"]
+
+def synthetic_metadata(frames: int, objects: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    metadata = []
+    for frame in range(frames):
+        detections = []
+        for _ in range(objects):
+            x1, y1 = rng.integers(0, 3000, 2)
+            w, h = rng.integers(10, 400, 2)
+            detections.append({
+                "label": LABELS[int(rng.integers(len(LABELS)))],
+                "confidence": float(rng.uniform(0.3, 1.0)),
+                "coordinates": [[int(x1), int(y1), int(x1 + w), int(y1 + h)]]
+            })
+        metadata.append({"frame": frame, "objects": detections})
+    return metadata
+
+def measure(fn, repeat: int = 3):
+    """Devolver (segundos mínimos, pico de memoria en bytes, resultado)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+def json_summary(metadata):
+    """Resumen por etiqueta recorriendo la estructura JSON (como el código original)"""
+    summary = {}
+    for detection in metadata:
+        for obj in detection["objects"]:
+            entry = summary.setdefault(obj["label"], [0, 0.0])
+            entry[0] += 1
+            entry[1] += obj["confidence"]
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=27000, help="frames con detecciones (15 min a 30 fps)")
+    parser.add_argument("--objects", type=int, default=8, help="cajas por frame")
+    args = parser.parse_args()
+
+    metadata = synthetic_metadata(args.frames, args.objects)
+    json_text = json.dumps(metadata)
+    blob = to_bytes(encode_detections(metadata))
+    total = args.frames * args.objects
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "detections.bin")
+        save(path, from_buffer(blob))
+
+        rows = [
+            ("json.loads", *measure(lambda: json.loads(json_text))),
+            ("from_buffer (bytes)", *measure(lambda: from_buffer(blob))),
+            ("open_memmap (archivo)", *measure(lambda: open_memmap(path))),
+        ]
+        parsed = json.loads(json_text)
+        summaries = [
+            ("resumen JSON", *measure(lambda: json_summary(parsed))),
+            ("resumen binario", *measure(lambda: summarize_by_label(from_buffer(blob)))),
+        ]
+
+    print(f"Detecciones: {total} ({args.frames} frames x {args.objects})")
+    print(f"Tamaño JSON:    {len(json_text) / 1e6:8.2f} MB ({len(json_text) / total:.0f} B/caja)")
+    print(f"Tamaño binario: {len(blob) / 1e6:8.2f} MB ({len(blob) / total:.0f} B/caja)")
+    print()
+    print(f"{'operación':<24}{'tiempo (ms)':>14}{'pico memoria (MB)':>20}")
+    for name, seconds, peak, _ in rows + summaries:
+        print(f"{name:<24}{seconds * 1000:>14.2f}{peak / 1e6:>20.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""Benchmark de extremo a extremo: subida → procesamiento → heatmap → búsqueda → streaming
+
+Ejecuta la API completa en proceso (TestClient) contra almacenamiento local
+(GCS_BACKEND=local, un directorio por bucket) y un PostgreSQL local, con videos
+sintéticos de duración y densidad de objetos configurables. Registra throughput,
+percentiles de latencia por paso y pico de RSS en JSON; con --baseline compara con
+una ejecución anterior y termina con error si alguna métrica empeora más que la tolerancia.
+
+Por defecto las detecciones salen de un detector sintético (segmentación por color de
+los objetos dibujados) para medir el pipeline sin el modelo; --detector model usa el
+backend configurado (INFERENCE_BACKEND).
+
+Requiere ffmpeg (ffprobe es opcional: sin él las propiedades se leen con OpenCV), las
+dependencias de requirements-dev.txt (httpx para TestClient) y un PostgreSQL accesible con
+las variables POSTGRES_*; la base de datos de benchmark se vacía al empezar, p. ej.:
+    docker run -d -p 5432:5432 -e POSTGRES_PASSWORD=angely -e POSTGRES_DB=video_detection_bench postgres:15
+
+benchmarks/baseline.json es una ejecución con los valores por defecto en un contenedor de
+1 CPU (detector sintético, sin ffprobe); en otra máquina conviene regenerarla antes de comparar.
+
+Uso (desde backend/):
+    python benchmarks/bench_e2e.py --videos 3 --seconds 10 --objects 20 --output results.json
+    python benchmarks/bench_e2e.py --output benchmarks/baseline.json        # nueva línea base
+    python benchmarks/bench_e2e.py --baseline benchmarks/baseline.json --tolerance 0.2
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+LABELS = ["person", "car", "bicycle", "dog", "truck", "bus"]
+# Colores saturados bien separados: el detector sintético los segmenta con cv2.inRange
+COLORS = [(0, 0, 255), (0, 255, 0), (255, 0, 0), (0, 255, 255), (255, 0, 255), (255, 255, 0)]
+COLOR_TOLERANCE = 60
+BACKGROUND = 40
+
+# Percentiles de latencia comparados con la línea base
+LATENCY_KEYS = ("p50", "p95")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--videos", type=int, default=3, help="videos sintéticos a procesar")
+    parser.add_argument("--seconds", type=float, default=10, help="duración de cada video")
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--objects", type=int, default=10, help="objetos en movimiento por frame (densidad)")
+    parser.add_argument("--requests", type=int, default=20, help="peticiones de lectura por video y paso")
+    parser.add_argument("--warmup", type=int, default=1, help="videos procesados antes de medir")
+    parser.add_argument("--detector", choices=["synthetic", "model"], default="synthetic")
+    parser.add_argument("--postgres-db", default=os.getenv("POSTGRES_DB", "video_detection_bench"))
+    parser.add_argument("--workdir", help="directorio de trabajo (por defecto uno temporal)")
+    parser.add_argument("--keep", action="store_true", help="conservar el almacenamiento local al terminar")
+    parser.add_argument("--output", help="guardar los resultados en este JSON")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior con el que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="empeoramiento relativo permitido")
+    return parser.parse_args()
+
+def configure_environment(args, workdir):
+    """Variables de entorno antes de importar config: almacenamiento local y base de datos de benchmark"""
+    os.environ["GCS_BACKEND"] = "local"
+    os.environ["GCS_LOCAL_ROOT"] = os.path.join(workdir, "gcs")
+    os.environ["POSTGRES_DB"] = args.postgres_db
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["PROFILE_JOBS"] = "false"
+    if args.detector == "synthetic":
+        # Los procesos de segmentos no heredan el detector sintético
+        os.environ["SEGMENT_WORKERS"] = "0"
+
+def write_synthetic_video(path, args, seed: int):
+    """Video con `objects` rectángulos de color que rebotan por el frame"""
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    count = args.objects
+    sizes = rng.integers(30, max(31, min(args.width, args.height) // 5), (count, 2))
+    positions = rng.uniform(0, 1, (count, 2)) * (np.array([args.width, args.height]) - sizes)
+    velocities = rng.uniform(-6, 6, (count, 2))
+    classes = rng.integers(0, len(LABELS), count)
+
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), args.fps, (args.width, args.height))
+    frames = int(args.seconds * args.fps)
+    limits = np.array([args.width, args.height]) - sizes
+    for _ in range(frames):
+        frame = np.full((args.height, args.width, 3), BACKGROUND, dtype=np.uint8)
+        for (x, y), (w, h), cls in zip(positions.astype(int).tolist(), sizes.tolist(), classes.tolist()):
+            cv2.rectangle(frame, (x, y), (x + w, y + h), COLORS[cls], -1)
+        writer.write(frame)
+        positions += velocities
+        bounced = (positions < 0) | (positions > limits)
+        velocities[bounced] *= -1
+        positions = np.clip(positions, 0, limits)
+    writer.release()
+    return frames
+
+def install_synthetic_detector():
+    """Registrar como backend del proceso un detector por color de los objetos sintéticos"""
+    import cv2
+    import numpy as np
+    import config
+    import inference
+
+    class SyntheticBackend(inference.InferenceBackend):
+        name = "synthetic"
+
+        def __init__(self):
+            super().__init__(config.MODEL_PATH)
+            self.names = dict(enumerate(LABELS))
+
+        def predict(self, images, imgsz=None):
+            outputs = []
+            for image in images:
+                boxes = []
+                for cls, color in enumerate(COLORS):
+                    low = np.clip(np.array(color) - COLOR_TOLERANCE, 0, 255).astype(np.uint8)
+                    high = np.clip(np.array(color) + COLOR_TOLERANCE, 0, 255).astype(np.uint8)
+                    mask = cv2.inRange(image, low, high)
+                    count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+                    for x, y, w, h, area in stats[1:count].tolist():
+                        if area >= 100:
+                            boxes.append((x, y, x + w, y + h, 0.9, cls))
+                outputs.append(np.array(boxes, dtype=np.float32).reshape(-1, 6))
+            return outputs
+
+    inference._backends[(config.INFERENCE_BACKEND, config.INFERENCE_INT8)] = SyntheticBackend()
+
+def reset_database(db_name: str):
+    """Vaciar la base de datos de benchmark: cada ejecución parte del mismo catálogo (la búsqueda recorre todos los videos)"""
+    if "bench" not in db_name:
+        sys.exit(f"Refusing to reset database {db_name}: use a dedicated benchmark database (--postgres-db)")
+    from database import get_db_connection, init_database
+
+    init_database()
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("TRUNCATE metadata, video_catalog, video_probe, batch_jobs, batch_videos")
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+def percentiles(samples):
+    import numpy as np
+
+    if not samples:
+        return {"count": 0}
+    values = np.array(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean": round(float(values.mean()), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run(args, workdir):
+    from fastapi.testclient import TestClient
+    import main
+
+    reset_database(args.postgres_db)
+    if args.detector == "synthetic":
+        install_synthetic_detector()
+
+    steps = ["upload", "process", "heatmap_status", "heatmap_download", "search", "objects", "stream"]
+    latencies = {step: [] for step in steps}
+    errors = []
+    frames_processed = 0
+    bytes_streamed = 0
+
+    def request(step, method, url, record=True, **kwargs):
+        start = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            errors.append({"step": step, "url": url, "status": response.status_code, "body": response.text[:200]})
+        elif record:
+            latencies[step].append(elapsed)
+        return response
+
+    with TestClient(main.app) as client:
+        for index in range(args.warmup + args.videos):
+            record = index >= args.warmup
+            video_name = f"bench_{os.getpid()}_{index:03d}.mp4"
+            video_path = os.path.join(workdir, video_name)
+            frames = write_synthetic_video(video_path, args, seed=index)
+
+            with open(video_path, "rb") as f:
+                request("upload", "POST", "/api/videos/upload", record,
+                        files={"file": (video_name, f, "video/mp4")})
+
+            # TestClient ejecuta la tarea en segundo plano antes de devolver la respuesta:
+            # la latencia de este paso es el procesamiento completo (descarga, inferencia, render, heatmap)
+            request("process", "GET", f"/api/videos/process/{video_name}", record, params={"force": True})
+            status = client.get(f"/api/videos/status/{video_name}").json()
+            if status.get("status") != "completed":
+                errors.append({"step": "process", "url": video_name, "status": status.get("step")})
+            elif record:
+                frames_processed += frames
+
+            for _ in range(args.requests if record else 1):
+                request("heatmap_status", "GET", f"/api/heatmap/{video_name}", record)
+                request("heatmap_download", "GET", f"/api/heatmap/download/{video_name}", record)
+                request("search", "GET", f"/api/metadata/search/{LABELS[0]}", record)
+                request("objects", "GET", f"/api/metadata/objects/{video_name}", record)
+                response = request("stream", "GET", f"/api/videos/stream/{video_name}", record)
+                if record:
+                    bytes_streamed += len(response.content)
+            os.remove(video_path)
+
+    process_seconds = sum(latencies["process"])
+    pipeline_seconds = process_seconds + sum(latencies["upload"])
+    stream_seconds = sum(latencies["stream"])
+    return {
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "baseline", "workdir", "keep", "tolerance")},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "git_commit": git_commit(),
+        },
+        "latency_ms": {step: percentiles(samples) for step, samples in latencies.items()},
+        "throughput": {
+            "process_fps": round(frames_processed / process_seconds, 2) if process_seconds else 0,
+            "videos_per_minute": round(60 * len(latencies["process"]) / pipeline_seconds, 2) if pipeline_seconds else 0,
+            "stream_mb_per_s": round(bytes_streamed / 1024 / 1024 / stream_seconds, 2) if stream_seconds else 0,
+        },
+        "peak_rss_mb": {
+            "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        },
+        "errors": errors,
+    }
+
+def compare(results, baseline, tolerance: float):
+    """Métricas que empeoran más que la tolerancia respecto a la línea base"""
+    checks = []
+    for step, stats in baseline.get("latency_ms", {}).items():
+        for key in LATENCY_KEYS:
+            if key in stats and key in results["latency_ms"].get(step, {}):
+                checks.append((f"latency_ms.{step}.{key}", stats[key], results["latency_ms"][step][key], False))
+    for key, value in baseline.get("throughput", {}).items():
+        checks.append((f"throughput.{key}", value, results["throughput"].get(key, 0), True))
+    for key, value in baseline.get("peak_rss_mb", {}).items():
+        checks.append((f"peak_rss_mb.{key}", value, results["peak_rss_mb"].get(key, 0), False))
+
+    regressions = []
+    print(f"\n{'métrica':<36} {'base':>10} {'actual':>10} {'cambio':>8}")
+    for name, base, current, higher_is_better in checks:
+        change = (current - base) / base if base else 0.0
+        worse = -change if higher_is_better else change
+        flag = "  REGRESIÓN" if worse > tolerance else ""
+        print(f"{name:<36} {base:>10} {current:>10} {change:>+8.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main():
+    args = parse_args()
+    if shutil.which("ffmpeg") is None:
+        sys.exit("ffmpeg is required for the end-to-end benchmark")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_e2e_")
+    os.makedirs(workdir, exist_ok=True)
+    configure_environment(args, workdir)
+    try:
+        results = run(args, workdir)
+    finally:
+        if not args.keep:
+            shutil.rmtree(os.path.join(workdir, "gcs"), ignore_errors=True)
+
+    print(json.dumps({key: results[key] for key in ("latency_ms", "throughput", "peak_rss_mb")}, indent=2))
+    if results["errors"]:
+        print(f"\n{len(results['errors'])} errores; el primero: {results['errors'][0]}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    sys.exit(1 if regressions or results["errors"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark de backends de inferencia: fps y memoria residente (RSS) por backend
+
+Cada backend se mide en un proceso aparte (como un worker de uvicorn) para que
+la memoria de torch u ONNX Runtime no se mezcle entre mediciones. Los modelos
+exportados se generan una vez con `python inference.py <backend> [--int8]`.
+
+Uso (desde backend/):
+    python benchmarks/bench_inference_backends.py --video ../videos/ejemplo.mp4 --frames 200
+    python benchmarks/bench_inference_backends.py --backends torch onnx onnx-int8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def rss_mb():
+    """Pico de memoria residente del proceso en MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def load_frames(video, count, width, height):
+    import numpy as np
+
+    if video:
+        import cv2
+
+        cap = cv2.VideoCapture(video)
+        frames = []
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        return frames
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+def run_worker(spec, args):
+    """Medir un backend dentro del proceso actual e imprimir el resultado en JSON"""
+    backend_name, _, variant = spec.partition("-")
+    int8 = variant == "int8"
+    frames = load_frames(args.video, args.frames, args.width, args.height)
+    rss_frames = rss_mb()
+
+    from inference import get_backend
+
+    start = time.perf_counter()
+    backend = get_backend(backend_name, int8=int8)
+    load_time = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    backend.predict(frames[:1])  # calentamiento
+    detections = 0
+    start = time.perf_counter()
+    for frame in frames:
+        detections += len(backend.predict([frame])[0])
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "backend": spec,
+        "load_s": round(load_time, 2),
+        "fps": round(len(frames) / elapsed, 2),
+        "detections": detections,
+        "rss_model_mb": round(rss_loaded - rss_frames, 1),
+        "rss_peak_mb": round(rss_mb(), 1),
+        "torch_imported": "torch" in sys.modules
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8", "openvino"])
+    parser.add_argument("--video", help="video de entrada (por defecto, frames sintéticos)")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--threads", type=int, help="hilos de inferencia (INFERENCE_THREADS)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args)
+        return
+
+    env = dict(os.environ)
+    if args.threads:
+        env["INFERENCE_THREADS"] = str(args.threads)
+        env["OMP_NUM_THREADS"] = str(args.threads)
+
+    print(f"{'backend':<12} {'carga (s)':>10} {'fps':>8} {'detecciones':>12} {'RSS modelo (MB)':>16} {'RSS pico (MB)':>14} {'torch':>6}")
+    for spec in args.backends:
+        command = [sys.executable, os.path.abspath(__file__), "--worker", spec,
+                   "--frames", str(args.frames), "--width", str(args.width), "--height", str(args.height)]
+        if args.video:
+            command += ["--video", args.video]
+        result = subprocess.run(command, capture_output=True, text=True, env=env)
+        if result.returncode != 0:
+            error = (result.stderr.strip().splitlines() or ["error"])[-1]
+            print(f"{spec:<12} falló: {error}")
+            continue
+        r = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{r['backend']:<12} {r['load_s']:>10} {r['fps']:>8} {r['detections']:>12} "
+              f"{r['rss_model_mb']:>16} {r['rss_peak_mb']:>14} {str(r['torch_imported']):>6}")
+
+if __name__ == "__main__":
+    main()
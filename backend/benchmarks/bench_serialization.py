@@ -0,0 +1,84 @@
+"""Micro-benchmark de serialización JSON para una carga de 100k detecciones
+
+Compara json (estándar), el camino por defecto de FastAPI (jsonable_encoder + json),
+orjson y el paso directo del texto JSONB de Postgres (orjson.Fragment).
+
+Uso (desde backend/):
+    python benchmarks/bench_serialization.py --detections 100000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serialization import dumps, loads, raw_json
+
+def synthetic_metadata(total: int, per_frame: int = 10, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    metadata = []
+    for frame in range(total // per_frame):
+        metadata.append({
+            "frame": frame,
+            "objects": [
+                {
+                    "label": "person",
+                    "confidence": float(rng.uniform(0.3, 1.0)),
+                    "coordinates": [[int(v) for v in rng.integers(0, 1920, 4)]]
+                }
+                for _ in range(per_frame)
+            ]
+        })
+    return metadata
+
+def timeit(fn, repeat: int = 5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--detections", type=int, default=100000)
+    args = parser.parse_args()
+
+    metadata = synthetic_metadata(args.detections)
+    response = {"metadata": metadata, "status": "found"}
+    jsonb_text = json.dumps(metadata)  # lo que devuelve Postgres con metadata::text
+
+    cases = [
+        ("json.dumps", lambda: json.dumps(response).encode()),
+        ("orjson (serialization.dumps)", lambda: dumps(response)),
+        ("JSONB: json.loads + json.dumps", lambda: json.dumps({"metadata": json.loads(jsonb_text)}).encode()),
+        ("JSONB: orjson loads + dumps", lambda: dumps({"metadata": loads(jsonb_text)})),
+        ("JSONB: paso directo (Fragment)", lambda: dumps({"metadata": raw_json(jsonb_text)})),
+    ]
+    try:
+        from fastapi.encoders import jsonable_encoder
+        cases.insert(1, ("FastAPI jsonable_encoder + json", lambda: json.dumps(jsonable_encoder(response)).encode()))
+    except ImportError:
+        pass
+
+    # Detecciones con tipos NumPy (como salen del modelo) solo las serializa orjson directamente
+    numpy_metadata = [
+        {"frame": np.int64(d["frame"]), "objects": [
+            {"label": o["label"], "confidence": np.float32(o["confidence"]),
+             "coordinates": np.array(o["coordinates"], dtype=np.int32)}
+            for o in d["objects"]
+        ]}
+        for d in metadata
+    ]
+    cases.append(("orjson con tipos NumPy", lambda: dumps({"metadata": numpy_metadata})))
+
+    print(f"Carga: {args.detections} detecciones, {len(jsonb_text) / 1e6:.1f} MB de JSON")
+    print(f"{'caso':<36}{'tiempo (ms)':>12}")
+    for name, fn in cases:
+        print(f"{name:<36}{timeit(fn) * 1000:>12.1f}")
+
+if __name__ == "__main__":
+    main()
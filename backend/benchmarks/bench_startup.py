@@ -0,0 +1,90 @@
+"""Tiempo de importación y memoria (RSS) por punto de entrada de la API
+
+Cada módulo se importa en un intérprete nuevo con `-X importtime`, como haría un
+worker de uvicorn al arrancar. Se muestra el tiempo total, el pico de RSS, los
+módulos más costosos y si se cargó alguna pila pesada (torch, ultralytics, cv2, ...).
+`main` ejecuta init_database() al importarse, por lo que se miden sus routers.
+
+Uso (desde backend/):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --check   # falla si la API importa la pila de ML
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Puntos de entrada de la API y, como referencia, del worker de procesamiento
+API_ENTRY_POINTS = ["serialization", "catalog", "metadata_routes", "heatmap", "video_routes"]
+JOB_ENTRY_POINTS = ["pipeline"]
+HEAVY_MODULES = ["torch", "ultralytics", "cv2", "onnxruntime", "openvino"]
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": [name for name in {heavy!r} if name in sys.modules]
+}}))
+"""
+
+def parse_importtime(stderr, module, top):
+    """Dependencias directas del módulo con mayor tiempo acumulado según -X importtime"""
+    children = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|", 2)
+        # Cada nivel de anidamiento añade dos espacios; los hijos se listan antes que su padre
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative_us) / 1000, name.strip()))
+        elif depth == 0:
+            if name.strip() == module:
+                return sorted(children, reverse=True)[:top]
+            children = []
+    return []
+
+def measure(module, top):
+    command = [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=BACKEND_DIR)
+    if result.returncode != 0:
+        error = (result.stderr.strip().splitlines() or ["error"])[-1]
+        return {"module": module, "error": error}
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    measurement["module"] = module
+    measurement["top"] = parse_importtime(result.stderr, module, top)
+    return measurement
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=API_ENTRY_POINTS + JOB_ENTRY_POINTS)
+    parser.add_argument("--top", type=int, default=5, help="módulos más costosos a mostrar")
+    parser.add_argument("--check", action="store_true", help="fallar si un punto de entrada de la API carga la pila de ML")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'módulo':<18} {'import (s)':>11} {'RSS (MB)':>9}  pilas pesadas")
+    for module in args.modules:
+        m = measure(module, args.top)
+        if "error" in m:
+            print(f"{module:<18} falló: {m['error']}")
+            continue
+        print(f"{module:<18} {m['seconds']:>11.3f} {m['rss_mb']:>9.1f}  {', '.join(m['heavy']) or '-'}")
+        for cumulative_ms, name in m["top"]:
+            print(f"{'':<20}{cumulative_ms:>9.1f} ms  {name}")
+        if module in API_ENTRY_POINTS and m["heavy"]:
+            failures.append(module)
+
+    if args.check and failures:
+        print(f"La API importa la pila de ML en: {', '.join(failures)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
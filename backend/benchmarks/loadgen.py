@@ -0,0 +1,229 @@
+"""Generador de carga: navegadores consultando /status, viendo videos y pidiendo objetos
+
+Reproduce contra un backend en ejecución la mezcla de tráfico real: muchos clientes
+que consultan /api/videos/status cada segundo (como el frontend), espectadores que
+descargan /api/videos/stream, clientes de /api/metadata/objects y unos pocos videos
+procesándose a la vez. Informa p50/p95/p99 y tasa de errores por endpoint y el retraso
+del event loop de los workers de uvicorn, leído de /metrics antes y después de la carga.
+
+Para reproducir el pod de kubernetes/backend-deployment.yaml (4 workers, 500m de CPU):
+    docker run --cpus 0.5 -p 8000:8000 ... video-detection-backend
+
+Requiere httpx (pip install -r requirements-dev.txt).
+
+Uso (desde backend/):
+    python benchmarks/loadgen.py --url http://localhost:8000 --pollers 50 --viewers 10 \\
+        --object-clients 10 --processing 2 --duration 60 --output load.json
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import httpx
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
+
+LAG_METRIC = "event_loop_lag_seconds"
+
+class Stats:
+    """Latencias (s) y errores por endpoint"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.bytes = 0
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies.setdefault(endpoint, [])
+        self.errors.setdefault(endpoint, 0)
+        if ok:
+            self.latencies[endpoint].append(seconds)
+        else:
+            self.errors[endpoint] += 1
+
+    def report(self, elapsed: float):
+        report = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            samples = np.array(self.latencies.get(endpoint, [])) * 1000
+            errors = self.errors.get(endpoint, 0)
+            total = len(samples) + errors
+            report[endpoint] = {
+                "requests": total,
+                "rps": round(total / elapsed, 2),
+                "error_rate": round(errors / total, 4) if total else 0,
+                "p50_ms": round(float(np.percentile(samples, 50)), 1) if len(samples) else None,
+                "p95_ms": round(float(np.percentile(samples, 95)), 1) if len(samples) else None,
+                "p99_ms": round(float(np.percentile(samples, 99)), 1) if len(samples) else None,
+            }
+        return report
+
+async def timed(client, stats: Stats, endpoint: str, url: str, ttfb_endpoint: str = None):
+    """Petición GET completa; opcionalmente registra también el tiempo hasta el primer byte"""
+    start = time.perf_counter()
+    try:
+        async with client.stream("GET", url) as response:
+            first_byte = None
+            async for chunk in response.aiter_bytes():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                stats.bytes += len(chunk)
+            ok = response.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+        first_byte = None
+    stats.record(endpoint, time.perf_counter() - start, ok)
+    if ttfb_endpoint:
+        stats.record(ttfb_endpoint, first_byte if first_byte is not None else 0, ok and first_byte is not None)
+
+async def poller(client, stats, videos, deadline, interval):
+    """Navegador con un video en proceso: /status cada `interval` segundos"""
+    video = random.choice(videos)
+    while time.monotonic() < deadline:
+        await timed(client, stats, "status", f"/api/videos/status/{video}")
+        await asyncio.sleep(interval)
+
+async def viewer(client, stats, videos, deadline, think):
+    """Espectador: descarga completa del video y pausa antes del siguiente"""
+    while time.monotonic() < deadline:
+        await timed(client, stats, "stream", f"/api/videos/stream/{random.choice(videos)}", ttfb_endpoint="stream_ttfb")
+        await asyncio.sleep(random.uniform(0, think))
+
+async def objects_client(client, stats, videos, deadline, think):
+    """Panel de búsqueda: lista de objetos de un video"""
+    while time.monotonic() < deadline:
+        await timed(client, stats, "objects", f"/api/metadata/objects/{random.choice(videos)}")
+        await asyncio.sleep(random.uniform(0, think))
+
+async def loop_lag(samples, deadline, interval=0.1):
+    """Retraso del event loop del propio generador: si es alto, el cliente es el cuello de botella"""
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+async def scrape_lag(client):
+    """Buckets acumulados, suma y conteo del histograma de retraso del loop en /metrics"""
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except httpx.HTTPError:
+        return None
+    buckets, total, count, last = {}, 0.0, 0.0, None
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            if sample.name == f"{LAG_METRIC}_bucket":
+                buckets[float(sample.labels["le"])] = buckets.get(float(sample.labels["le"]), 0) + sample.value
+            elif sample.name == f"{LAG_METRIC}_sum":
+                total += sample.value
+            elif sample.name == f"{LAG_METRIC}_count":
+                count += sample.value
+            elif sample.name == "event_loop_lag_last_seconds":
+                last = sample.value
+    return {"buckets": buckets, "sum": total, "count": count, "last": last}
+
+def lag_report(before, after):
+    """Percentiles (cota superior del bucket) del retraso del loop durante la carga"""
+    if not before or not after or not after["buckets"]:
+        return None
+    count = after["count"] - before["count"]
+    if count <= 0:
+        return None
+    bounds = sorted(after["buckets"])
+    deltas = [after["buckets"][bound] - before["buckets"].get(bound, 0) for bound in bounds]
+
+    def quantile(q):
+        for bound, cumulative in zip(bounds, deltas):
+            if cumulative >= q * count:
+                return bound * 1000 if bound != float("inf") else None
+        return None
+
+    return {
+        "samples": int(count),
+        "mean_ms": round(1000 * (after["sum"] - before["sum"]) / count, 2),
+        "p50_ms_le": quantile(0.5),
+        "p95_ms_le": quantile(0.95),
+        "p99_ms_le": quantile(0.99),
+        "last_max_ms": round(after["last"] * 1000, 2) if after["last"] is not None else None,
+    }
+
+async def resolve_videos(client, videos, limit):
+    if videos:
+        return videos
+    response = await client.get("/api/videos/available-videos", params={"limit": limit})
+    response.raise_for_status()
+    data = response.json()
+    items = data.get("videos", data) if isinstance(data, dict) else data
+    return [item["name"] if isinstance(item, dict) else item for item in items]
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.pollers + args.viewers + args.object_clients + args.processing + 2)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        videos = await resolve_videos(client, args.videos, args.video_limit)
+        if not videos:
+            sys.exit("no videos available on the backend")
+
+        stats = Stats()
+        before = await scrape_lag(client)
+
+        # Unos pocos videos en proceso durante la carga
+        for video in random.sample(videos, min(args.processing, len(videos))):
+            await timed(client, stats, "process", f"/api/videos/process/{video}?force=true")
+
+        start = time.monotonic()
+        deadline = start + args.duration
+        own_lag = []
+        tasks = [loop_lag(own_lag, deadline)]
+        tasks += [poller(client, stats, videos, deadline, args.poll_interval) for _ in range(args.pollers)]
+        tasks += [viewer(client, stats, videos, deadline, args.think) for _ in range(args.viewers)]
+        tasks += [objects_client(client, stats, videos, deadline, args.think) for _ in range(args.object_clients)]
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - start
+
+        after = await scrape_lag(client)
+        return {
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "elapsed_seconds": round(elapsed, 1),
+            "endpoints": stats.report(elapsed),
+            "received_mb": round(stats.bytes / 1024 / 1024, 1),
+            "server_event_loop_lag": lag_report(before, after),
+            "client_event_loop_lag_p99_ms": round(float(np.percentile(own_lag, 99)) * 1000, 1) if own_lag else None,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--videos", nargs="*", help="videos a usar (por defecto los del catálogo)")
+    parser.add_argument("--video-limit", type=int, default=20, help="videos tomados del catálogo")
+    parser.add_argument("--duration", type=float, default=60, help="segundos de carga")
+    parser.add_argument("--pollers", type=int, default=50, help="clientes consultando /status")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="segundos entre consultas (frontend: 1 s)")
+    parser.add_argument("--viewers", type=int, default=10, help="clientes descargando /stream")
+    parser.add_argument("--object-clients", type=int, default=10, help="clientes pidiendo /objects")
+    parser.add_argument("--think", type=float, default=2.0, help="pausa máxima entre peticiones de un cliente")
+    parser.add_argument("--processing", type=int, default=2, help="videos a (re)procesar durante la carga")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="guardar el informe en este JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    print(f"{'endpoint':<14} {'peticiones':>10} {'rps':>8} {'errores':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, row in report["endpoints"].items():
+        print(f"{endpoint:<14} {row['requests']:>10} {row['rps']:>8} {row['error_rate']:>8.2%} "
+              f"{row['p50_ms'] or '-':>9} {row['p95_ms'] or '-':>9} {row['p99_ms'] or '-':>9}")
+    lag = report["server_event_loop_lag"]
+    if lag:
+        print(f"\nRetraso del event loop (servidor): media {lag['mean_ms']} ms, p50 ≤ {lag['p50_ms_le']} ms, "
+              f"p95 ≤ {lag['p95_ms_le']} ms, p99 ≤ {lag['p99_ms_le']} ms ({lag['samples']} muestras)")
+    else:
+        print("\nRetraso del event loop (servidor): sin datos en /metrics")
+    print(f"Retraso del event loop (generador) p99: {report['client_event_loop_lag_p99_ms']} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import asyncio
+import base64
+import json
+import logging
+from config import *
+from database import upsert_catalog_entry, list_catalog, count_catalog, claim_catalog_reconcile, sync_catalog
+from gcs import list_blobs
+
+logger = logging.getLogger(__name__)
+
+def is_video_name(name: str) -> bool:
+    """Verificar si un nombre de objeto tiene una extensión de video permitida"""
+    return name.lower().endswith(tuple(ALLOWED_EXTENSIONS))
+
+def encode_cursor(key) -> str:
+    """Codificar la clave (valor de ordenación, nombre) de la última fila como cursor opaco"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+def decode_cursor(cursor: str):
+    """Decodificar un cursor generado por encode_cursor"""
+    try:
+        sort_value, video_name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return sort_value, video_name
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def get_catalog_page(limit: int, sort: str = "name", descending: bool = False, cursor: str = None):
+    """Obtener una página del catálogo y el cursor de la siguiente"""
+    after = decode_cursor(cursor) if cursor else None
+    items, next_key = list_catalog(limit, sort=sort, descending=descending, after=after)
+    return items, encode_cursor(next_key) if next_key else None
+
+def catalog_size() -> int:
+    """Total de videos del catálogo, independiente de la página solicitada"""
+    return count_catalog()
+
+def record_video(video_name: str, **fields):
+    """Registrar en el catálogo un cambio de un video (subida, procesamiento, propiedades)"""
+    if not upsert_catalog_entry(video_name, **fields):
+        logger.warning(f"No se pudo actualizar el catálogo para {video_name}")
+
+def reconcile_catalog():
+    """Reconciliar el catálogo con el bucket de originales si le toca a este worker"""
+    listed_since = claim_catalog_reconcile(CATALOG_RECONCILE_INTERVAL)
+    if listed_since is None:
+        return None
+
+    entries = [
+        (blob.name, blob.size or 0, blob.generation)
+        for blob in list_blobs(ORIGINAL_VIDEOS_BUCKET)
+        if is_video_name(blob.name)
+    ]
+    removed = sync_catalog(entries, listed_since)
+    logger.info(f"Catálogo reconciliado: {len(entries)} videos, {removed} eliminados")
+    return len(entries)
+
+async def catalog_reconciler_loop():
+    """Tarea periódica que mantiene el catálogo sincronizado con GCS"""
+    while True:
+        try:
+            await asyncio.to_thread(reconcile_catalog)
+        except Exception as e:
+            logger.error(f"Error reconciliando el catálogo: {str(e)}")
+        await asyncio.sleep(CATALOG_RECONCILE_INTERVAL)
@@ -1,4 +1,5 @@
 import os
+import json
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -14,6 +15,8 @@ ORIGINAL_VIDEOS_BUCKET = os.getenv('ORIGINAL_VIDEOS_BUCKET', 'video-detection-or
 PROCESSED_VIDEOS_BUCKET = os.getenv('PROCESSED_VIDEOS_BUCKET', 'video-detection-processed-2024')
 HEATMAPS_BUCKET = os.getenv('HEATMAPS_BUCKET', 'video-detection-heatmaps-2024')
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', 'service-account-key.json')
+GCS_BACKEND = os.getenv('GCS_BACKEND', 'gcs')  # 'gcs' o 'local' (buckets como directorios, para desarrollo y benchmarks)
+GCS_LOCAL_ROOT = Path(os.getenv('GCS_LOCAL_ROOT', str(BASE_DIR / "local_gcs")))
 
 # Configuración de PostgreSQL
 POSTGRES_HOST = os.getenv('POSTGRES_HOST', 'localhost')
@@ -33,11 +36,109 @@ MODELS_DIR.mkdir(exist_ok=True)
 
 # Configuración del modelo YOLO
 MODEL_PATH = MODELS_DIR / "yolov8n.pt"
+CONFIDENCE_THRESHOLD = float(os.getenv('CONFIDENCE_THRESHOLD', '0.3'))
+
+# Backend de inferencia: 'torch' (ultralytics), 'onnx' (ONNX Runtime) u 'openvino'
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'torch')
+INFERENCE_INT8 = os.getenv('INFERENCE_INT8', 'false').lower() == 'true'
+INFERENCE_IMGSZ = int(os.getenv('INFERENCE_IMGSZ', '640'))
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', '0'))  # 0 = valor por defecto del runtime
+INFERENCE_NMS_IOU = float(os.getenv('INFERENCE_NMS_IOU', '0.7'))
+INFERENCE_MAX_DETECTIONS = int(os.getenv('INFERENCE_MAX_DETECTIONS', '300'))
+
+# Inferencia por ventanas / regiones de interés para video de alta resolución
+INFERENCE_MODE = os.getenv('INFERENCE_MODE', 'full')  # 'full' o 'tiled'
+ROI_CONFIG_PATH = Path(os.getenv('ROI_CONFIG_PATH', str(BASE_DIR / "roi_config.json")))
+TILE_SIZE = int(os.getenv('TILE_SIZE', '640'))
+TILE_OVERLAP = float(os.getenv('TILE_OVERLAP', '0.2'))
+TILE_NMS_IOU = float(os.getenv('TILE_NMS_IOU', '0.5'))
+
+# Parámetros de renderizado: cambiarlos regenera el video anotado / heatmap desde las detecciones guardadas
+RENDER_PRESET = os.getenv('RENDER_PRESET', 'ultrafast')
+RENDER_CRF = int(os.getenv('RENDER_CRF', '28'))
+RENDER_BOX_THICKNESS = int(os.getenv('RENDER_BOX_THICKNESS', '2'))
+RENDER_FONT_SCALE = float(os.getenv('RENDER_FONT_SCALE', '0.5'))
+RENDER_COLOR_BY_LABEL = os.getenv('RENDER_COLOR_BY_LABEL', 'false').lower() == 'true'
+RENDER_LABEL_COLORS = json.loads(os.getenv('RENDER_LABEL_COLORS', '{}'))  # {"person": [b, g, r], ...}
+HEATMAP_BACKGROUND_ALPHA = float(os.getenv('HEATMAP_BACKGROUND_ALPHA', '0.3'))
+HEATMAP_OVERLAY_WEIGHT = float(os.getenv('HEATMAP_OVERLAY_WEIGHT', '0.7'))
+HEATMAP_MIN_INTENSITY = int(os.getenv('HEATMAP_MIN_INTENSITY', '50'))
+
+# Procesamiento de un video en segmentos paralelos (cortes en keyframes); 0 o 1 lo desactiva
+SEGMENT_WORKERS = int(os.getenv('SEGMENT_WORKERS', '0'))
+SEGMENT_MIN_FRAMES = int(os.getenv('SEGMENT_MIN_FRAMES', '1500'))  # frames mínimos por segmento
+
+# Perfilado de trabajos (opt-in por petición con ?profile=true o para todos con PROFILE_JOBS)
+PROFILE_JOBS = os.getenv('PROFILE_JOBS', 'false').lower() == 'true'
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.01'))  # segundos entre muestras de pila
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', '1'))
+PROFILE_TOP_ALLOCATIONS = int(os.getenv('PROFILE_TOP_ALLOCATIONS', '20'))
+PROFILE_TOP_FUNCTIONS = int(os.getenv('PROFILE_TOP_FUNCTIONS', '30'))
+PROFILE_PREFIX = os.getenv('PROFILE_PREFIX', 'profiles')  # en el bucket de videos procesados
+
+# Vista en vivo (MJPEG): un decode/anotación/JPEG por video y worker, compartido por sus espectadores
+LIVE_BUFFER_FRAMES = int(os.getenv('LIVE_BUFFER_FRAMES', '8'))  # frames que un espectador lento puede ir por detrás
+LIVE_JPEG_QUALITY = int(os.getenv('LIVE_JPEG_QUALITY', '75'))
+LIVE_MAX_WIDTH = int(os.getenv('LIVE_MAX_WIDTH', '960'))
+LIVE_DETECT_INTERVAL = int(os.getenv('LIVE_DETECT_INTERVAL', '0'))  # frames entre inferencias sin detecciones guardadas; 0 = sin detección (la API no carga el modelo)
+LIVE_IDLE_SECONDS = float(os.getenv('LIVE_IDLE_SECONDS', '10'))  # segundos sin espectadores antes de cerrar el canal
+LIVE_MAX_CHANNELS = int(os.getenv('LIVE_MAX_CHANNELS', '2'))  # canales simultáneos por worker
+LIVE_URL_EXPIRATION = int(os.getenv('LIVE_URL_EXPIRATION', '3600'))  # validez de la URL firmada del original
+LIVE_SOURCES = json.loads(os.getenv('LIVE_SOURCES', '{}'))  # fuentes en vivo: {"camara-1": "rtsp://..."}
 
 # Configuración de la API
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv('EVENT_LOOP_LAG_INTERVAL', '0.5'))  # segundos entre mediciones del retraso del loop
 API_HOST = "127.0.0.1"
 API_PORT = 8000
 
 # Configuraciones adicionales
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov'}
-MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
\ No newline at end of file
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+DEFAULT_FPS = float(os.getenv('DEFAULT_FPS', '30'))  # Solo si el video no tiene probe
+
+# Configuración del cliente de Google Cloud Storage
+GCS_POOL_SIZE = int(os.getenv('GCS_POOL_SIZE', '32'))
+GCS_CONNECT_TIMEOUT = float(os.getenv('GCS_CONNECT_TIMEOUT', '5'))
+GCS_READ_TIMEOUT = float(os.getenv('GCS_READ_TIMEOUT', '120'))
+GCS_RETRY_DEADLINE = float(os.getenv('GCS_RETRY_DEADLINE', '300'))
+GCS_COMPOSITE_THRESHOLD = int(os.getenv('GCS_COMPOSITE_THRESHOLD', str(64 * 1024 * 1024)))
+GCS_COMPOSITE_CHUNK_SIZE = int(os.getenv('GCS_COMPOSITE_CHUNK_SIZE', str(16 * 1024 * 1024)))
+GCS_UPLOAD_WORKERS = int(os.getenv('GCS_UPLOAD_WORKERS', '8'))
+GCS_STREAM_CHUNK_SIZE = int(os.getenv('GCS_STREAM_CHUNK_SIZE', str(4 * 1024 * 1024)))
+
+# Configuración del catálogo de videos
+CATALOG_RECONCILE_INTERVAL = int(os.getenv('CATALOG_RECONCILE_INTERVAL', '300'))
+CATALOG_PAGE_SIZE = int(os.getenv('CATALOG_PAGE_SIZE', '100'))
+CATALOG_MAX_PAGE_SIZE = int(os.getenv('CATALOG_MAX_PAGE_SIZE', '1000'))
+
+# Configuración de respuestas en streaming de metadata
+METADATA_STREAM_BATCH = int(os.getenv('METADATA_STREAM_BATCH', '500'))  # filas por viaje del cursor de servidor
+METADATA_STREAM_CHUNK_BYTES = int(os.getenv('METADATA_STREAM_CHUNK_BYTES', str(64 * 1024)))
+
+# Configuración del seguimiento de objetos entre frames
+TRACKING_ENABLED = os.getenv('TRACKING_ENABLED', 'true').lower() == 'true'
+TRACK_IOU_THRESHOLD = float(os.getenv('TRACK_IOU_THRESHOLD', '0.3'))
+TRACK_MAX_GAP = int(os.getenv('TRACK_MAX_GAP', '15'))  # frames sin detección antes de cerrar un track
+TRACK_SAMPLE_INTERVAL = int(os.getenv('TRACK_SAMPLE_INTERVAL', '15'))  # frames entre keypoints guardados
+TRACK_MIN_DETECTIONS = int(os.getenv('TRACK_MIN_DETECTIONS', '1'))
+
+# Procesamiento por lotes: la API encola en PostgreSQL y `python batch.py worker` procesa con un pool
+# fijo de workers por etapa y un modelo compartido
+BATCH_DOWNLOAD_WORKERS = int(os.getenv('BATCH_DOWNLOAD_WORKERS', '2'))
+BATCH_INFERENCE_WORKERS = int(os.getenv('BATCH_INFERENCE_WORKERS', '1'))
+BATCH_UPLOAD_WORKERS = int(os.getenv('BATCH_UPLOAD_WORKERS', '2'))
+BATCH_PREFETCH = int(os.getenv('BATCH_PREFETCH', '2'))  # videos descargados en espera por etapa
+BATCH_MAX_VIDEOS = int(os.getenv('BATCH_MAX_VIDEOS', '1000'))
+BATCH_POLL_INTERVAL = float(os.getenv('BATCH_POLL_INTERVAL', '5'))  # segundos entre consultas con la cola vacía
+BATCH_LEASE_SECONDS = int(os.getenv('BATCH_LEASE_SECONDS', '120'))  # sin latido en este tiempo, el video se vuelve a encolar
+BATCH_METRICS_PORT = int(os.getenv('BATCH_METRICS_PORT', '9100'))  # /metrics del proceso worker
+
+# Ciclo de vida de los trabajos: un directorio temporal por trabajo, cuota de disco y cierre ordenado
+JOB_DISK_QUOTA_MB = int(os.getenv('JOB_DISK_QUOTA_MB', '4096'))  # por trabajo; 0 = sin límite
+JOB_DISK_FACTOR = float(os.getenv('JOB_DISK_FACTOR', '3'))  # disco estimado = tamaño del original × factor
+TEMP_MIN_FREE_MB = int(os.getenv('TEMP_MIN_FREE_MB', '512'))  # espacio libre que los trabajos no pueden ocupar
+JOB_DRAIN_TIMEOUT = float(os.getenv('JOB_DRAIN_TIMEOUT', '240'))  # espera a que terminen los trabajos al cerrar
+JOB_CHECKPOINT_TIMEOUT = float(os.getenv('JOB_CHECKPOINT_TIMEOUT', '60'))  # espera a que guarden su checkpoint
+JOB_RETRY_AFTER = int(os.getenv('JOB_RETRY_AFTER', '30'))  # Retry-After de los 503 durante el drenaje
+CHECKPOINT_PREFIX = os.getenv('CHECKPOINT_PREFIX', 'checkpoints')  # en el bucket de videos procesados
@@ -1,16 +1,26 @@
 import psycopg2
-from psycopg2.extras import Json
+from psycopg2.extras import Json, execute_values, register_default_jsonb
 import logging
 import time
-from config import DATABASE_URL
+import uuid
+from config import DATABASE_URL, METADATA_STREAM_BATCH
+from serialization import dumps_str, loads
+from metrics import DB_CONNECTIONS, DB_CONNECT_SECONDS, StageTimer
 
 logger = logging.getLogger(__name__)
 
+# Decodificar JSONB con orjson en todas las conexiones
+register_default_jsonb(loads=loads, globally=True)
+
 def get_db_connection():
     """Crear una conexión a la base de datos PostgreSQL"""
     try:
-        return psycopg2.connect(DATABASE_URL)
+        with DB_CONNECT_SECONDS.time():
+            conn = psycopg2.connect(DATABASE_URL)
+        DB_CONNECTIONS.labels("ok").inc()
+        return conn
     except Exception as e:
+        DB_CONNECTIONS.labels("error").inc()
         logger.error(f"Error conectando a la base de datos: {str(e)}")
         raise
 
@@ -30,6 +40,86 @@ def init_database():
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+
+        # Detecciones en formato binario columnar junto a la metadata JSON
+        cur.execute("ALTER TABLE metadata ADD COLUMN IF NOT EXISTS detections_bin BYTEA")
+
+        # Un registro compacto por objeto seguido entre frames
+        cur.execute("ALTER TABLE metadata ADD COLUMN IF NOT EXISTS tracks JSONB")
+
+        # Claves de versión por etapa (inference, tracks, video, heatmap) para el reprocesado incremental
+        cur.execute("ALTER TABLE metadata ADD COLUMN IF NOT EXISTS versions JSONB")
+
+        # Catálogo de videos: evita listar el bucket en cada petición
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS video_catalog (
+                video_name VARCHAR(255) PRIMARY KEY,
+                size_bytes BIGINT NOT NULL DEFAULT 0,
+                generation BIGINT,
+                duration DOUBLE PRECISION,
+                fps DOUBLE PRECISION,
+                width INTEGER,
+                height INTEGER,
+                state VARCHAR(32) NOT NULL DEFAULT 'uploaded',
+                deleted BOOLEAN NOT NULL DEFAULT FALSE,
+                last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_video_catalog_size ON video_catalog (size_bytes, video_name) WHERE NOT deleted")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_video_catalog_duration ON video_catalog ((COALESCE(duration, 0)), video_name) WHERE NOT deleted")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_video_catalog_updated ON video_catalog (updated_at, video_name) WHERE NOT deleted")
+        # Propiedades reales del video obtenidas al procesarlo (evita reabrirlo después)
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS video_probe (
+                video_name VARCHAR(255) PRIMARY KEY,
+                fps DOUBLE PRECISION,
+                frame_count INTEGER,
+                duration DOUBLE PRECISION,
+                codec VARCHAR(32),
+                width INTEGER,
+                height INTEGER,
+                keyframes INTEGER[] NOT NULL DEFAULT '{}',
+                probed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_state (
+                id INTEGER PRIMARY KEY,
+                last_reconciled_at TIMESTAMP NOT NULL
+            )
+        ''')
+        cur.execute('''
+            INSERT INTO catalog_state (id, last_reconciled_at)
+            VALUES (1, '-infinity')
+            ON CONFLICT (id) DO NOTHING
+        ''')
+
+        # Lotes: la API los encola y los procesos `batch.py worker` reclaman sus videos
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS batch_jobs (
+                batch_id VARCHAR(32) PRIMARY KEY,
+                force BOOLEAN NOT NULL DEFAULT FALSE,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS batch_videos (
+                id BIGSERIAL PRIMARY KEY,
+                batch_id VARCHAR(32) NOT NULL REFERENCES batch_jobs (batch_id) ON DELETE CASCADE,
+                video_name VARCHAR(255) NOT NULL,
+                state VARCHAR(32) NOT NULL DEFAULT 'queued',
+                stages TEXT[],
+                frames INTEGER NOT NULL DEFAULT 0,
+                seconds DOUBLE PRECISION,
+                error TEXT,
+                worker VARCHAR(128),
+                heartbeat_at TIMESTAMP,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (batch_id, video_name)
+            )
+        ''')
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_batch_videos_state ON batch_videos (state, id)")
         conn.commit()
         logger.info("Base de datos inicializada correctamente")
     except Exception as e:
@@ -39,12 +129,14 @@ def init_database():
         cur.close()
         conn.close()
 
-def insert_or_update_video_data(video_name, metadata=None, processed_video_path=None, heatmap_path=None):
-    """Insertar o actualizar datos del video en PostgreSQL"""
-    logger.info(f"Attempting to insert/update data for {video_name}")
-    logger.info(f"Metadata present: {metadata is not None}")
-    logger.info(f"Processed path: {processed_video_path}")
-    logger.info(f"Heatmap path: {heatmap_path}")
+@StageTimer("db_write")
+def insert_or_update_video_data(video_name, metadata=None, processed_video_path=None, heatmap_path=None,
+                                detections_bin=None, tracks=None, versions=None, clear_tracks=False):
+    """Insertar o actualizar datos del video en PostgreSQL (clear_tracks escribe NULL en tracks)"""
+    logger.debug(
+        f"Insert/update {video_name}: metadata={metadata is not None}, "
+        f"processed_path={processed_video_path}, heatmap_path={heatmap_path}"
+    )
 
     max_retries = 3
     retry_count = 0
@@ -65,7 +157,7 @@ def insert_or_update_video_data(video_name, metadata=None, processed_video_path=
 
                 if metadata is not None:
                     update_parts.append("metadata = %s")
-                    update_values.append(Json(metadata) if isinstance(metadata, dict) else metadata)
+                    update_values.append(Json(metadata, dumps=dumps_str) if isinstance(metadata, (dict, list)) else metadata)
 
                 if processed_video_path is not None:
                     update_parts.append("processed_video_path = %s")
@@ -75,6 +167,22 @@ def insert_or_update_video_data(video_name, metadata=None, processed_video_path=
                     update_parts.append("heatmap_path = %s")
                     update_values.append(heatmap_path)
 
+                if detections_bin is not None:
+                    update_parts.append("detections_bin = %s")
+                    update_values.append(psycopg2.Binary(detections_bin))
+
+                if tracks is not None:
+                    update_parts.append("tracks = %s")
+                    update_values.append(Json(tracks, dumps=dumps_str) if isinstance(tracks, list) else tracks)
+                elif clear_tracks:
+                    # None significa "sin cambios"; los tracks obsoletos se borran explícitamente
+                    update_parts.append("tracks = NULL")
+
+                if versions is not None:
+                    # Fusionar: cada etapa actualiza solo su propia clave
+                    update_parts.append("versions = COALESCE(versions, '{}'::jsonb) || %s")
+                    update_values.append(Json(versions, dumps=dumps_str))
+
                 if update_parts:
                     query = f"""
                         UPDATE metadata 
@@ -85,13 +193,16 @@ def insert_or_update_video_data(video_name, metadata=None, processed_video_path=
             else:
                 # Insertar nuevo registro
                 cur.execute("""
-                    INSERT INTO metadata (video_name, metadata, processed_video_path, heatmap_path)
-                    VALUES (%s, %s, %s, %s)
+                    INSERT INTO metadata (video_name, metadata, processed_video_path, heatmap_path, detections_bin, tracks, versions)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
                 """, (
                     video_name,
-                    Json(metadata) if isinstance(metadata, dict) else metadata,
+                    Json(metadata, dumps=dumps_str) if isinstance(metadata, (dict, list)) else metadata,
                     processed_video_path,
-                    heatmap_path
+                    heatmap_path,
+                    psycopg2.Binary(detections_bin) if detections_bin is not None else None,
+                    Json(tracks, dumps=dumps_str) if isinstance(tracks, list) else tracks,
+                    Json(versions, dumps=dumps_str) if versions is not None else None
                 ))
 
             conn.commit()
@@ -136,6 +247,132 @@ def get_video_data(video_name):
         cur.close()
         conn.close()
 
+def get_video_data_raw(video_name):
+    """Obtener datos de un video con la metadata como texto JSON (sin decodificar); None si está vacía"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT CASE
+                       WHEN jsonb_typeof(metadata) = 'array' AND jsonb_array_length(metadata) = 0 THEN NULL
+                       WHEN metadata IN ('{}'::jsonb, 'null'::jsonb) THEN NULL
+                       ELSE metadata::text
+                   END,
+                   processed_video_path, heatmap_path
+            FROM metadata
+            WHERE video_name = %s
+        """, (video_name,))
+        result = cur.fetchone()
+        if result:
+            return {
+                "metadata": result[0],
+                "processed_video_path": result[1],
+                "heatmap_path": result[2]
+            }
+        return None
+    except Exception as e:
+        logger.error(f"Error en get_video_data_raw: {str(e)}")
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+def get_video_detections(video_name):
+    """Obtener detections_bin, tracks, metadata y ruta procesada; la metadata JSON solo se lee si no hay binario"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT detections_bin,
+                   CASE WHEN detections_bin IS NULL THEN metadata END,
+                   processed_video_path,
+                   tracks
+            FROM metadata
+            WHERE video_name = %s
+        """, (video_name,))
+        result = cur.fetchone()
+        if result:
+            return {
+                "detections_bin": result[0],
+                "metadata": result[1],
+                "processed_video_path": result[2],
+                "tracks": result[3]
+            }
+        return None
+    except Exception as e:
+        logger.error(f"Error en get_video_detections: {str(e)}")
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+def get_video_versions(video_name):
+    """Obtener las claves de versión guardadas y qué salidas existen para un video"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT versions,
+                   detections_bin IS NOT NULL,
+                   processed_video_path,
+                   heatmap_path
+            FROM metadata
+            WHERE video_name = %s
+        """, (video_name,))
+        result = cur.fetchone()
+        if result:
+            return {
+                "versions": result[0] or {},
+                "has_detections": result[1],
+                "processed_video_path": result[2],
+                "heatmap_path": result[3]
+            }
+        return None
+    except Exception as e:
+        logger.error(f"Error en get_video_versions: {str(e)}")
+        return None
+    finally:
+        cur.close()
+        conn.close()
+
+def video_has_metadata(video_name):
+    """Verificar si un video tiene metadata registrada"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT 1 FROM metadata WHERE video_name = %s AND metadata IS NOT NULL", (video_name,))
+        return cur.fetchone() is not None
+    finally:
+        cur.close()
+        conn.close()
+
+def iter_metadata_frames(video_name, start_frame=None, end_frame=None):
+    """Iterar los frames de la metadata como texto JSON usando un cursor de servidor
+
+    Postgres expande el array y filtra por rango de frames; el worker solo mantiene
+    en memoria un lote de METADATA_STREAM_BATCH filas a la vez.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor(name=f"metadata_stream_{uuid.uuid4().hex}")
+    cur.itersize = METADATA_STREAM_BATCH
+    try:
+        cur.execute("""
+            SELECT elem::text
+            FROM metadata m
+            CROSS JOIN LATERAL jsonb_array_elements(
+                CASE WHEN jsonb_typeof(m.metadata) = 'array' THEN m.metadata ELSE '[]'::jsonb END
+            ) WITH ORDINALITY AS e(elem, position)
+            WHERE m.video_name = %s
+              AND (%s::int IS NULL OR (elem->>'frame')::int >= %s::int)
+              AND (%s::int IS NULL OR (elem->>'frame')::int <= %s::int)
+            ORDER BY e.position
+        """, (video_name, start_frame, start_frame, end_frame, end_frame))
+        for row in cur:
+            yield row[0]
+    finally:
+        cur.close()
+        conn.close()
+
 def check_video_paths(video_name):
     """Función de debug para verificar las rutas en la base de datos"""
     conn = get_db_connection()
@@ -161,4 +398,377 @@ def check_video_paths(video_name):
         return None
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+# Expresiones de ordenación permitidas en el catálogo (coinciden con los índices)
+CATALOG_SORT_COLUMNS = {
+    "name": "video_name",
+    "size": "size_bytes",
+    "duration": "COALESCE(duration, 0)",
+    "updated": "updated_at",
+}
+
+def upsert_catalog_entry(video_name, size_bytes=None, generation=None, duration=None,
+                         fps=None, width=None, height=None, state=None):
+    """Insertar o actualizar una entrada del catálogo; los campos None conservan su valor"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO video_catalog (video_name, size_bytes, generation, duration, fps, width, height, state)
+            VALUES (%s, COALESCE(%s, 0), %s, %s, %s, %s, %s, COALESCE(%s, 'uploaded'))
+            ON CONFLICT (video_name) DO UPDATE SET
+                size_bytes = COALESCE(%s, video_catalog.size_bytes),
+                generation = COALESCE(EXCLUDED.generation, video_catalog.generation),
+                duration = COALESCE(EXCLUDED.duration, video_catalog.duration),
+                fps = COALESCE(EXCLUDED.fps, video_catalog.fps),
+                width = COALESCE(EXCLUDED.width, video_catalog.width),
+                height = COALESCE(EXCLUDED.height, video_catalog.height),
+                state = COALESCE(%s, video_catalog.state),
+                deleted = FALSE,
+                last_seen_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP
+        """, (video_name, size_bytes, generation, duration, fps, width, height, state,
+              size_bytes, state))
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error en upsert_catalog_entry: {str(e)}")
+        return False
+    finally:
+        cur.close()
+        conn.close()
+
+def list_catalog(limit, sort="name", descending=False, after=None):
+    """Obtener una página del catálogo con paginación por cursor (keyset)"""
+    sort_expr = CATALOG_SORT_COLUMNS[sort]
+    direction = "DESC" if descending else "ASC"
+    comparison = "<" if descending else ">"
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        params = []
+        where = "NOT deleted"
+        if after is not None:
+            where += f" AND ({sort_expr}, video_name) {comparison} (%s, %s)"
+            params.extend(after)
+        params.append(limit + 1)
+
+        cur.execute(f"""
+            SELECT video_name, size_bytes, duration, fps, width, height, state, updated_at,
+                   {sort_expr} AS sort_value
+            FROM video_catalog
+            WHERE {where}
+            ORDER BY {sort_expr} {direction}, video_name {direction}
+            LIMIT %s
+        """, tuple(params))
+        rows = cur.fetchall()
+
+        items = [{
+            "video_name": row[0],
+            "size_bytes": row[1],
+            "duration": row[2],
+            "fps": row[3],
+            "resolution": f"{row[4]}x{row[5]}" if row[4] and row[5] else None,
+            "state": row[6],
+            "updated_at": row[7].isoformat() if row[7] else None
+        } for row in rows[:limit]]
+
+        # Clave de la última fila devuelta, para construir el siguiente cursor
+        next_key = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            sort_value = last[8].isoformat() if hasattr(last[8], "isoformat") else last[8]
+            next_key = (sort_value, last[0])
+        return items, next_key
+    finally:
+        cur.close()
+        conn.close()
+
+def count_catalog():
+    """Número de videos del catálogo (sin los eliminados)"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COUNT(*) FROM video_catalog WHERE NOT deleted")
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
+
+def list_catalog_names_with_metadata():
+    """Obtener los nombres de los videos del catálogo que tienen metadata"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT c.video_name
+            FROM video_catalog c
+            JOIN metadata m ON m.video_name = c.video_name
+            WHERE NOT c.deleted
+            ORDER BY c.video_name
+        """)
+        return [row[0] for row in cur.fetchall()]
+    finally:
+        cur.close()
+        conn.close()
+
+def search_tracks(label):
+    """Buscar en una sola consulta los tracks de una etiqueta en todos los videos del catálogo"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT m.video_name, m.processed_video_path, t
+            FROM video_catalog c
+            JOIN metadata m ON m.video_name = c.video_name
+            CROSS JOIN LATERAL jsonb_array_elements(m.tracks) AS t
+            WHERE NOT c.deleted
+              AND m.tracks IS NOT NULL
+              AND lower(t->>'label') = lower(%s)
+            ORDER BY m.video_name, (t->>'start_frame')::int
+        """, (label,))
+        return cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+def claim_catalog_reconcile(interval_seconds):
+    """Reclamar la reconciliación del catálogo; devuelve la hora del reclamo o None si otro worker la tiene"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE catalog_state
+            SET last_reconciled_at = CURRENT_TIMESTAMP
+            WHERE id = 1 AND last_reconciled_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+            RETURNING last_reconciled_at
+        """, (interval_seconds,))
+        claimed = cur.fetchone()
+        conn.commit()
+        return claimed[0] if claimed else None
+    finally:
+        cur.close()
+        conn.close()
+
+def sync_catalog(entries, listed_since):
+    """Sincronizar el catálogo con el listado del bucket: (video_name, size_bytes, generation)
+
+    Las entradas no vistas desde listed_since (inicio del listado) se marcan como eliminadas.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        execute_values(cur, """
+            INSERT INTO video_catalog (video_name, size_bytes, generation)
+            VALUES %s
+            ON CONFLICT (video_name) DO UPDATE SET
+                size_bytes = EXCLUDED.size_bytes,
+                generation = EXCLUDED.generation,
+                deleted = FALSE,
+                last_seen_at = CURRENT_TIMESTAMP,
+                updated_at = CASE
+                    WHEN video_catalog.generation IS DISTINCT FROM EXCLUDED.generation
+                         OR video_catalog.deleted
+                    THEN CURRENT_TIMESTAMP
+                    ELSE video_catalog.updated_at
+                END
+        """, entries, page_size=1000)
+
+        # Lo que no apareció en el listado ya no está en el bucket
+        cur.execute("""
+            UPDATE video_catalog
+            SET deleted = TRUE, updated_at = CURRENT_TIMESTAMP
+            WHERE NOT deleted AND last_seen_at < %s
+        """, (listed_since,))
+        removed = cur.rowcount
+        conn.commit()
+        return removed
+    finally:
+        cur.close()
+        conn.close()
+
+BATCH_FINAL_STATES = ("processed", "skipped", "failed")
+
+def create_batch(batch_id, videos, force=False):
+    """Encolar un lote: un registro por video en estado 'queued'"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("INSERT INTO batch_jobs (batch_id, force) VALUES (%s, %s)", (batch_id, force))
+        execute_values(cur, "INSERT INTO batch_videos (batch_id, video_name) VALUES %s",
+                       [(batch_id, video_name) for video_name in videos], page_size=1000)
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+def claim_batch_video(worker, lease_seconds):
+    """Reclamar el siguiente video en cola (o uno cuyo worker dejó de latir); devuelve (batch_id, video_name, force) o None
+
+    FOR UPDATE SKIP LOCKED permite que varios workers reclamen a la vez sin repetir videos.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE batch_videos v
+            SET state = 'claimed', worker = %s, error = NULL,
+                heartbeat_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            FROM batch_jobs b
+            WHERE b.batch_id = v.batch_id
+              AND v.id = (
+                SELECT id FROM batch_videos
+                WHERE state = 'queued'
+                   OR (state NOT IN %s AND heartbeat_at < CURRENT_TIMESTAMP - make_interval(secs => %s))
+                ORDER BY id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+              )
+            RETURNING v.batch_id, v.video_name, b.force
+        """, (worker, BATCH_FINAL_STATES, lease_seconds))
+        claimed = cur.fetchone()
+        conn.commit()
+        return claimed
+    finally:
+        cur.close()
+        conn.close()
+
+def update_batch_video(batch_id, video_name, state, **fields):
+    """Actualizar el estado de un video del lote (stages, frames, seconds, error); 'queued' lo libera de su worker"""
+    columns = ["state = %s", "updated_at = CURRENT_TIMESTAMP"]
+    values = [state]
+    for column in ("stages", "frames", "seconds", "error"):
+        if column in fields:
+            columns.append(f"{column} = %s")
+            values.append(fields[column])
+    if state == "queued":
+        columns.append("worker = NULL")
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            UPDATE batch_videos SET {', '.join(columns)}
+            WHERE batch_id = %s AND video_name = %s
+        """, tuple(values + [batch_id, video_name]))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+def heartbeat_batch_videos(worker):
+    """Renovar el latido de los videos en curso de un worker"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE batch_videos SET heartbeat_at = CURRENT_TIMESTAMP
+            WHERE worker = %s AND state NOT IN %s AND state <> 'queued'
+        """, (worker, BATCH_FINAL_STATES))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+def get_batch(batch_id):
+    """Obtener un lote con sus videos, o None si no existe"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT force, EXTRACT(EPOCH FROM created_at), EXTRACT(EPOCH FROM CURRENT_TIMESTAMP::timestamp)
+            FROM batch_jobs WHERE batch_id = %s
+        """, (batch_id,))
+        batch = cur.fetchone()
+        if not batch:
+            return None
+
+        cur.execute("""
+            SELECT video_name, state, stages, frames, seconds, error, EXTRACT(EPOCH FROM updated_at)
+            FROM batch_videos WHERE batch_id = %s ORDER BY id
+        """, (batch_id,))
+        return {
+            "batch_id": batch_id,
+            "force": batch[0],
+            "created_at": float(batch[1]),
+            "now": float(batch[2]),
+            "videos": [
+                {
+                    "video_name": row[0],
+                    "state": row[1],
+                    "stages": row[2],
+                    "frames": row[3],
+                    "seconds": row[4],
+                    "error": row[5],
+                    "updated_at": float(row[6])
+                }
+                for row in cur.fetchall()
+            ]
+        }
+    finally:
+        cur.close()
+        conn.close()
+
+def save_video_probe(video_name, probe):
+    """Guardar el registro de propiedades (probe) de un video"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO video_probe (video_name, fps, frame_count, duration, codec, width, height, keyframes)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (video_name) DO UPDATE SET
+                fps = EXCLUDED.fps,
+                frame_count = EXCLUDED.frame_count,
+                duration = EXCLUDED.duration,
+                codec = EXCLUDED.codec,
+                width = EXCLUDED.width,
+                height = EXCLUDED.height,
+                keyframes = EXCLUDED.keyframes,
+                probed_at = CURRENT_TIMESTAMP
+        """, (
+            video_name, probe.get("fps"), probe.get("frame_count"), probe.get("duration"),
+            probe.get("codec"), probe.get("width"), probe.get("height"), probe.get("keyframes") or []
+        ))
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error en save_video_probe: {str(e)}")
+        return False
+    finally:
+        cur.close()
+        conn.close()
+
+def get_video_probe(video_name, include_keyframes=False):
+    """Obtener el registro de propiedades de un video, o None si no fue procesado"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT fps, frame_count, duration, codec, width, height
+                   {", keyframes" if include_keyframes else ""}
+            FROM video_probe
+            WHERE video_name = %s
+        """, (video_name,))
+        result = cur.fetchone()
+        if not result:
+            return None
+        probe = {
+            "fps": result[0],
+            "frame_count": result[1],
+            "duration": result[2],
+            "codec": result[3],
+            "width": result[4],
+            "height": result[5]
+        }
+        if include_keyframes:
+            probe["keyframes"] = result[6]
+        return probe
+    except Exception as e:
+        logger.error(f"Error en get_video_probe: {str(e)}")
+        return None
+    finally:
+        cur.close()
+        conn.close()
@@ -0,0 +1,188 @@
+import os
+import json
+import struct
+import numpy as np
+
+# Formato binario columnar de detecciones: una fila de 16 bytes por caja
+DETECTION_DTYPE = np.dtype([
+    ("frame", "<i4"),
+    ("label_id", "<u2"),
+    ("conf", "<f2"),
+    ("box", "<i2", (4,)),
+])
+
+# Cabecera: magic, versión, longitud del JSON de etiquetas; los registros quedan alineados a 16 bytes
+MAGIC = b"VDET"
+VERSION = 1
+_HEADER = struct.Struct("<4sHI")
+_ALIGNMENT = 16
+
+class DetectionSet:
+    """Detecciones de un video ordenadas por frame, respaldadas por un array estructurado"""
+
+    def __init__(self, records, labels):
+        self.records = records
+        self.labels = list(labels)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def frames(self):
+        return self.records["frame"]
+
+    @property
+    def label_ids(self):
+        return self.records["label_id"]
+
+    @property
+    def confidences(self):
+        return self.records["conf"]
+
+    @property
+    def boxes(self):
+        return self.records["box"]
+
+    def label_id(self, label: str):
+        """Obtener el id de una etiqueta (comparación sin mayúsculas), o None"""
+        lowered = label.lower()
+        for index, name in enumerate(self.labels):
+            if name.lower() == lowered:
+                return index
+        return None
+
+    def frame_bounds(self):
+        """Índices [inicio, fin) de cada frame con detecciones: (frames_únicos, inicios, fines)"""
+        frames = self.frames
+        if len(frames) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+        # Los registros están ordenados por frame: cada cambio de valor inicia un grupo
+        starts = np.flatnonzero(np.concatenate(([True], frames[1:] != frames[:-1])))
+        ends = np.append(starts[1:], len(frames))
+        return frames[starts], starts, ends
+
+    def iter_frames(self):
+        """Iterar (frame, registros) sin copiar los datos"""
+        unique_frames, starts, ends = self.frame_bounds()
+        for frame, start, end in zip(unique_frames.tolist(), starts.tolist(), ends.tolist()):
+            yield frame, self.records[start:end]
+
+    def to_metadata(self):
+        """Reconstruir la representación JSON original ({"frame", "objects": [...]})"""
+        metadata = []
+        for frame, rows in self.iter_frames():
+            metadata.append({
+                "frame": frame,
+                "objects": [
+                    {
+                        "label": self.labels[label_id],
+                        "confidence": round(conf, 4),
+                        "coordinates": [box]
+                    }
+                    for label_id, conf, box in zip(
+                        rows["label_id"].tolist(), rows["conf"].tolist(), rows["box"].tolist()
+                    )
+                ]
+            })
+        return metadata
+
+def encode_detections(metadata, labels=None) -> DetectionSet:
+    """Convertir la metadata JSON a un DetectionSet ordenado por frame"""
+    labels = list(labels or [])
+    label_index = {name: index for index, name in enumerate(labels)}
+
+    count = sum(len(detection.get("objects", [])) for detection in metadata)
+    records = np.empty(count, dtype=DETECTION_DTYPE)
+    i = 0
+    for detection in metadata:
+        frame = detection["frame"]
+        for obj in detection.get("objects", []):
+            label = obj["label"]
+            if label not in label_index:
+                label_index[label] = len(labels)
+                labels.append(label)
+            records[i] = (frame, label_index[label], obj.get("confidence", 1.0), obj["coordinates"][0])
+            i += 1
+
+    records = records[np.argsort(records["frame"], kind="stable")]
+    return DetectionSet(records, labels)
+
+def _header_bytes(labels):
+    labels_json = json.dumps(labels).encode()
+    header = _HEADER.pack(MAGIC, VERSION, len(labels_json)) + labels_json
+    padding = (-len(header)) % _ALIGNMENT
+    return header + b"\0" * padding
+
+def _parse_header(buffer):
+    magic, version, labels_length = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unsupported detections format")
+    start = _HEADER.size
+    labels = json.loads(bytes(buffer[start:start + labels_length]))
+    offset = start + labels_length
+    offset += (-offset) % _ALIGNMENT
+    return labels, offset
+
+def to_bytes(detections: DetectionSet) -> bytes:
+    """Serializar un DetectionSet (cabecera + registros contiguos)"""
+    records = np.ascontiguousarray(detections.records, dtype=DETECTION_DTYPE)
+    return _header_bytes(detections.labels) + records.tobytes()
+
+def from_buffer(buffer) -> DetectionSet:
+    """Leer un DetectionSet desde bytes/memoryview sin copiar los registros"""
+    labels, offset = _parse_header(buffer)
+    records = np.frombuffer(buffer, dtype=DETECTION_DTYPE, offset=offset)
+    return DetectionSet(records, labels)
+
+def save(path, detections: DetectionSet):
+    """Guardar un DetectionSet en disco"""
+    with open(str(path), "wb") as f:
+        f.write(to_bytes(detections))
+
+def open_memmap(path) -> DetectionSet:
+    """Abrir un archivo de detecciones mapeado en memoria (solo lectura)"""
+    with open(str(path), "rb") as f:
+        head = f.read(_HEADER.size)
+        _, _, labels_length = _HEADER.unpack(head)
+        labels, offset = _parse_header(head + f.read(labels_length))
+    if os.path.getsize(str(path)) <= offset:
+        return DetectionSet(np.empty(0, dtype=DETECTION_DTYPE), labels)
+    records = np.memmap(str(path), dtype=DETECTION_DTYPE, mode="r", offset=offset)
+    return DetectionSet(records, labels)
+
+def summarize_by_label(detections: DetectionSet):
+    """Totales, confianza media y primer/último frame por etiqueta, calculados de forma vectorizada"""
+    if len(detections) == 0:
+        return []
+    label_ids = detections.label_ids.astype(np.intp)
+    conf = detections.confidences.astype(np.float32)
+    frames = detections.frames
+    n_labels = len(detections.labels)
+
+    counts = np.bincount(label_ids, minlength=n_labels)
+    conf_sums = np.bincount(label_ids, weights=conf, minlength=n_labels)
+    first = np.full(n_labels, np.iinfo(np.int32).max, dtype=np.int64)
+    last = np.full(n_labels, -1, dtype=np.int64)
+    np.minimum.at(first, label_ids, frames)
+    np.maximum.at(last, label_ids, frames)
+
+    summary = []
+    for label_id in np.flatnonzero(counts).tolist():
+        summary.append({
+            "label_id": label_id,
+            "label": detections.labels[label_id],
+            "total_detections": int(counts[label_id]),
+            "average_confidence": round(float(conf_sums[label_id] / counts[label_id]), 3),
+            "first_detection": int(first[label_id]),
+            "last_detection": int(last[label_id])
+        })
+    return summary
+
+def load_detections(detections_bin, metadata=None):
+    """Obtener un DetectionSet del formato binario o, para registros antiguos, de la metadata JSON"""
+    if detections_bin is not None:
+        return from_buffer(detections_bin)
+    if isinstance(metadata, list):
+        return encode_detections(metadata)
+    return None
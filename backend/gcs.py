@@ -0,0 +1,245 @@
+import os
+import math
+import uuid
+import logging
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import google.auth
+from google.auth.credentials import Signing
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.oauth2 import service_account
+from google.cloud import storage
+from google.cloud.storage.retry import DEFAULT_RETRY
+from google.api_core.exceptions import NotFound, RequestRangeNotSatisfiable
+from config import *
+from metrics import gcs_operation
+
+logger = logging.getLogger(__name__)
+
+# Límite de componentes por operación compose en GCS
+MAX_COMPOSE_COMPONENTS = 32
+
+# Timeout (conexión, lectura) y política de reintentos compartidos por todas las llamadas
+GCS_TIMEOUT = (GCS_CONNECT_TIMEOUT, GCS_READ_TIMEOUT)
+GCS_RETRY = DEFAULT_RETRY.with_deadline(GCS_RETRY_DEADLINE)
+
+_storage_client = None
+_buckets = {}
+_bucket_status = {}
+_lock = threading.Lock()
+
+def _load_credentials():
+    """Cargar credenciales desde el archivo de cuenta de servicio o las credenciales por defecto"""
+    credentials_path = os.path.abspath(GOOGLE_APPLICATION_CREDENTIALS)
+    if os.path.exists(credentials_path):
+        return service_account.Credentials.from_service_account_file(
+            credentials_path, scopes=storage.Client.SCOPE
+        )
+    credentials, _ = google.auth.default(scopes=storage.Client.SCOPE)
+    return credentials
+
+def _build_http_session(credentials):
+    """Crear una sesión HTTP autenticada con un pool de conexiones dimensionado"""
+    session = AuthorizedSession(credentials)
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=GCS_POOL_SIZE,
+        pool_maxsize=GCS_POOL_SIZE
+    )
+    session.mount("https://", adapter)
+    return session
+
+def get_storage_client():
+    """Obtener el cliente de GCS compartido (se crea en el primer uso)"""
+    global _storage_client
+    if _storage_client is None:
+        with _lock:
+            if _storage_client is None and GCS_BACKEND == "local":
+                from local_storage import LocalStorageClient
+                _storage_client = LocalStorageClient(GCS_LOCAL_ROOT)
+                logger.info(f"Almacenamiento local en {GCS_LOCAL_ROOT} (GCS_BACKEND=local)")
+            elif _storage_client is None:
+                credentials = _load_credentials()
+                _storage_client = storage.Client(
+                    project=GCS_PROJECT_ID,
+                    credentials=credentials,
+                    _http=_build_http_session(credentials)
+                )
+                logger.info(f"Cliente de GCS inicializado (pool={GCS_POOL_SIZE})")
+    return _storage_client
+
+def get_bucket(bucket_name: str):
+    """Obtener el handle compartido de un bucket"""
+    bucket = _buckets.get(bucket_name)
+    if bucket is None:
+        # El cliente se obtiene fuera del lock: get_storage_client también lo toma al crearlo
+        client = get_storage_client()
+        with _lock:
+            bucket = _buckets.get(bucket_name)
+            if bucket is None:
+                bucket = _buckets[bucket_name] = client.bucket(bucket_name)
+    return bucket
+
+def validate_buckets(bucket_names):
+    """Verificar una sola vez que los buckets existen y guardar el resultado"""
+    missing = []
+    for bucket_name in bucket_names:
+        exists = get_bucket(bucket_name).exists(timeout=GCS_TIMEOUT, retry=GCS_RETRY)
+        _bucket_status[bucket_name] = exists
+        if not exists:
+            missing.append(bucket_name)
+    return missing
+
+def buckets_ready(bucket_names) -> bool:
+    """Consultar el resultado cacheado de la validación de buckets"""
+    unchecked = [name for name in bucket_names if name not in _bucket_status]
+    if unchecked:
+        validate_buckets(unchecked)
+    return all(_bucket_status[name] for name in bucket_names)
+
+def gcs_uri(bucket_name: str, blob_name: str) -> str:
+    """Construir la ruta gs:// de un objeto"""
+    return f"gs://{bucket_name}/{blob_name}"
+
+@gcs_operation("exists")
+def blob_exists(bucket_name: str, blob_name: str) -> bool:
+    """Verificar si un objeto existe en el bucket"""
+    return get_bucket(bucket_name).blob(blob_name).exists(timeout=GCS_TIMEOUT, retry=GCS_RETRY)
+
+@gcs_operation("get")
+def get_blob(bucket_name: str, blob_name: str):
+    """Obtener un objeto con sus metadatos (tamaño, generación, hashes) o None si no existe"""
+    return get_bucket(bucket_name).get_blob(blob_name, timeout=GCS_TIMEOUT, retry=GCS_RETRY)
+
+def list_blobs(bucket_name: str, prefix: str = None):
+    """Iterar sobre los objetos de un bucket"""
+    return get_storage_client().list_blobs(
+        bucket_name, prefix=prefix, timeout=GCS_TIMEOUT, retry=GCS_RETRY
+    )
+
+@gcs_operation("download")
+def download_to_filename(bucket_name: str, blob_name: str, path, generation: int = None):
+    """Descargar un objeto a un archivo local; lanza NotFound si no existe"""
+    blob = get_bucket(bucket_name).blob(blob_name, generation=generation)
+    blob.download_to_filename(str(path), timeout=GCS_TIMEOUT, retry=GCS_RETRY)
+    return blob
+
+@gcs_operation("download_range")
+def download_range(bucket_name: str, blob_name: str, start: int = 0, end: int = None) -> bytes:
+    """Descargar un rango de bytes [start, end] (ambos inclusive); lanza NotFound si no existe"""
+    blob = get_bucket(bucket_name).blob(blob_name)
+    return blob.download_as_bytes(start=start, end=end, timeout=GCS_TIMEOUT, retry=GCS_RETRY)
+
+@gcs_operation("delete")
+def delete_blob(bucket_name: str, blob_name: str):
+    """Eliminar un objeto; lanza NotFound si no existe"""
+    get_bucket(bucket_name).blob(blob_name).delete(timeout=GCS_TIMEOUT, retry=GCS_RETRY)
+
+def _signing_kwargs():
+    """Parámetros de firma para credenciales sin clave privada (GKE/metadata): firma vía IAM signBlob"""
+    credentials = getattr(get_storage_client(), "_credentials", None)
+    if credentials is None or isinstance(credentials, Signing):
+        # Almacenamiento local o cuenta de servicio con clave: firma directa
+        return {}
+    with _lock:
+        # El email real de la cuenta y un token vigente solo se conocen tras refrescar
+        if not credentials.valid or getattr(credentials, "service_account_email", "default") == "default":
+            credentials.refresh(Request())
+    return {"service_account_email": credentials.service_account_email, "access_token": credentials.token}
+
+def signed_url(bucket_name: str, blob_name: str, expiration: int = LIVE_URL_EXPIRATION) -> str:
+    """URL firmada (v4) de lectura, para que ffmpeg lea el objeto por rangos sin descargarlo entero"""
+    blob = get_bucket(bucket_name).blob(blob_name)
+    return blob.generate_signed_url(
+        version="v4", expiration=timedelta(seconds=expiration), method="GET", **_signing_kwargs()
+    )
+
+def iter_blob_chunks(bucket_name: str, blob_name: str, chunk_size: int = GCS_STREAM_CHUNK_SIZE):
+    """Leer un objeto en rangos consecutivos; el primer rango se descarga de inmediato y lanza NotFound si no existe"""
+    try:
+        first_chunk = download_range(bucket_name, blob_name, 0, chunk_size - 1)
+    except RequestRangeNotSatisfiable:
+        # Objeto de 0 bytes: GCS rechaza cualquier rango, se devuelve un flujo vacío
+        first_chunk = b""
+
+    def chunks():
+        chunk = first_chunk
+        offset = 0
+        while chunk:
+            yield chunk
+            offset += len(chunk)
+            if len(chunk) < chunk_size:
+                return
+            try:
+                chunk = download_range(bucket_name, blob_name, offset, offset + chunk_size - 1)
+            except RequestRangeNotSatisfiable:
+                return
+
+    return chunks()
+
+@gcs_operation("upload")
+def upload_bytes(bucket_name: str, blob_name: str, data: bytes, content_type: str = None):
+    """Subir un contenido en memoria a un objeto"""
+    blob = get_bucket(bucket_name).blob(blob_name)
+    blob.upload_from_string(data, content_type=content_type, timeout=GCS_TIMEOUT, retry=GCS_RETRY)
+    return blob
+
+def upload_file(bucket_name: str, blob_name: str, path, content_type: str = None):
+    """Subir un archivo local; los archivos grandes se suben como composición en paralelo"""
+    size = os.path.getsize(str(path))
+    if size >= GCS_COMPOSITE_THRESHOLD:
+        return parallel_composite_upload(bucket_name, blob_name, path, content_type=content_type)
+
+    return _upload_filename(bucket_name, blob_name, path, content_type)
+
+@gcs_operation("upload")
+def _upload_filename(bucket_name: str, blob_name: str, path, content_type: str = None):
+    blob = get_bucket(bucket_name).blob(blob_name)
+    blob.upload_from_filename(str(path), content_type=content_type, timeout=GCS_TIMEOUT, retry=GCS_RETRY)
+    return blob
+
+def parallel_composite_upload(bucket_name: str, blob_name: str, path, content_type: str = None):
+    """Subir un archivo en partes concurrentes y componerlas en el objeto final"""
+    bucket = get_bucket(bucket_name)
+    size = os.path.getsize(str(path))
+    chunk_size = max(GCS_COMPOSITE_CHUNK_SIZE, math.ceil(size / MAX_COMPOSE_COMPONENTS))
+    upload_id = uuid.uuid4().hex
+    ranges = [(offset, min(chunk_size, size - offset)) for offset in range(0, size, chunk_size)]
+
+    @gcs_operation("upload_part")
+    def upload_part(index, offset, length):
+        part = bucket.blob(f"{blob_name}.part-{upload_id}-{index:02d}")
+        with open(str(path), "rb") as f:
+            f.seek(offset)
+            part.upload_from_file(f, size=length, timeout=GCS_TIMEOUT, retry=GCS_RETRY)
+        return part
+
+    parts = []
+    try:
+        with ThreadPoolExecutor(max_workers=GCS_UPLOAD_WORKERS) as executor:
+            futures = [
+                executor.submit(upload_part, index, offset, length)
+                for index, (offset, length) in enumerate(ranges)
+            ]
+        # Recoger todas las partes subidas antes de propagar un error, para poder limpiarlas
+        errors = []
+        for future in futures:
+            if future.exception() is not None:
+                errors.append(future.exception())
+            else:
+                parts.append(future.result())
+        if errors:
+            raise errors[0]
+
+        destination = bucket.blob(blob_name)
+        destination.content_type = content_type
+        gcs_operation("compose")(destination.compose)(parts, timeout=GCS_TIMEOUT, retry=GCS_RETRY)
+        logger.info(f"Subida compuesta de {blob_name}: {len(parts)} partes, {size} bytes")
+        return destination
+    finally:
+        for part in parts:
+            try:
+                part.delete(timeout=GCS_TIMEOUT, retry=GCS_RETRY)
+            except Exception as e:
+                logger.warning(f"No se pudo eliminar la parte {part.name}: {str(e)}")
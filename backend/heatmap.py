@@ -1,21 +1,21 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks
 from fastapi.responses import StreamingResponse
-from google.cloud import storage
 import numpy as np
-import cv2
 import os
 import logging
 import io
+from pathlib import Path
 from config import *
-from database import insert_or_update_video_data, get_video_data
+from database import insert_or_update_video_data, get_video_data, get_video_detections, get_video_probe
+from detections import load_detections
+from serialization import ORJSONResponse
+from video_probe import nearest_keyframe, read_frame
+from gcs import blob_exists, download_range, download_to_filename, upload_file, gcs_uri, NotFound
+from profiling import profiled
+from jobs import job_registry, JobRejected
 
 logger = logging.getLogger(__name__)
-heatmap_router = APIRouter()
-
-# Inicializar cliente de Google Cloud Storage
-storage_client = storage.Client()
-original_bucket = storage_client.bucket(ORIGINAL_VIDEOS_BUCKET)
-heatmaps_bucket = storage_client.bucket(HEATMAPS_BUCKET)
+heatmap_router = APIRouter(default_response_class=ORJSONResponse)
 
 @heatmap_router.get("/{video_name}")
 async def get_heatmap(video_name: str, background_tasks: BackgroundTasks):
@@ -29,9 +29,9 @@ async def get_heatmap(video_name: str, background_tasks: BackgroundTasks):
             }
 
         # Verificar en GCS
-        heatmap_blob = heatmaps_bucket.blob(f"heatmap_{video_name.replace('.mp4', '.png')}")
-        if heatmap_blob.exists():
-            gcs_path = f"gs://{HEATMAPS_BUCKET}/heatmap_{video_name.replace('.mp4', '.png')}"
+        heatmap_blob_name = f"heatmap_{video_name.replace('.mp4', '.png')}"
+        if blob_exists(HEATMAPS_BUCKET, heatmap_blob_name):
+            gcs_path = gcs_uri(HEATMAPS_BUCKET, heatmap_blob_name)
             # Actualizar base de datos
             insert_or_update_video_data(video_name, heatmap_path=gcs_path)
             return {
@@ -39,10 +39,13 @@ async def get_heatmap(video_name: str, background_tasks: BackgroundTasks):
                 "path": gcs_path
             }
         
-        # Iniciar generación
-        background_tasks.add_task(generate_heatmap_background, video_name)
+        # Iniciar generación en un directorio propio (rechazada si el servidor se está cerrando)
+        workspace = job_registry.open(f"heatmap_{video_name}")
+        background_tasks.add_task(generate_heatmap_background, video_name, workspace=workspace)
         return {"status": "processing"}
 
+    except JobRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     except Exception as e:
         logger.error(f"Heatmap error: {str(e)}")
         return {"status": "error", "message": str(e)}
@@ -51,16 +54,15 @@ async def get_heatmap(video_name: str, background_tasks: BackgroundTasks):
 async def download_heatmap(video_name: str):
     try:
         heatmap_blob_name = f"heatmap_{video_name.replace('.mp4', '.png')}"
-        heatmap_blob = heatmaps_bucket.blob(heatmap_blob_name)
-        
-        if not heatmap_blob.exists():
-            raise HTTPException(status_code=404, detail="Heatmap not found")
 
         # Agregar logs para debug
         logger.info(f"Descargando heatmap: {heatmap_blob_name}")
         
-        # Obtener los bytes del heatmap
-        heatmap_bytes = heatmap_blob.download_as_bytes()
+        # Obtener los bytes del heatmap (sin consulta previa de existencia)
+        try:
+            heatmap_bytes = download_range(HEATMAPS_BUCKET, heatmap_blob_name)
+        except NotFound:
+            raise HTTPException(status_code=404, detail="Heatmap not found")
         
         return StreamingResponse(
             io.BytesIO(heatmap_bytes),
@@ -72,27 +74,95 @@ async def download_heatmap(video_name: str):
             }
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error downloading heatmap: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def generate_heatmap_background(video_name: str, metadata=None):
+# Máscaras gaussianas por tamaño de caja: el mismo objeto repite tamaño en muchos frames
+_kernel_cache = {}
+
+def _gaussian_kernel(side: int):
+    """Máscara gaussiana para una caja cuyo lado mayor es side (cacheada por tamaño)"""
+    kernel = _kernel_cache.get(side)
+    if kernel is None:
+        sigma = side / 4
+        window_size = int(sigma * 3)
+        y, x = np.ogrid[-window_size:window_size, -window_size:window_size]
+        kernel = np.exp(-(x*x + y*y) / (2*sigma*sigma)).astype(np.float32)
+        if len(_kernel_cache) < 4096:
+            _kernel_cache[side] = kernel
+    return kernel
+
+def accumulate_heatmap(detections, width: int, height: int):
+    """Acumular una máscara gaussiana por detección ponderada por su confianza"""
+    heatmap_data = np.zeros((height, width), dtype=np.float32)
+    if len(detections) == 0:
+        return heatmap_data
+
+    # Validar coordenadas de todas las cajas a la vez
+    boxes = detections.boxes.astype(np.int64)
+    x1 = np.clip(boxes[:, 0], 0, width - 1)
+    y1 = np.clip(boxes[:, 1], 0, height - 1)
+    x2 = np.clip(boxes[:, 2], 0, width - 1)
+    y2 = np.clip(boxes[:, 3], 0, height - 1)
+    valid = (x1 < x2) & (y1 < y2)
+
+    center_x = ((x1 + x2) // 2)[valid]
+    center_y = ((y1 + y2) // 2)[valid]
+    sides = np.maximum(x2 - x1, y2 - y1)[valid]
+    confidences = detections.confidences.astype(np.float32)[valid]
+
+    for cx, cy, side, confidence in zip(center_x.tolist(), center_y.tolist(), sides.tolist(), confidences.tolist()):
+        kernel = _gaussian_kernel(side)
+        window_size = kernel.shape[0] // 2
+        y_min = max(0, cy - window_size)
+        y_max = min(height, cy + window_size)
+        x_min = max(0, cx - window_size)
+        x_max = min(width, cx + window_size)
+        if y_min >= y_max or x_min >= x_max:
+            continue
+
+        mask = kernel[y_min - cy + window_size:y_max - cy + window_size,
+                      x_min - cx + window_size:x_max - cx + window_size]
+        heatmap_data[y_min:y_max, x_min:x_max] += mask * confidence
+
+    return heatmap_data
+
+@profiled("generate_heatmap_background")
+async def generate_heatmap_background(video_name: str, metadata=None, video_path=None, probe=None, detections=None, workspace=None):
     """Generar heatmap basado en metadata de detecciones"""
-    temp_video_path = TEMP_DIR / video_name
-    temp_heatmap_path = TEMP_DIR / f"heatmap_{video_name.replace('.mp4', '.png')}"
+    # OpenCV solo se carga al generar un heatmap, no al servir la API
+    import cv2
+
+    # Si el llamador ya tiene el video en disco se reutiliza y el PNG se escribe a su lado;
+    # si no, el trabajo usa su propio directorio (el recibido o uno nuevo) y lo borra al terminar
+    owns_video = video_path is None
+    if owns_video and workspace is None:
+        workspace = job_registry.open(f"heatmap_{video_name}")
+    work_dir = workspace.dir if owns_video else Path(video_path).parent
+    temp_video_path = work_dir / video_name if owns_video else video_path
+    temp_heatmap_path = work_dir / f"heatmap_{video_name.replace('.mp4', '.png')}"
     
     try:
-        # Obtener metadata si no fue proporcionada
-        if metadata is None:
-            video_data = get_video_data(video_name)
-            if video_data and video_data.get("metadata"):
-                metadata = video_data["metadata"]
+        # Obtener detecciones si no fueron proporcionadas (formato binario si existe)
+        if detections is None:
+            if metadata is not None:
+                detections = load_detections(None, metadata)
             else:
+                video_detections = get_video_detections(video_name)
+                if video_detections:
+                    detections = load_detections(video_detections["detections_bin"], video_detections["metadata"])
+            if detections is None:
                 raise Exception("No metadata available for heatmap generation")
 
         # Descargar video original si es necesario
-        blob = original_bucket.blob(video_name)
-        blob.download_to_filename(str(temp_video_path))
+        if owns_video:
+            try:
+                download_to_filename(ORIGINAL_VIDEOS_BUCKET, video_name, temp_video_path)
+            except NotFound:
+                raise Exception(f"Video {video_name} not found in storage")
 
         # Abrir video
         cap = cv2.VideoCapture(str(temp_video_path))
@@ -102,79 +172,46 @@ async def generate_heatmap_background(video_name: str, metadata=None):
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         
-        # Obtener frame del medio para fondo
+        # Obtener frame del medio para fondo: con el índice de keyframes se usa el
+        # keyframe del GOP central, que se lee sin decodificar frames intermedios
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames // 2)
-        ret, background = cap.read()
         cap.release()
-
-        if not ret:
+        if probe is None:
+            probe = get_video_probe(video_name, include_keyframes=True) or {}
+        keyframes = probe.get("keyframes")
+        middle_frame = total_frames // 2
+        if keyframes:
+            middle_frame = nearest_keyframe(keyframes, middle_frame)
+        background = read_frame(temp_video_path, middle_frame, keyframes)
+
+        if background is None:
             raise Exception("Cannot read background frame")
 
         # Oscurecer fondo
-        background = cv2.convertScaleAbs(background, alpha=0.3, beta=0)
+        background = cv2.convertScaleAbs(background, alpha=HEATMAP_BACKGROUND_ALPHA, beta=0)
 
-        # Crear heatmap
-        heatmap_data = np.zeros((height, width), dtype=np.float32)
-        
-        # Procesar detecciones en lotes
-        batch_size = 100
-        for i in range(0, len(metadata), batch_size):
-            batch = metadata[i:i + batch_size]
-            
-            for detection in batch:
-                for obj in detection.get("objects", []):
-                    try:
-                        x1, y1, x2, y2 = map(int, obj["coordinates"][0])
-                        confidence = float(obj.get("confidence", 1.0))
-                        
-                        # Validar coordenadas
-                        x1 = max(0, min(x1, width-1))
-                        x2 = max(0, min(x2, width-1))
-                        y1 = max(0, min(y1, height-1))
-                        y2 = max(0, min(y2, height-1))
-                        
-                        if x1 >= x2 or y1 >= y2:
-                            continue
-                        
-                        # Crear máscara gaussiana
-                        center_x = (x1 + x2) // 2
-                        center_y = (y1 + y2) // 2
-                        sigma = max(x2 - x1, y2 - y1) / 4
-                        
-                        window_size = int(sigma * 3)
-                        y_min = max(0, center_y - window_size)
-                        y_max = min(height, center_y + window_size)
-                        x_min = max(0, center_x - window_size)
-                        x_max = min(width, center_x + window_size)
-                        
-                        y, x = np.ogrid[y_min-center_y:y_max-center_y, x_min-center_x:x_max-center_x]
-                        mask = np.exp(-(x*x + y*y) / (2*sigma*sigma))
-                        heatmap_data[y_min:y_max, x_min:x_max] += mask * confidence
-
-                    except Exception as e:
-                        logger.error(f"Error processing detection: {str(e)}")
-                        continue
+        # Crear heatmap directamente sobre el array de detecciones
+        heatmap_data = accumulate_heatmap(detections, width, height)
 
         if np.max(heatmap_data) > 0:
             # Normalizar y procesar heatmap
             heatmap_data = cv2.normalize(heatmap_data, None, 0, 255, cv2.NORM_MINMAX)
             heatmap_data = heatmap_data.astype(np.uint8)
-            heatmap_data[heatmap_data < 50] = 0
+            heatmap_data[heatmap_data < HEATMAP_MIN_INTENSITY] = 0
             heatmap_colored = cv2.applyColorMap(heatmap_data, cv2.COLORMAP_JET)
             
             # Combinar con fondo
-            result = cv2.addWeighted(background, 1, heatmap_colored, 0.7, 0)
+            result = cv2.addWeighted(background, 1, heatmap_colored, HEATMAP_OVERLAY_WEIGHT, 0)
             
             # Guardar temporalmente
             cv2.imwrite(str(temp_heatmap_path), result, [cv2.IMWRITE_PNG_COMPRESSION, 9])
             
             # Subir a GCS
-            heatmap_blob = heatmaps_bucket.blob(f"heatmap_{video_name.replace('.mp4', '.png')}")
-            heatmap_blob.upload_from_filename(str(temp_heatmap_path))
+            heatmap_blob_name = f"heatmap_{video_name.replace('.mp4', '.png')}"
+            upload_file(HEATMAPS_BUCKET, heatmap_blob_name, temp_heatmap_path, content_type="image/png")
             
             # Actualizar base de datos
-            gcs_path = f"gs://{HEATMAPS_BUCKET}/heatmap_{video_name.replace('.mp4', '.png')}"
+            gcs_path = gcs_uri(HEATMAPS_BUCKET, heatmap_blob_name)
             insert_or_update_video_data(video_name, heatmap_path=gcs_path)
             
             return str(temp_heatmap_path)
@@ -187,6 +224,6 @@ async def generate_heatmap_background(video_name: str, metadata=None):
             os.remove(str(temp_heatmap_path))
         raise e
     finally:
-        # Limpiar archivos temporales
-        if os.path.exists(str(temp_video_path)):
-            os.remove(str(temp_video_path))
+        # Limpiar el directorio del trabajo
+        if owns_video:
+            job_registry.close(workspace)
@@ -0,0 +1,192 @@
+import ast
+import argparse
+from abc import ABC, abstractmethod
+import logging
+import threading
+from pathlib import Path
+import numpy as np
+from config import *
+
+logger = logging.getLogger(__name__)
+
+class InferenceBackend(ABC):
+    """Interfaz común: predict devuelve por imagen un array (N, 6): x1, y1, x2, y2, confianza, clase"""
+
+    name = "base"
+
+    def __init__(self, model_path: Path):
+        self.model_path = Path(model_path)
+        self.names = {}
+
+    @abstractmethod
+    def predict(self, images, imgsz: int = None):
+        """Detectar objetos en un lote de imágenes BGR"""
+
+class UltralyticsBackend(InferenceBackend):
+    """Modelo cargado con ultralytics: pesos PyTorch (.pt) o un directorio exportado a OpenVINO"""
+
+    name = "torch"
+
+    def __init__(self, model_path: Path):
+        super().__init__(model_path)
+        from ultralytics import YOLO
+
+        self.model = YOLO(str(self.model_path), task="detect")
+        self.names = self.model.names
+
+    def predict(self, images, imgsz: int = None):
+        kwargs = {"verbose": False, "conf": CONFIDENCE_THRESHOLD}
+        if imgsz:
+            kwargs["imgsz"] = imgsz
+        outputs = []
+        for result in self.model(images, **kwargs):
+            boxes = result.boxes
+            outputs.append(np.column_stack([
+                boxes.xyxy.cpu().numpy(),
+                boxes.conf.cpu().numpy(),
+                boxes.cls.cpu().numpy()
+            ]).astype(np.float32))
+        return outputs
+
+class OpenVINOBackend(UltralyticsBackend):
+    name = "openvino"
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """Modelo YOLOv8 exportado a ONNX ejecutado con ONNX Runtime en CPU (sin torch)"""
+
+    name = "onnx"
+
+    def __init__(self, model_path: Path):
+        super().__init__(model_path)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if INFERENCE_THREADS > 0:
+            options.intra_op_num_threads = INFERENCE_THREADS
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(self.model_path), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+        # ultralytics guarda las etiquetas en los metadatos del modelo
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+
+    def _letterbox(self, image, imgsz: int):
+        import cv2
+
+        height, width = image.shape[:2]
+        ratio = min(imgsz / height, imgsz / width)
+        new_width, new_height = int(round(width * ratio)), int(round(height * ratio))
+        pad_x, pad_y = (imgsz - new_width) // 2, (imgsz - new_height) // 2
+
+        canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+        canvas[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = cv2.resize(
+            image, (new_width, new_height), interpolation=cv2.INTER_LINEAR
+        )
+        return canvas, ratio, pad_x, pad_y
+
+    def predict(self, images, imgsz: int = None):
+        from tiling import nms
+
+        imgsz = imgsz or INFERENCE_IMGSZ
+        batch = []
+        transforms = []
+        for image in images:
+            canvas, ratio, pad_x, pad_y = self._letterbox(image, imgsz)
+            batch.append(canvas[:, :, ::-1].transpose(2, 0, 1))  # BGR -> RGB, HWC -> CHW
+            transforms.append((ratio, pad_x, pad_y, image.shape[1], image.shape[0]))
+        tensor = np.ascontiguousarray(np.stack(batch), dtype=np.float32) / 255.0
+
+        # Salida YOLOv8: (batch, 4 + clases, candidatos) con cajas cx, cy, w, h
+        predictions = self.session.run(None, {self.input_name: tensor})[0]
+
+        outputs = []
+        for prediction, (ratio, pad_x, pad_y, width, height) in zip(predictions, transforms):
+            prediction = prediction.T
+            scores = prediction[:, 4:]
+            classes = scores.argmax(axis=1)
+            confidences = scores[np.arange(len(scores)), classes]
+            mask = confidences >= CONFIDENCE_THRESHOLD
+            prediction, classes, confidences = prediction[mask], classes[mask], confidences[mask]
+
+            cx, cy, w, h = prediction[:, 0], prediction[:, 1], prediction[:, 2], prediction[:, 3]
+            boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+            boxes[:, [0, 2]] = np.clip((boxes[:, [0, 2]] - pad_x) / ratio, 0, width)
+            boxes[:, [1, 3]] = np.clip((boxes[:, [1, 3]] - pad_y) / ratio, 0, height)
+
+            keep = nms(boxes, confidences, classes, INFERENCE_NMS_IOU)[:INFERENCE_MAX_DETECTIONS]
+            outputs.append(np.column_stack([boxes[keep], confidences[keep], classes[keep]]).astype(np.float32))
+        return outputs
+
+BACKENDS = {
+    "torch": UltralyticsBackend,
+    "onnx": OnnxRuntimeBackend,
+    "openvino": OpenVINOBackend,
+}
+
+def exported_model_path(backend: str, int8: bool = INFERENCE_INT8) -> Path:
+    """Ruta del modelo para un backend (el .pt original o el artefacto exportado)"""
+    suffix = "_int8" if int8 else ""
+    if backend == "onnx":
+        return MODEL_PATH.with_name(f"{MODEL_PATH.stem}{suffix}.onnx")
+    if backend == "openvino":
+        return MODEL_PATH.with_name(f"{MODEL_PATH.stem}{suffix}_openvino_model")
+    return MODEL_PATH
+
+def export_model(backend: str, int8: bool = INFERENCE_INT8, force: bool = False) -> Path:
+    """Exportar MODEL_PATH al formato del backend (paso de build: `python inference.py <backend>`; requiere ultralytics)"""
+    target = exported_model_path(backend, int8)
+    if backend == "torch" or (target.exists() and not force):
+        return target
+
+    from ultralytics import YOLO
+
+    model = YOLO(str(MODEL_PATH))
+    if backend == "onnx":
+        onnx_path = Path(model.export(format="onnx", imgsz=INFERENCE_IMGSZ, dynamic=True, simplify=True))
+        if int8:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+
+            quantize_dynamic(str(onnx_path), str(target), weight_type=QuantType.QUInt8)
+        elif onnx_path != target:
+            onnx_path.replace(target)
+    elif backend == "openvino":
+        exported = Path(model.export(format="openvino", imgsz=INFERENCE_IMGSZ, int8=int8))
+        if exported != target:
+            exported.replace(target)
+    else:
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    logger.info(f"Modelo exportado para {backend}: {target}")
+    return target
+
+_backends = {}
+_lock = threading.Lock()
+
+def get_backend(backend: str = INFERENCE_BACKEND, int8: bool = INFERENCE_INT8) -> InferenceBackend:
+    """Obtener el backend de inferencia del proceso (el modelo se carga una sola vez)"""
+    key = (backend, int8)
+    if key not in _backends:
+        with _lock:
+            if key not in _backends:
+                if backend not in BACKENDS:
+                    raise ValueError(f"Unknown inference backend: {backend}")
+                # En ejecución solo se carga el artefacto; la exportación se hace al construir la imagen
+                model_path = exported_model_path(backend, int8)
+                if not model_path.exists():
+                    raise FileNotFoundError(
+                        f"Model for backend {backend} not found at {model_path}; "
+                        f"export it first with `python inference.py {backend}{' --int8' if int8 else ''}`"
+                    )
+                _backends[key] = BACKENDS[backend](model_path)
+                logger.info(f"Backend de inferencia cargado: {backend} ({model_path.name})")
+    return _backends[key]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exportar el modelo YOLO para un backend de inferencia")
+    parser.add_argument("backend", choices=sorted(BACKENDS))
+    parser.add_argument("--int8", action="store_true", help="cuantizar a INT8")
+    parser.add_argument("--force", action="store_true", help="volver a exportar aunque exista")
+    args = parser.parse_args()
+    print(export_model(args.backend, int8=args.int8, force=args.force))
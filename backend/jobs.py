@@ -0,0 +1,228 @@
+import os
+import time
+import shutil
+import logging
+import argparse
+import threading
+import uuid
+from contextvars import ContextVar
+from config import *
+
+logger = logging.getLogger(__name__)
+
+# Cada trabajo trabaja en TEMP_DIR/jobs/<pid>-<id>; el pid identifica al worker dueño del directorio
+JOBS_DIR = TEMP_DIR / "jobs"
+# El hook preStop crea este archivo para que todos los workers del pod empiecen a drenar
+DRAIN_FLAG = JOBS_DIR / ".draining"
+
+MB = 1024 * 1024
+
+# Trabajo en curso; asyncio.to_thread copia el contexto, así que también llega a sus hilos
+current_job = ContextVar("current_job", default=None)
+
+class JobRejected(Exception):
+    """Trabajo no admitido; la API responde con status_code y headers"""
+    status_code = 503
+    headers = None
+
+class Draining(JobRejected):
+    """El servidor se está cerrando y no acepta trabajos nuevos"""
+    status_code = 503
+    headers = {"Retry-After": str(JOB_RETRY_AFTER)}
+
+class DiskQuotaExceeded(JobRejected):
+    """El trabajo no cabe (o ya no cabe) en su cuota de disco o en el espacio libre"""
+    status_code = 507
+
+class JobInterrupted(Exception):
+    """Trabajo detenido por el cierre del servidor; frames y metadata son el progreso de la inferencia"""
+
+    def __init__(self, message: str, frames: int = 0, metadata=None):
+        super().__init__(message)
+        self.frames = frames
+        self.metadata = metadata
+
+def _owner_pid(path) -> int:
+    try:
+        return int(path.name.split("-", 1)[0])
+    except ValueError:
+        return None
+
+def _pid_alive(pid: int) -> bool:
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _directory_size(path) -> int:
+    total = 0
+    for directory, _, files in os.walk(str(path)):
+        for file_name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, file_name))
+            except OSError:
+                pass
+    return total
+
+class JobWorkspace:
+    """Directorio temporal propio de un trabajo, con su cuota de disco"""
+
+    def __init__(self, registry, name: str, reserved: int, quota: int):
+        self.registry = registry
+        self.name = name
+        self.job_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.dir = JOBS_DIR / self.job_id
+        self.reserved = reserved
+        self.quota = quota
+        self._interrupt = threading.Event()
+        self.dir.mkdir(parents=True)
+
+    def path(self, file_name: str):
+        return self.dir / file_name
+
+    def usage(self) -> int:
+        return _directory_size(self.dir)
+
+    def check_quota(self):
+        """Llamado entre etapas: falla el trabajo si sus archivos superan la cuota"""
+        usage = self.usage()
+        if self.quota and usage > self.quota:
+            raise DiskQuotaExceeded(f"Job {self.name} uses {usage // MB} MB, quota is {self.quota // MB} MB")
+
+    def interrupt(self):
+        self._interrupt.set()
+
+    def interrupted(self) -> bool:
+        return self._interrupt.is_set() or self.registry.interrupt.is_set()
+
+def raise_if_interrupted(frames: int = 0, metadata=None):
+    """Llamado entre frames: si el trabajo en curso debe detenerse, lanza JobInterrupted con su progreso"""
+    job = current_job.get()
+    if job is not None and job.interrupted():
+        raise JobInterrupted(f"{job.name} interrupted at frame {frames}", frames, metadata)
+
+class JobRegistry:
+    """Trabajos activos de este worker y protocolo de cierre
+
+    Al drenar se rechazan trabajos nuevos (Draining), se espera JOB_DRAIN_TIMEOUT a los
+    activos y después se les pide que se detengan guardando su progreso; solo se borran
+    los directorios de trabajos terminados.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.draining = False
+        self.interrupt = threading.Event()
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def check_accepting(self):
+        if self.draining:
+            raise Draining("Server is shutting down, retry later")
+
+    def open(self, name: str, size_hint: int = 0) -> JobWorkspace:
+        """Crear el directorio de un trabajo reservando disco para él (tamaño del original × JOB_DISK_FACTOR)"""
+        self.check_accepting()
+        quota = JOB_DISK_QUOTA_MB * MB
+        estimate = int(size_hint * JOB_DISK_FACTOR)
+        if quota and estimate > quota:
+            raise DiskQuotaExceeded(f"Job {name} needs ~{estimate // MB} MB, quota is {JOB_DISK_QUOTA_MB} MB")
+
+        JOBS_DIR.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            # Lo que los trabajos activos aún no han escrito de su reserva no está disponible
+            pending = sum(max(0, job.reserved - job.usage()) for job in self.jobs.values())
+            available = shutil.disk_usage(str(JOBS_DIR)).free - TEMP_MIN_FREE_MB * MB - pending
+            if estimate > available:
+                raise DiskQuotaExceeded(f"Not enough disk for {name}: needs ~{estimate // MB} MB, {max(0, available) // MB} MB available")
+            workspace = JobWorkspace(self, name, estimate, quota)
+            self.jobs[workspace.job_id] = workspace
+        return workspace
+
+    def close(self, workspace: JobWorkspace, remove: bool = True):
+        """Dar de baja un trabajo terminado y borrar su directorio"""
+        with self._lock:
+            self.jobs.pop(workspace.job_id, None)
+        if remove:
+            shutil.rmtree(str(workspace.dir), ignore_errors=True)
+        else:
+            logger.warning(f"Leaving {workspace.dir} of {workspace.name}: its worker thread may still be writing")
+
+    def _wait(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while self.jobs and time.monotonic() < deadline:
+            time.sleep(0.5)
+        return not self.jobs
+
+    def drain(self, timeout: float = JOB_DRAIN_TIMEOUT, checkpoint_timeout: float = JOB_CHECKPOINT_TIMEOUT) -> int:
+        """Dejar de aceptar trabajos y esperar a los activos (bloqueante); devuelve los que siguen en curso"""
+        if not self.draining:
+            self.draining = True
+            logger.info(f"Draining {len(self.jobs)} job(s)")
+        if not self._wait(timeout):
+            logger.warning(f"{len(self.jobs)} job(s) still running after {timeout}s, requesting checkpoints")
+            self.interrupt.set()
+            self._wait(checkpoint_timeout)
+        if self.jobs:
+            logger.error(f"Jobs still running at shutdown: {sorted(job.name for job in self.jobs.values())}")
+        return len(self.jobs)
+
+    def start_drain_watcher(self, interval: float = 1.0):
+        """Hilo que empieza a drenar cuando aparece DRAIN_FLAG (independiente del event loop)"""
+        def watch():
+            while not self.draining:
+                try:
+                    # Una marca anterior al arranque de este worker es de un cierre previo
+                    if DRAIN_FLAG.stat().st_mtime >= self.started_at:
+                        self.drain()
+                        return
+                except FileNotFoundError:
+                    pass
+                time.sleep(interval)
+
+        threading.Thread(target=watch, name="drain-watcher", daemon=True).start()
+
+    def cleanup_orphans(self):
+        """Borrar los directorios de trabajos cuyo worker ya no existe (cierres abruptos anteriores)"""
+        if not JOBS_DIR.exists():
+            return
+        for entry in JOBS_DIR.iterdir():
+            if entry.is_dir() and not _pid_alive(_owner_pid(entry)):
+                logger.info(f"Removing orphaned job directory {entry.name}")
+                shutil.rmtree(str(entry), ignore_errors=True)
+
+job_registry = JobRegistry()
+
+def active_job_dirs():
+    """Directorios de trabajos en curso en cualquier worker del contenedor"""
+    if not JOBS_DIR.exists():
+        return []
+    return [entry for entry in JOBS_DIR.iterdir() if entry.is_dir() and _pid_alive(_owner_pid(entry))]
+
+if __name__ == "__main__":
+    logging.basicConfig(level=LOG_LEVEL)
+    parser = argparse.ArgumentParser(description="Drenar los trabajos de todos los workers (hook preStop)")
+    parser.add_argument("command", choices=["drain"])
+    parser.add_argument("--timeout", type=float, default=JOB_DRAIN_TIMEOUT + JOB_CHECKPOINT_TIMEOUT + 10,
+                        help="segundos máximos de espera")
+    parser.add_argument("--interval", type=float, default=2, help="segundos entre comprobaciones")
+    args = parser.parse_args()
+
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    DRAIN_FLAG.touch()
+    deadline = time.monotonic() + args.timeout
+    while True:
+        active = active_job_dirs()
+        if not active:
+            print("No jobs running", flush=True)
+            break
+        if time.monotonic() >= deadline:
+            print(f"Timeout with {len(active)} job(s) still running", flush=True)
+            break
+        print(f"Waiting for {len(active)} job(s)", flush=True)
+        time.sleep(args.interval)
@@ -0,0 +1,225 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+import cv2
+import numpy as np
+from config import *
+from annotation import AnnotationRenderer
+from database import get_video_detections
+from detections import DETECTION_DTYPE, load_detections
+from gcs import get_blob, signed_url, NotFound
+
+logger = logging.getLogger(__name__)
+
+BOUNDARY = "frame"
+
+def resolve_source(video_name: str):
+    """Fuente de un canal: (URL para OpenCV, detecciones guardadas o None, reproducir a tiempo real)"""
+    if video_name in LIVE_SOURCES:
+        # Fuente en vivo configurada (p. ej. RTSP): siempre pasa por la detección
+        return LIVE_SOURCES[video_name], None, False
+
+    if get_blob(ORIGINAL_VIDEOS_BUCKET, video_name) is None:
+        raise NotFound(f"Video {video_name} not found in original bucket")
+
+    # Se decodifica el original (el procesado ya lleva las cajas dibujadas) leyéndolo por rangos
+    video_detections = get_video_detections(video_name)
+    detections = load_detections(video_detections["detections_bin"], video_detections["metadata"]) if video_detections else None
+    return signed_url(ORIGINAL_VIDEOS_BUCKET, video_name), detections, True
+
+class LiveChannel:
+    """Vista en vivo de un video: un solo decode + anotación + JPEG compartido por todos sus espectadores
+
+    Un hilo productor lee la fuente, dibuja las detecciones guardadas (o las infiere al vuelo
+    si el video aún se está procesando) y publica cada JPEG en un buffer acotado. Cada
+    espectador recorre el buffer a su ritmo; si se queda atrás más de LIVE_BUFFER_FRAMES
+    salta a los frames disponibles en lugar de frenar al productor.
+    """
+
+    def __init__(self, video_name: str, source: str, detections=None, realtime: bool = True, on_close=None):
+        self.video_name = video_name
+        self.source = source
+        self.detections = detections
+        self.realtime = realtime
+        self.viewers = 0
+        self.finished = False
+        self._on_close = on_close
+        self._loop = asyncio.get_running_loop()
+        self._buffer = deque(maxlen=LIVE_BUFFER_FRAMES)  # (secuencia, bytes de la parte multipart)
+        self._published = self._loop.create_future()
+        self._idle_since = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"live-{video_name}", daemon=True)
+        self._thread.start()
+
+    def _call(self, callback, *args):
+        """Ejecutar en el event loop desde el hilo productor (ignorado si el loop ya se cerró)"""
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass
+
+    def _publish(self, seq: int, part: bytes):
+        self._buffer.append((seq, part))
+        self._wake()
+
+    def _wake(self):
+        self._published.set_result(None)
+        self._published = self._loop.create_future()
+
+    def _close(self):
+        self.finished = True
+        self._wake()
+        if self._on_close:
+            self._on_close(self)
+
+    def _annotator(self, scale: float):
+        """Función (frame, índice) que dibuja las detecciones en el frame ya reescalado"""
+        if self.detections is not None:
+            renderer = AnnotationRenderer(self.detections.labels)
+            frame_groups = self.detections.iter_frames()
+            state = {"group": next(frame_groups, None)}
+
+            def draw_stored(frame, index):
+                # Los grupos se recorren en orden junto con los frames, como en el render del video
+                while state["group"] is not None and state["group"][0] < index:
+                    state["group"] = next(frame_groups, None)
+                if state["group"] is not None and state["group"][0] == index:
+                    renderer.draw(frame, _scale_rows(state["group"][1], scale))
+            return draw_stored
+
+        if LIVE_DETECT_INTERVAL <= 0:
+            # Por defecto la API no carga el backend de inferencia: sin detecciones guardadas se emite el video sin cajas
+            return lambda frame, index: None
+
+        # Sin detecciones guardadas: inferir cada LIVE_DETECT_INTERVAL frames y repetir las cajas entre medias
+        from inference import get_backend
+        backend = get_backend()
+        renderer = AnnotationRenderer([backend.names[index] for index in sorted(backend.names)])
+        state = {"rows": np.empty(0, dtype=DETECTION_DTYPE)}
+
+        def draw_detected(frame, index):
+            if index % LIVE_DETECT_INTERVAL == 0:
+                boxes = backend.predict([frame])[0]
+                boxes = boxes[boxes[:, 4] > CONFIDENCE_THRESHOLD]
+                rows = np.zeros(len(boxes), dtype=DETECTION_DTYPE)
+                rows["label_id"] = boxes[:, 5]
+                rows["conf"] = boxes[:, 4]
+                rows["box"] = np.clip(boxes[:, :4], -32768, 32767)
+                state["rows"] = rows
+            renderer.draw(frame, state["rows"])
+        return draw_detected
+
+    def _run(self):
+        cap = cv2.VideoCapture(self.source)
+        try:
+            if not cap.isOpened():
+                raise Exception(f"Could not open live source for {self.video_name}")
+
+            fps = cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            scale = min(1.0, LIVE_MAX_WIDTH / width) if width else 1.0
+            size = (round(width * scale), round(height * scale))
+            draw = self._annotator(scale)
+
+            index = 0
+            next_time = time.monotonic()
+            while True:
+                if self.viewers == 0 and time.monotonic() - self._idle_since > LIVE_IDLE_SECONDS:
+                    logger.info(f"Closing idle live channel for {self.video_name}")
+                    break
+
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                # Reescalar antes de dibujar y codificar: menos píxeles por frame y texto legible
+                if scale < 1.0:
+                    frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                draw(frame, index)
+                ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, LIVE_JPEG_QUALITY])
+                if ok:
+                    jpeg = jpeg.tobytes()
+                    part = (f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+                            + jpeg + b"\r\n")
+                    self._call(self._publish, index, part)
+                index += 1
+
+                # Un archivo se reproduce a sus fps; una fuente en vivo ya marca el ritmo en read()
+                if self.realtime:
+                    next_time += 1 / fps
+                    delay = next_time - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_time = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error in live channel for {self.video_name}: {str(e)}")
+        finally:
+            cap.release()
+            self._call(self._close)
+
+    async def mjpeg(self):
+        """Partes multipart/x-mixed-replace para un espectador, en orden mientras siga el ritmo"""
+        self.viewers += 1
+        last = -1
+        try:
+            while True:
+                pending = [item for item in self._buffer if item[0] > last]
+                for seq, part in pending:
+                    last = seq
+                    yield part
+                if pending:
+                    continue
+                if self.finished:
+                    return
+                # asyncio.wait no cancela el futuro compartido si este espectador se desconecta
+                await asyncio.wait({self._published}, timeout=LIVE_IDLE_SECONDS)
+        finally:
+            self.viewers -= 1
+            if self.viewers == 0:
+                self._idle_since = time.monotonic()
+
+def _scale_rows(rows, scale: float):
+    """Registros de detecciones con las cajas en la escala del frame de la vista en vivo"""
+    if scale == 1.0:
+        return rows
+    scaled = rows.copy()
+    scaled["box"] = np.rint(rows["box"] * scale)
+    return scaled
+
+class LiveHub:
+    """Canales en vivo de este proceso
+
+    Los canales no se comparten entre procesos: cada worker de uvicorn (y cada pod) decodifica
+    por separado los videos que sus espectadores piden, así que LIVE_MAX_CHANNELS es por worker.
+    """
+
+    def __init__(self):
+        self.channels = {}
+        self._lock = None
+
+    async def open(self, video_name: str):
+        """Canal del video (se reutiliza si ya está abierto); None si el worker está al límite"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            channel = self.channels.get(video_name)
+            if channel is not None and not channel.finished:
+                return channel
+            if len(self.channels) >= LIVE_MAX_CHANNELS:
+                return None
+
+            source, detections, realtime = await asyncio.to_thread(resolve_source, video_name)
+            channel = LiveChannel(video_name, source, detections, realtime, on_close=self._remove)
+            self.channels[video_name] = channel
+            logger.info(f"Live channel opened for {video_name} ({'stored' if detections is not None else 'live'} detections)")
+            return channel
+
+    def _remove(self, channel: LiveChannel):
+        if self.channels.get(channel.video_name) is channel:
+            del self.channels[channel.video_name]
+
+live_hub = LiveHub()
@@ -0,0 +1,144 @@
+import os
+import base64
+import hashlib
+import shutil
+import uuid
+from datetime import datetime, timezone
+from google.api_core.exceptions import NotFound, RequestRangeNotSatisfiable
+
+class LocalBlob:
+    """Objeto de un bucket local: archivo en <raíz>/<bucket>/<nombre> con la interfaz de storage.Blob que usa gcs.py"""
+
+    def __init__(self, bucket, name: str, generation: int = None):
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+        self.crc32c = None
+        self.md5_hash = None
+        self.size = None
+        self.generation = generation
+        self.updated = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.bucket.path, self.name)
+
+    def _require(self):
+        if not os.path.isfile(self.path):
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+
+    def reload(self):
+        """Cargar tamaño, generación (mtime en ns) y md5 como los devolvería GCS"""
+        self._require()
+        stat = os.stat(self.path)
+        md5 = hashlib.md5()
+        with open(self.path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                md5.update(chunk)
+        self.size = stat.st_size
+        self.generation = stat.st_mtime_ns
+        self.updated = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+        self.md5_hash = base64.b64encode(md5.digest()).decode()
+        return self
+
+    def exists(self, **kwargs) -> bool:
+        return os.path.isfile(self.path)
+
+    def download_to_filename(self, filename, **kwargs):
+        self._require()
+        shutil.copyfile(self.path, str(filename))
+
+    def download_as_bytes(self, start: int = None, end: int = None, **kwargs) -> bytes:
+        self._require()
+        size = os.path.getsize(self.path)
+        start = start or 0
+        if start and start >= size:
+            raise RequestRangeNotSatisfiable(f"Range {start}- not satisfiable for {self.name}")
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(end - start + 1)
+
+    def _write(self, write):
+        # Escritura atómica: un lector nunca ve un objeto a medio subir
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as f:
+            write(f)
+        os.replace(temp_path, self.path)
+        self.reload()
+
+    def upload_from_string(self, data, content_type: str = None, **kwargs):
+        self.content_type = content_type
+        self._write(lambda f: f.write(data.encode() if isinstance(data, str) else data))
+
+    def upload_from_filename(self, filename, content_type: str = None, **kwargs):
+        self.content_type = content_type
+
+        def write(f):
+            with open(str(filename), "rb") as source:
+                shutil.copyfileobj(source, f)
+        self._write(write)
+
+    def upload_from_file(self, file_obj, size: int = None, content_type: str = None, **kwargs):
+        self.content_type = content_type
+        self._write(lambda f: f.write(file_obj.read(size) if size is not None else file_obj.read()))
+
+    def compose(self, sources, **kwargs):
+        def write(f):
+            for source in sources:
+                with open(source.path, "rb") as part:
+                    shutil.copyfileobj(part, f)
+        self._write(write)
+
+    def delete(self, **kwargs):
+        self._require()
+        os.remove(self.path)
+
+    def generate_signed_url(self, **kwargs) -> str:
+        # OpenCV/ffmpeg leen la ruta local directamente
+        self._require()
+        return self.path
+
+class LocalBucket:
+    def __init__(self, client, name: str):
+        self.client = client
+        self.name = name
+        self.path = os.path.join(client.root, name)
+        os.makedirs(self.path, exist_ok=True)
+
+    def exists(self, **kwargs) -> bool:
+        return os.path.isdir(self.path)
+
+    def blob(self, blob_name: str, generation: int = None) -> LocalBlob:
+        return LocalBlob(self, blob_name, generation=generation)
+
+    def get_blob(self, blob_name: str, **kwargs):
+        blob = self.blob(blob_name)
+        return blob.reload() if blob.exists() else None
+
+class LocalStorageClient:
+    """Sustituto de storage.Client respaldado por el sistema de archivos (GCS_BACKEND=local)
+
+    Para desarrollo y benchmarks sin credenciales ni red: cada bucket es un directorio
+    bajo la raíz y se crea al primer uso.
+    """
+
+    def __init__(self, root):
+        self.root = str(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def bucket(self, bucket_name: str) -> LocalBucket:
+        return LocalBucket(self, bucket_name)
+
+    def list_blobs(self, bucket_name: str, prefix: str = None, **kwargs):
+        bucket = self.bucket(bucket_name)
+        names = []
+        for directory, _, files in os.walk(bucket.path):
+            for file_name in files:
+                if file_name.endswith(".tmp"):
+                    continue
+                name = os.path.relpath(os.path.join(directory, file_name), bucket.path).replace(os.sep, "/")
+                if prefix is None or name.startswith(prefix):
+                    names.append(name)
+        for name in sorted(names):
+            yield bucket.blob(name).reload()
@@ -1,6 +1,6 @@
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from video_routes import video_router
 from metadata_routes import metadata_router
@@ -9,14 +9,18 @@ from heatmap import heatmap_router
 from database import init_database
 from config import *
 import logging
-from google.cloud import storage
-from google.oauth2 import service_account
+import asyncio
+from gcs import validate_buckets
+from catalog import catalog_reconciler_loop
+from serialization import ORJSONResponse
+from metrics import MetricsMiddleware, render_metrics, event_loop_lag_monitor
+from jobs import job_registry
 
 # Configurar logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Sistema de Detección de Videos")
+app = FastAPI(title="Sistema de Detección de Videos", default_response_class=ORJSONResponse)
 
 @app.get("/")
 async def root():
@@ -25,15 +29,6 @@ async def root():
 # Inicializar la base de datos al inicio
 init_database()
 
-# Inicializar cliente de Google Cloud Storage con credenciales
-credentials = service_account.Credentials.from_service_account_file('service-account-key.json')
-storage_client = storage.Client(credentials=credentials, project='video-detection-2024')
-
-# Obtener buckets
-original_bucket = storage_client.bucket(ORIGINAL_VIDEOS_BUCKET)
-processed_bucket = storage_client.bucket(PROCESSED_VIDEOS_BUCKET)
-heatmaps_bucket = storage_client.bucket(HEATMAPS_BUCKET)
-
 class CustomStaticFiles(StaticFiles):
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """Personalizar el manejo de archivos estáticos para incluir CORS y streaming"""
@@ -64,6 +59,9 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Latencia HTTP por plantilla de ruta
+app.add_middleware(MetricsMiddleware)
+
 # Configuración de directorio temporal
 TEMP_DIR.mkdir(exist_ok=True)
 
@@ -80,6 +78,12 @@ app.include_router(heatmap_router, prefix="/api/heatmap", tags=["Heatmap"])
 async def health_check():
     return {"status": "healthy"}
 
+# Métricas Prometheus (agregadas de todos los workers si PROMETHEUS_MULTIPROC_DIR está definido)
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 # Manejadores de errores
 @app.exception_handler(404)
 async def custom_404_handler(request: Request, exc):
@@ -103,19 +107,27 @@ async def startup_event():
         # Verificar archivo de credenciales
         print("1. Verificando archivo de credenciales...")
         credentials_path = os.path.abspath('service-account-key.json')
-        if not os.path.exists(credentials_path):
+        if GCS_BACKEND == "gcs" and not os.path.exists(credentials_path):
             raise Exception(f"Archivo de credenciales no encontrado en: {credentials_path}")
         
-        # Verificar buckets
+        # Verificar buckets (el resultado queda cacheado para los trabajos de procesamiento)
         print("2. Verificando buckets...")
-        for bucket_name in [ORIGINAL_VIDEOS_BUCKET, PROCESSED_VIDEOS_BUCKET, HEATMAPS_BUCKET]:
-            bucket = storage_client.bucket(bucket_name)
-            if not bucket.exists():
-                logger.warning(f"Bucket {bucket_name} no existe")
+        for bucket_name in validate_buckets([ORIGINAL_VIDEOS_BUCKET, PROCESSED_VIDEOS_BUCKET, HEATMAPS_BUCKET]):
+            logger.warning(f"Bucket {bucket_name} no existe")
         
         # Verificar conexión a PostgreSQL
         print("3. Verificando conexión a PostgreSQL...")
         init_database()
+
+        # Reconciliar periódicamente el catálogo de videos con GCS
+        app.state.catalog_task = asyncio.create_task(catalog_reconciler_loop())
+
+        # Medir el retraso del event loop de este worker (event_loop_lag_seconds en /metrics)
+        app.state.loop_lag_task = asyncio.create_task(event_loop_lag_monitor())
+
+        # Directorios de trabajos de workers que ya no existen y drenaje ordenado al recibir la marca del preStop
+        job_registry.cleanup_orphans()
+        job_registry.start_drain_watcher()
         
         logger.info("Aplicación iniciada correctamente")
     except Exception as e:
@@ -124,12 +136,12 @@ async def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Limpiar recursos al cerrar la aplicación"""
+    """Drenar los trabajos al cerrar la aplicación; cada trabajo terminado borra su propio directorio"""
     try:
-        # Limpiar archivos temporales
-        import shutil
-        if TEMP_DIR.exists():
-            shutil.rmtree(str(TEMP_DIR))
+        # No-op si el hook preStop ya drenó este worker; si no, los trabajos que queden guardan su checkpoint
+        remaining = await asyncio.to_thread(job_registry.drain)
+        if remaining:
+            logger.warning(f"Cerrando con {remaining} trabajo(s) en curso")
         logger.info("Aplicación cerrada correctamente")
     except Exception as e:
         logger.error(f"Error durante el cierre de la aplicación: {str(e)}")
\ No newline at end of file
@@ -1,34 +1,62 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 import logging
+import numpy as np
 from config import *
-from database import get_video_data
-from google.cloud import storage
+from database import get_video_data_raw, get_video_detections, get_video_probe, list_catalog_names_with_metadata, search_tracks, video_has_metadata, iter_metadata_frames
+from detections import DetectionSet, load_detections, summarize_by_label
+from serialization import ORJSONResponse, dumps, raw_json
+from video_probe import frame_to_timestamp
 
 logger = logging.getLogger(__name__)
-metadata_router = APIRouter()
+metadata_router = APIRouter(default_response_class=ORJSONResponse)
 
-# Inicializar cliente de Google Cloud Storage
-storage_client = storage.Client()
-original_bucket = storage_client.bucket(ORIGINAL_VIDEOS_BUCKET)
+def get_video_fps(video_name: str) -> float:
+    """FPS real registrado al procesar el video (DEFAULT_FPS si no hay probe)"""
+    probe = get_video_probe(video_name)
+    return probe["fps"] if probe and probe.get("fps") else DEFAULT_FPS
+
+def load_video_detections(video_name: str):
+    """Cargar las detecciones de un video (binario sin copia, o JSON para registros antiguos)"""
+    video_detections = get_video_detections(video_name)
+    if not video_detections:
+        return None, None
+    detections = load_detections(video_detections["detections_bin"], video_detections["metadata"])
+    return detections, video_detections
+
+def track_summary(track, fps: float, include_keypoints: bool = True):
+    """Resumen de un track con sus timestamps de inicio y fin"""
+    summary = {
+        "track_id": track["track_id"],
+        "start_frame": track["start_frame"],
+        "end_frame": track["end_frame"],
+        "timestamp": frame_to_timestamp(track["start_frame"], fps),
+        "end_timestamp": frame_to_timestamp(track["end_frame"], fps),
+        "detections": track["detections"],
+        "average_confidence": track["average_confidence"]
+    }
+    if include_keypoints:
+        summary["keypoints"] = track["keypoints"]
+    return summary
 
 @metadata_router.get("/{video_name}")
 def get_metadata(video_name: str):
     """Obtener metadata de un video específico"""
     try:
-        video_data = get_video_data(video_name)
+        # El texto JSONB de Postgres se incrusta tal cual en la respuesta (sin decodificar ni re-codificar)
+        video_data = get_video_data_raw(video_name)
         if not video_data or not video_data.get("metadata"):
             return JSONResponse(
                 content={"error": "Metadata not found", "status": "not_found"}, 
                 status_code=404
             )
             
-        return {
-            "metadata": video_data["metadata"],
+        return ORJSONResponse({
+            "metadata": raw_json(video_data["metadata"]),
             "status": "found",
             "processed_video_path": video_data.get("processed_video_path"),
             "heatmap_path": video_data.get("heatmap_path")
-        }
+        })
     except Exception as e:
         logger.error(f"Error getting metadata: {str(e)}")
         return JSONResponse(
@@ -36,51 +64,111 @@ def get_metadata(video_name: str):
             status_code=500
         )
 
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+def stream_json_items(items, fmt: str):
+    """Agrupar elementos JSON (bytes) en fragmentos NDJSON o de un array JSON"""
+    chunk = [b"["] if fmt == "json" else []
+    size = 0
+    first = True
+    for item in items:
+        if fmt == "json":
+            if not first:
+                chunk.append(b",")
+            chunk.append(item)
+        else:
+            chunk.append(item)
+            chunk.append(b"\n")
+        first = False
+        size += len(item)
+        if size >= METADATA_STREAM_CHUNK_BYTES:
+            yield b"".join(chunk)
+            chunk = []
+            size = 0
+    if fmt == "json":
+        chunk.append(b"]")
+    if chunk:
+        yield b"".join(chunk)
+
+def label_frames(video_name: str, object_label: str):
+    """Cajas por frame de una etiqueta en un video: (frames, detecciones, video_data, fps) o None"""
+    detections, video_data = load_video_detections(video_name)
+    if detections is None:
+        return None
+
+    label_id = detections.label_id(object_label)
+    if label_id is None:
+        return None
+
+    rows = detections.records[detections.label_ids == label_id]
+    if len(rows) == 0:
+        return None
+    fps = get_video_fps(video_name)
+
+    frame_results = []
+    for frame, frame_rows in DetectionSet(rows, detections.labels).iter_frames():
+        frame_results.append({
+            "frame": frame,
+            "timestamp": frame_to_timestamp(frame, fps),
+            "objects": [
+                {"coordinates": [box], "confidence": round(conf, 4)}
+                for conf, box in zip(frame_rows["conf"].tolist(), frame_rows["box"].tolist())
+            ]
+        })
+    return frame_results, len(rows), video_data, fps
+
 @metadata_router.get("/search/{object_label}")
-def search_object(object_label: str):
-    """Buscar objetos por etiqueta en todos los videos procesados"""
-    try:
-        results = []
-        blobs = storage_client.list_blobs(ORIGINAL_VIDEOS_BUCKET)
-        video_names = [blob.name for blob in blobs if blob.name.endswith('.mp4')]
-
-        for video_name in video_names:
-            try:
-                video_data = get_video_data(video_name)
-                if not video_data or not video_data.get("metadata"):
-                    continue
+def search_object(object_label: str, include_frames: bool = False):
+    """Buscar objetos por etiqueta en todos los videos procesados (un registro por objeto seguido)
 
-                metadata = video_data["metadata"]
-                if not isinstance(metadata, list):
-                    continue
+    Con include_frames se añaden las cajas por frame, que exigen recorrer las detecciones de
+    cada video e incluyen los videos procesados sin seguimiento.
+    """
+    try:
+        # Tracks de la etiqueta en todos los videos con una sola consulta: escala con el número de objetos
+        tracked = {}
+        for video_name, processed_video_path, track in search_tracks(object_label):
+            if not video_name.endswith('.mp4'):
+                continue
+            entry = tracked.get(video_name)
+            if entry is None:
+                entry = tracked[video_name] = {
+                    "video_name": video_name,
+                    "tracks": [],
+                    "processed_video_path": processed_video_path,
+                    "total_tracks": 0,
+                    "total_detections": 0,
+                    "fps": get_video_fps(video_name)
+                }
+            entry["tracks"].append(track_summary(track, entry["fps"]))
+            entry["total_tracks"] += 1
+            entry["total_detections"] += track["detections"]
 
-                frame_results = []
-                for detection in metadata:
-                    objects_found = []
-                    for obj in detection.get("objects", []):
-                        if obj["label"].lower() == object_label.lower():
-                            objects_found.append({
-                                "coordinates": obj["coordinates"],
-                                "confidence": obj.get("confidence", 1.0)
-                            })
-                    
-                    if objects_found:
-                        frame_results.append({
-                            "frame": detection["frame"],
-                            "timestamp": detection["frame"] / 30,  # Asumiendo 30 FPS
-                            "objects": objects_found
-                        })
-
-                if frame_results:
-                    results.append({
+        if include_frames:
+            video_names = [name for name in list_catalog_names_with_metadata() if name.endswith('.mp4')]
+            for video_name in video_names:
+                try:
+                    found = label_frames(video_name, object_label)
+                    if found is None:
+                        continue
+                    frame_results, total_detections, video_data, fps = found
+                    entry = tracked.setdefault(video_name, {
                         "video_name": video_name,
-                        "frames": sorted(frame_results, key=lambda x: x["frame"]),
+                        "tracks": [],
                         "processed_video_path": video_data.get("processed_video_path"),
-                        "total_detections": sum(len(frame["objects"]) for frame in frame_results)
+                        "total_tracks": 0,
+                        "fps": fps
                     })
-            except Exception as e:
-                logger.error(f"Error processing video {video_name}: {str(e)}")
-                continue
+                    entry["frames"] = frame_results
+                    entry["total_detections"] = total_detections
+                except Exception as e:
+                    logger.error(f"Error processing video {video_name}: {str(e)}")
+                    continue
+
+        results = list(tracked.values())
 
         if not results:
             return JSONResponse(
@@ -93,7 +181,7 @@ def search_object(object_label: str):
 
         # Ordenar por número total de detecciones
         results.sort(key=lambda x: x["total_detections"], reverse=True)
-        return {"results": results, "status": "found"}
+        return ORJSONResponse({"results": results, "status": "found"})
 
     except Exception as e:
         logger.error(f"Error searching objects: {str(e)}")
@@ -103,66 +191,135 @@ def search_object(object_label: str):
         )
 
 @metadata_router.get("/objects/{video_name}")
-def get_video_objects(video_name: str):
+def get_video_objects(video_name: str, include_occurrences: bool = False):
     """Obtener objetos únicos detectados en un video específico"""
     try:
-        video_data = get_video_data(video_name)
-        if not video_data or not video_data.get("metadata"):
+        detections, video_data = load_video_detections(video_name)
+        if detections is None:
             return JSONResponse(
                 content={"error": "Metadata not found", "status": "not_found"},
                 status_code=404
             )
 
-        metadata = video_data["metadata"]
-        if not isinstance(metadata, list):
-            return JSONResponse(
-                content={"error": "Invalid metadata format", "status": "error"},
-                status_code=500
-            )
+        # Estadísticas por etiqueta calculadas directamente sobre el array de detecciones
+        fps = get_video_fps(video_name)
 
-        # Obtener objetos únicos con sus frames
-        unique_objects = {}
-        for detection in metadata:
-            frame_number = detection["frame"]
-            for obj in detection.get("objects", []):
-                label = obj["label"]
-                if label not in unique_objects:
-                    unique_objects[label] = []
-                    
-                unique_objects[label].append({
-                    "frame": frame_number,
-                    "confidence": obj["confidence"],
-                    "timestamp": frame_number / 30,  # Asumiendo 30 FPS
-                    "coordinates": obj["coordinates"]
-                })
+        # Tracks agrupados por etiqueta (un registro por objeto, no por frame)
+        tracks_by_label = {}
+        for track in video_data.get("tracks") or []:
+            tracks_by_label.setdefault(track["label"], []).append(track_summary(track, fps, include_keypoints=False))
 
-        # Convertir a lista ordenada y calcular estadísticas
         objects_list = []
-        for label, occurrences in unique_objects.items():
-            total_confidence = sum(o["confidence"] for o in occurrences)
-            avg_confidence = total_confidence / len(occurrences)
-            
-            objects_list.append({
-                "label": label,
-                "occurrences": sorted(occurrences, key=lambda x: x["frame"]),
-                "total_detections": len(occurrences),
-                "average_confidence": round(avg_confidence, 3),
-                "first_detection": min(occurrences, key=lambda x: x["frame"])["frame"],
-                "last_detection": max(occurrences, key=lambda x: x["frame"])["frame"]
-            })
+        for entry in summarize_by_label(detections):
+            occurrences = []
+            if include_occurrences:
+                rows = detections.records[detections.label_ids == entry["label_id"]]
+                occurrences = [
+                    {
+                        "frame": frame,
+                        "confidence": round(conf, 4),
+                        "timestamp": frame_to_timestamp(frame, fps),
+                        "coordinates": [box]
+                    }
+                    for frame, conf, box in zip(rows["frame"].tolist(), rows["conf"].tolist(), rows["box"].tolist())
+                ]
+
+            label_object = {
+                "label": entry["label"],
+                "occurrences": occurrences,
+                "total_detections": entry["total_detections"],
+                "average_confidence": entry["average_confidence"],
+                "first_detection": entry["first_detection"],
+                "last_detection": entry["last_detection"]
+            }
+            if video_data.get("tracks") is not None:
+                label_tracks = tracks_by_label.get(entry["label"], [])
+                label_object["tracks"] = label_tracks
+                label_object["total_tracks"] = len(label_tracks)
+            objects_list.append(label_object)
 
         # Ordenar por número total de detecciones
         objects_list.sort(key=lambda x: x["total_detections"], reverse=True)
         
-        return {
+        return ORJSONResponse({
             "objects": objects_list,
             "status": "found",
-            "total_unique_objects": len(objects_list)
-        }
+            "total_unique_objects": len(objects_list),
+            "fps": fps
+        })
 
     except Exception as e:
         logger.error(f"Error getting video objects: {str(e)}")
         return JSONResponse(
             content={"error": str(e), "status": "error"},
             status_code=500
-        )
\ No newline at end of file
+        )
+
+@metadata_router.get("/objects/{video_name}/occurrences")
+def stream_object_occurrences(
+    video_name: str,
+    label: str = None,
+    start_frame: int = Query(None, ge=0),
+    end_frame: int = Query(None, ge=0),
+    format: str = Query("ndjson", pattern="^(ndjson|json)$")
+):
+    """Transmitir las apariciones de objetos (opcionalmente de una etiqueta y rango de frames)"""
+    detections, _ = load_video_detections(video_name)
+    if detections is None:
+        return JSONResponse(
+            content={"error": "Metadata not found", "status": "not_found"},
+            status_code=404
+        )
+
+    # Los registros están ordenados por frame: el rango se resuelve con búsqueda binaria
+    records = detections.records
+    frames = detections.frames
+    start = np.searchsorted(frames, start_frame, side="left") if start_frame is not None else 0
+    end = np.searchsorted(frames, end_frame, side="right") if end_frame is not None else len(records)
+    records = records[start:end]
+
+    if label is not None:
+        label_id = detections.label_id(label)
+        records = records[records["label_id"] == label_id] if label_id is not None else records[:0]
+
+    fps = get_video_fps(video_name)
+    labels = detections.labels
+
+    def occurrences():
+        for offset in range(0, len(records), METADATA_STREAM_BATCH):
+            batch = records[offset:offset + METADATA_STREAM_BATCH]
+            for frame, label_id, conf, box in zip(
+                batch["frame"].tolist(), batch["label_id"].tolist(),
+                batch["conf"].tolist(), batch["box"].tolist()
+            ):
+                yield dumps({
+                    "label": labels[label_id],
+                    "frame": frame,
+                    "confidence": round(conf, 4),
+                    "timestamp": frame_to_timestamp(frame, fps),
+                    "coordinates": [box]
+                })
+
+    return StreamingResponse(
+        stream_json_items(occurrences(), format),
+        media_type=STREAM_MEDIA_TYPES[format]
+    )
+
+@metadata_router.get("/{video_name}/frames")
+def stream_metadata_frames(
+    video_name: str,
+    start_frame: int = Query(None, ge=0),
+    end_frame: int = Query(None, ge=0),
+    format: str = Query("ndjson", pattern="^(ndjson|json)$")
+):
+    """Transmitir la metadata frame a frame (NDJSON o array JSON) sin cargarla entera en memoria"""
+    if not video_has_metadata(video_name):
+        return JSONResponse(
+            content={"error": "Metadata not found", "status": "not_found"},
+            status_code=404
+        )
+
+    return StreamingResponse(
+        stream_json_items((frame.encode() for frame in iter_metadata_frames(video_name, start_frame, end_frame)), format),
+        media_type=STREAM_MEDIA_TYPES[format]
+    )
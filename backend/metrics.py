@@ -0,0 +1,172 @@
+import os
+import time
+import asyncio
+from contextlib import ContextDecorator
+from functools import wraps
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+)
+from config import *
+
+# Con varios workers de uvicorn (y los procesos de segmentos) cada proceso escribe sus valores en
+# PROMETHEUS_MULTIPROC_DIR y /metrics los agrega; sin la variable se usa el registro del proceso
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# Duración por trabajo: de segundos (subida de un heatmap) a decenas de minutos (inferencia de un video largo)
+JOB_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram(
+    "video_stage_seconds", "Tiempo por trabajo de cada etapa del pipeline",
+    ["stage"], buckets=JOB_BUCKETS
+)
+FRAMES_PROCESSED = Counter(
+    "video_frames_processed_total", "Frames procesados por etapa (rate() = frames/s)",
+    ["stage"]
+)
+JOBS = Counter("video_jobs_total", "Trabajos de procesamiento terminados", ["result"])
+QUEUE_DEPTH = Gauge(
+    "video_jobs_queued", "Trabajos en espera o en curso por cola",
+    ["queue"], multiprocess_mode="livesum"
+)
+
+DB_CONNECTIONS = Counter("db_connections_total", "Conexiones abiertas a PostgreSQL", ["result"])
+DB_CONNECT_SECONDS = Histogram("db_connect_seconds", "Tiempo de apertura de una conexión a PostgreSQL", buckets=REQUEST_BUCKETS)
+
+GCS_REQUESTS = Counter("gcs_requests_total", "Llamadas a Google Cloud Storage", ["operation", "result"])
+GCS_REQUEST_SECONDS = Histogram(
+    "gcs_request_seconds", "Duración de las llamadas a Google Cloud Storage",
+    ["operation"], buckets=JOB_BUCKETS
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "Latencia HTTP hasta el inicio de la respuesta, por plantilla de ruta",
+    ["method", "route", "status"], buckets=REQUEST_BUCKETS
+)
+
+# Retraso del event loop de cada worker: cuánto tarda en despertar un sleep respecto a lo pedido
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Retraso del event loop (despertar tardío de un sleep periódico)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+EVENT_LOOP_LAG_MAX = Gauge(
+    "event_loop_lag_last_seconds", "Último retraso medido del event loop (máximo entre workers)",
+    multiprocess_mode="max"
+)
+
+async def event_loop_lag_monitor(interval: float = EVENT_LOOP_LAG_INTERVAL):
+    """Tarea periódica: un loop bloqueado (trabajo síncrono en una corrutina) retrasa el despertar"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - start - interval)
+        EVENT_LOOP_LAG.observe(lag)
+        EVENT_LOOP_LAG_MAX.set(lag)
+
+def observe_stages(timings: dict, frames: int = 0, frame_stage: str = None):
+    """Registrar los segundos acumulados por etapa en un trabajo y, opcionalmente, sus frames"""
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.labels(stage).observe(seconds)
+    if frame_stage and frames:
+        FRAMES_PROCESSED.labels(frame_stage).inc(frames)
+
+class StageTimer(ContextDecorator):
+    """Medir un bloque o una función como una etapa: with StageTimer("upload"): ... o @StageTimer("db_write")"""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def _recreate_cm(self):
+        # Una instancia por llamada: la función decorada puede ejecutarse en varios hilos a la vez
+        return StageTimer(self.stage)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.labels(self.stage).observe(time.perf_counter() - self.start)
+        return False
+
+def gcs_operation(operation: str):
+    """Decorador que cuenta y cronometra una llamada a GCS (resultado ok / not_found / error)"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = "error"
+            try:
+                value = func(*args, **kwargs)
+                result = "ok"
+                return value
+            except Exception as e:
+                if type(e).__name__ == "NotFound":
+                    result = "not_found"
+                raise
+            finally:
+                GCS_REQUESTS.labels(operation, result).inc()
+                GCS_REQUEST_SECONDS.labels(operation).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def render_metrics():
+    """(contenido, content type) de la exposición de métricas de todos los procesos"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+def route_template(scope) -> str:
+    """Plantilla de la ruta que atendió la petición (/api/videos/process/{video_name})
+
+    Se reconstruye desde la URL y los parámetros de ruta, porque la ruta del scope no incluye
+    el prefijo del router en todas las versiones de FastAPI; las peticiones sin ruta se agrupan
+    para acotar la cardinalidad.
+    """
+    if "route" not in scope and "endpoint" not in scope:
+        return "unmatched"
+    template = scope["path"]
+    for name, value in scope.get("path_params", {}).items():
+        head, separator, tail = template.rpartition(str(value))
+        if separator:
+            template = f"{head}{{{name}}}{tail}"
+    return template
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide la latencia HTTP por plantilla de ruta (/process/{video_name}), no por URL
+
+    Para respuestas en streaming se mide hasta el envío de las cabeceras.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        observed = False
+
+        def observe(status: int):
+            template = route_template(scope)
+            if template == "/metrics":
+                return
+            HTTP_REQUEST_SECONDS.labels(scope["method"], template, str(status)).observe(time.perf_counter() - start)
+
+        async def send_wrapper(message):
+            nonlocal observed
+            if message["type"] == "http.response.start" and not observed:
+                observed = True
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if not observed:
+                observed = True
+                observe(500)
+            raise
@@ -0,0 +1,334 @@
+import os
+import time
+import logging
+import subprocess
+import cv2
+from config import *
+from database import insert_or_update_video_data, save_video_probe, get_video_detections
+from detections import encode_detections, to_bytes, load_detections
+from tracking import build_tracks
+from serialization import dumps, dumps_str, loads
+from video_probe import probe_video
+from catalog import record_video
+from gcs import download_to_filename, download_range, upload_bytes, upload_file, delete_blob, gcs_uri, NotFound
+from heatmap import generate_heatmap_background
+from inference import get_backend
+from tiling import get_regions, make_tiles, detect_tiled
+from annotation import AnnotationRenderer
+from segments import plan_segments, process_segmented
+from metrics import observe_stages, StageTimer
+from profiling import profiled
+from jobs import JobInterrupted, raise_if_interrupted
+
+logger = logging.getLogger(__name__)
+
+@profiled("generate_metadata")
+def generate_metadata(video_path: str, video_name: str = None, resume=None, return_frames: bool = False):
+    """Generar metadata para el video usando YOLO (frame completo o por ventanas/ROI)
+
+    Con resume (checkpoint de un trabajo interrumpido) continúa desde el frame guardado;
+    si el trabajo se interrumpe lanza JobInterrupted con lo detectado hasta entonces.
+    Con return_frames devuelve (metadata, frames decodificados).
+    """
+    backend = get_backend()
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise Exception("Could not open video")
+
+    # Con regiones de interés (o modo 'tiled') solo se infieren ventanas a resolución nativa
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    regions = get_regions(video_name, width, height)
+    tiles = None
+    if regions or INFERENCE_MODE == "tiled":
+        tiles = make_tiles(regions or [(0, 0, width, height)])
+        logger.info(f"Tiled inference for {video_name}: {len(tiles)} tiles of {TILE_SIZE}px")
+
+    metadata = []
+    frame_count = 0
+    timings = {"decode": 0.0, "inference": 0.0}
+
+    if resume:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, resume["frames"])
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == resume["frames"]:
+            metadata, frame_count = resume["metadata"], resume["frames"]
+            logger.info(f"Resuming inference for {video_name} at frame {frame_count}")
+        else:
+            # Sin búsqueda exacta se empieza de cero antes que arriesgar frames desplazados
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    while True:
+        raise_if_interrupted(frame_count, metadata)
+        start = time.perf_counter()
+        ret, frame = cap.read()
+        decoded = time.perf_counter()
+        timings["decode"] += decoded - start
+        if not ret:
+            break
+
+        if tiles:
+            boxes = detect_tiled(lambda images: backend.predict(images, imgsz=TILE_SIZE), frame, tiles, regions)
+        else:
+            boxes = backend.predict([frame])[0]
+        timings["inference"] += time.perf_counter() - decoded
+
+        detections = [
+            {
+                "label": backend.names[int(cls)],
+                "confidence": float(conf),
+                "coordinates": [[int(x1), int(y1), int(x2), int(y2)]]
+            }
+            for x1, y1, x2, y2, conf, cls in boxes.tolist()
+            if conf > CONFIDENCE_THRESHOLD
+        ]
+
+        if detections:
+            metadata.append({
+                "frame": frame_count,
+                "objects": detections
+            })
+
+        frame_count += 1
+
+    cap.release()
+    observe_stages(timings, frame_count, "inference")
+    return (metadata, frame_count) if return_frames else metadata
+
+@profiled("process_video_with_metadata")
+async def process_video_with_metadata(input_path, output_path, detections, fps=None):
+    """Procesar video añadiendo las detecciones (DetectionSet ordenado por frame)"""
+    cap = cv2.VideoCapture(str(input_path))
+    if not cap.isOpened():
+        raise Exception("Could not open video for processing")
+
+    # Conservar los fps reales (p. ej. 29.97) en lugar de truncarlos
+    fps = fps or cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    temp_output = str(output_path).replace('.mp4', '_temp.mp4')
+    
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    writer = cv2.VideoWriter(temp_output, fourcc, fps, (width, height))
+
+    # Textos pre-renderizados por (etiqueta, confianza) reutilizados en todos los frames
+    renderer = AnnotationRenderer(detections.labels)
+
+    # Los grupos de detecciones se recorren en orden junto con los frames (sin búsquedas O(n))
+    frame_groups = detections.iter_frames()
+    next_group = next(frame_groups, None)
+
+    frame_count = 0
+    timings = {"decode": 0.0, "annotate": 0.0, "encode": 0.0}
+    try:
+        while True:
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            decoded = time.perf_counter()
+            timings["decode"] += decoded - start
+            if not ret:
+                break
+            raise_if_interrupted(frame_count)
+
+            while next_group is not None and next_group[0] < frame_count:
+                next_group = next(frame_groups, None)
+
+            if next_group is not None and next_group[0] == frame_count:
+                renderer.draw(frame, next_group[1])
+            annotated = time.perf_counter()
+            timings["annotate"] += annotated - decoded
+
+            writer.write(frame)
+            timings["encode"] += time.perf_counter() - annotated
+            frame_count += 1
+
+    finally:
+        cap.release()
+        writer.release()
+
+    try:
+        # Convertir video temporal a MP4 compatible con web
+        start = time.perf_counter()
+        subprocess.run([
+            'ffmpeg', '-i', temp_output,
+            '-c:v', 'libx264',
+            '-preset', RENDER_PRESET,
+            '-crf', str(RENDER_CRF),
+            '-movflags', '+faststart',
+            '-pix_fmt', 'yuv420p',
+            str(output_path)
+        ], check=True)
+        timings["encode"] += time.perf_counter() - start
+        observe_stages(timings, frame_count, "render")
+        
+        # Limpiar archivo temporal
+        if os.path.exists(temp_output):
+            os.remove(temp_output)
+            
+    except subprocess.CalledProcessError as e:
+        raise Exception(f"Error converting video: {str(e)}")
+    except Exception as e:
+        raise Exception(f"Unexpected error: {str(e)}")
+
+    if not os.path.exists(str(output_path)):
+        raise Exception("Processed video file was not generated")
+        
+    if os.path.getsize(str(output_path)) == 0:
+        os.remove(str(output_path))
+        raise Exception("Generated video file is empty")
+        
+    return str(output_path)
+
+def fetch_video(video_name: str, video_path, blob=None):
+    """Descargar el video original y registrar sus propiedades reales; lanza NotFound si no existe"""
+    # La generación fija la versión cuyos metadatos ya tenemos
+    with StageTimer("download"):
+        download_to_filename(
+            ORIGINAL_VIDEOS_BUCKET, video_name, video_path,
+            generation=blob.generation if blob is not None else None
+        )
+
+    probe = probe_video(video_path)
+    save_video_probe(video_name, probe)
+    record_video(
+        video_name,
+        size_bytes=blob.size if blob is not None else None,
+        generation=blob.generation if blob is not None else None,
+        state="processing",
+        duration=probe["duration"],
+        fps=probe["fps"],
+        width=probe["width"],
+        height=probe["height"]
+    )
+    return probe
+
+def analyze_video(video_name: str, video_path, versions=None):
+    """Detectar objetos, construir tracks y guardar la metadata en PostgreSQL
+
+    Si el trabajo se interrumpe se guarda un checkpoint y el siguiente trabajo reanuda desde él.
+    """
+    checkpoint = load_checkpoint(video_name, versions)
+    try:
+        metadata = generate_metadata(str(video_path), video_name, resume=checkpoint)
+    except JobInterrupted as e:
+        save_checkpoint(video_name, versions, e.frames, e.metadata)
+        raise
+    detections = store_detections(video_name, metadata, versions)
+    if checkpoint:
+        clear_checkpoint(video_name)
+    return detections
+
+def checkpoint_blob(video_name: str) -> str:
+    return f"{CHECKPOINT_PREFIX}/{video_name}.json"
+
+def save_checkpoint(video_name: str, versions, frames: int, metadata):
+    """Guardar la metadata de los frames [0, frames) para reanudar la inferencia con la misma versión"""
+    if not versions or not frames:
+        return
+    try:
+        checkpoint = {"inference": versions["inference"], "frames": frames, "metadata": metadata}
+        upload_bytes(PROCESSED_VIDEOS_BUCKET, checkpoint_blob(video_name), dumps(checkpoint), content_type="application/json")
+        logger.info(f"Checkpoint for {video_name} saved at frame {frames}")
+    except Exception as e:
+        logger.error(f"Error saving checkpoint for {video_name}: {str(e)}")
+
+def load_checkpoint(video_name: str, versions):
+    """Checkpoint de un trabajo interrumpido, solo si corresponde a la versión de inferencia actual"""
+    if not versions:
+        return None
+    try:
+        checkpoint = loads(download_range(PROCESSED_VIDEOS_BUCKET, checkpoint_blob(video_name)))
+    except NotFound:
+        return None
+    except Exception as e:
+        logger.error(f"Error loading checkpoint for {video_name}: {str(e)}")
+        return None
+    if checkpoint.get("inference") != versions["inference"]:
+        return None
+    return checkpoint
+
+def clear_checkpoint(video_name: str):
+    try:
+        delete_blob(PROCESSED_VIDEOS_BUCKET, checkpoint_blob(video_name))
+    except NotFound:
+        pass
+    except Exception as e:
+        logger.error(f"Error deleting checkpoint for {video_name}: {str(e)}")
+
+def store_detections(video_name: str, metadata, versions=None):
+    """Codificar la metadata, construir tracks y guardarlos en PostgreSQL"""
+    detections = encode_detections(metadata)
+    tracks = build_tracks(detections) if TRACKING_ENABLED else None
+
+    # Guardar metadata en PostgreSQL (JSON, formato binario columnar, tracks y versión)
+    insert_or_update_video_data(
+        video_name,
+        metadata=dumps_str(metadata),
+        detections_bin=to_bytes(detections),
+        tracks=dumps_str(tracks) if tracks is not None else None,
+        clear_tracks=tracks is None,
+        versions={stage: versions[stage] for stage in ("inference", "tracks")} if versions else None
+    )
+    return detections
+
+def refresh_tracks(video_name: str, detections, versions=None):
+    """Reconstruir los tracks desde las detecciones guardadas (sin inferencia)"""
+    tracks = build_tracks(detections) if TRACKING_ENABLED else None
+    insert_or_update_video_data(
+        video_name,
+        tracks=dumps_str(tracks) if tracks is not None else None,
+        clear_tracks=tracks is None,
+        versions={"tracks": versions["tracks"]} if versions else None
+    )
+
+def prepare_detections(video_name: str, video_path, stages, versions=None):
+    """Detecciones para las etapas pendientes: inferencia nueva o las guardadas en PostgreSQL"""
+    if "inference" in stages:
+        return analyze_video(video_name, video_path, versions)
+
+    video_detections = get_video_detections(video_name)
+    detections = load_detections(video_detections["detections_bin"], video_detections["metadata"]) if video_detections else None
+    if detections is None:
+        raise Exception(f"No stored detections for {video_name}")
+    if "tracks" in stages:
+        refresh_tracks(video_name, detections, versions)
+    return detections
+
+async def render_video(video_name: str, video_path, processed_path, detections, probe, versions=None):
+    """Dibujar las detecciones, subir el video procesado a GCS y registrar su ruta"""
+    await process_video_with_metadata(video_path, processed_path, detections, fps=probe["fps"])
+    upload_processed_video(video_name, processed_path, versions)
+
+def upload_processed_video(video_name: str, processed_path, versions=None):
+    """Subir el video anotado a GCS y registrar su ruta y versión"""
+    with StageTimer("upload"):
+        upload_file(PROCESSED_VIDEOS_BUCKET, f"processed_{video_name}", processed_path, content_type="video/mp4")
+    insert_or_update_video_data(
+        video_name,
+        processed_video_path=gcs_uri(PROCESSED_VIDEOS_BUCKET, f"processed_{video_name}"),
+        versions={"video": versions["video"]} if versions else None
+    )
+
+async def publish_heatmap(video_name: str, video_path, probe, detections, versions=None):
+    """Generar el heatmap (se sube a GCS y se registra en la base de datos) y limpiar el PNG local"""
+    with StageTimer("heatmap"):
+        heatmap_path = await generate_heatmap_background(video_name, video_path=video_path, probe=probe, detections=detections)
+    if versions:
+        insert_or_update_video_data(video_name, versions={"heatmap": versions["heatmap"]})
+    if heatmap_path and os.path.exists(heatmap_path):
+        os.remove(str(heatmap_path))
+
+def use_segments(stages, probe) -> bool:
+    """El modo por segmentos aplica cuando hay que inferir y renderizar un video largo con keyframes"""
+    return (
+        SEGMENT_WORKERS > 1
+        and {"inference", "video"} <= set(stages)
+        and len(plan_segments(probe, SEGMENT_WORKERS)) > 1
+    )
+
+def analyze_and_render_segments(video_name: str, video_path, processed_path, probe, versions=None):
+    """Detectar y anotar por segmentos en paralelo, guardar la metadata global y subir el video unido"""
+    metadata = process_segmented(video_name, video_path, processed_path, probe, SEGMENT_WORKERS)
+    detections = store_detections(video_name, metadata, versions)
+    upload_processed_video(video_name, processed_path, versions)
+    return detections
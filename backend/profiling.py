@@ -0,0 +1,183 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from config import *
+from serialization import dumps_str
+from gcs import upload_bytes, gcs_uri
+
+logger = logging.getLogger(__name__)
+
+# Perfilador del trabajo en curso; asyncio.to_thread copia el contexto, así que también llega a sus hilos
+current_profiler = ContextVar("current_profiler", default=None)
+
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+def _start_tracemalloc():
+    """tracemalloc es global al proceso: se activa con el primer trabajo perfilado y se apaga con el último"""
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+        _tracemalloc_users += 1
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+class JobProfiler:
+    """Perfilador por muestreo de un trabajo: pilas plegadas (flamegraph) + memoria con tracemalloc
+
+    Solo se muestrean los hilos que están dentro de una sección (@profiled), cada
+    PROFILE_INTERVAL segundos con sys._current_frames(); el tiempo en código nativo
+    (decodificación de OpenCV, inferencia, ffmpeg) se atribuye a la línea Python que lo llamó.
+    En secciones async, las esperas del event loop aparecen como select() dentro de la sección.
+    """
+
+    def __init__(self, job_name: str, interval: float = PROFILE_INTERVAL):
+        self.job_name = job_name
+        self.interval = interval
+        self.samples = Counter()
+        self.sections = {}
+        self._active = {}  # id de hilo -> pila de secciones abiertas
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.started_at = None
+        self.finished_at = None
+        self.peak_memory = None
+
+    def start(self):
+        _start_tracemalloc()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._sample, name=f"profiler-{self.job_name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.finished_at = time.time()
+        # Pico de memoria trazada del proceso (incluye otros trabajos simultáneos)
+        if tracemalloc.is_tracing():
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+        _stop_tracemalloc()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                active = {ident: stack[-1] for ident, stack in self._active.items() if stack}
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ident, section in active.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(section)
+                self.samples[";".join(reversed(stack))] += 1
+
+    @contextmanager
+    def section(self, name: str):
+        """Marcar el hilo actual como perfilado durante el bloque y medir su tiempo y memoria"""
+        ident = threading.get_ident()
+        with self._lock:
+            self._active.setdefault(ident, []).append(name)
+        before = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._active[ident].pop()
+                if not self._active[ident]:
+                    del self._active[ident]
+
+            stats = self.sections.setdefault(name, {"calls": 0, "seconds": 0.0, "allocations": []})
+            stats["calls"] += 1
+            stats["seconds"] = round(stats["seconds"] + elapsed, 4)
+            if before is not None and tracemalloc.is_tracing():
+                # Líneas que más memoria retienen al terminar la sección respecto a su inicio
+                diff = tracemalloc.take_snapshot().compare_to(before, "lineno")
+                stats["allocations"] = [
+                    {"location": str(stat.traceback), "size_diff_kb": round(stat.size_diff / 1024, 1), "count_diff": stat.count_diff}
+                    for stat in diff[:PROFILE_TOP_ALLOCATIONS]
+                ]
+
+    def folded(self) -> str:
+        """Pilas en formato plegado ("a;b;c N"), válido para flamegraph.pl y speedscope"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self) -> dict:
+        """Resumen: secciones, funciones con más muestras propias y pico de memoria trazada"""
+        own = Counter()
+        for stack, count in self.samples.items():
+            own[stack.rsplit(";", 1)[-1]] += count
+        total = sum(self.samples.values())
+        return {
+            "job": self.job_name,
+            "started_at": self.started_at,
+            "duration_seconds": round((self.finished_at or time.time()) - self.started_at, 3),
+            "interval_seconds": self.interval,
+            "samples": total,
+            "sections": self.sections,
+            "top_self": [
+                {"function": function, "samples": count, "percent": round(100 * count / total, 1)}
+                for function, count in own.most_common(PROFILE_TOP_FUNCTIONS)
+            ] if total else [],
+            "peak_traced_memory_mb": round(self.peak_memory / 1024 / 1024, 1) if self.peak_memory is not None else None,
+        }
+
+    def upload(self, video_name: str) -> dict:
+        """Subir el perfil junto a las salidas del video: profiles/<video>/<timestamp>.{folded,json}"""
+        prefix = f"{PROFILE_PREFIX}/{video_name}/{time.strftime('%Y%m%dT%H%M%S', time.gmtime(self.started_at))}"
+        upload_bytes(PROCESSED_VIDEOS_BUCKET, f"{prefix}.folded", self.folded().encode(), content_type="text/plain")
+        upload_bytes(PROCESSED_VIDEOS_BUCKET, f"{prefix}.json", dumps_str(self.summary()).encode(), content_type="application/json")
+        return {
+            "folded": gcs_uri(PROCESSED_VIDEOS_BUCKET, f"{prefix}.folded"),
+            "summary": gcs_uri(PROCESSED_VIDEOS_BUCKET, f"{prefix}.json"),
+        }
+
+def profiled(section: str):
+    """Decorador: si hay un perfilador activo en el contexto, la llamada se muestrea como una sección"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                profiler = current_profiler.get()
+                if profiler is None:
+                    return await func(*args, **kwargs)
+                with profiler.section(section):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = current_profiler.get()
+            if profiler is None:
+                return func(*args, **kwargs)
+            with profiler.section(section):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,122 @@
+import os
+import asyncio
+import logging
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from config import *
+
+logger = logging.getLogger(__name__)
+
+def plan_segments(probe: dict, workers: int = SEGMENT_WORKERS, min_frames: int = SEGMENT_MIN_FRAMES):
+    """Frames de inicio de cada segmento: keyframes cercanos a cortes equidistantes (siempre incluye 0)"""
+    keyframes = probe.get("keyframes") or []
+    frame_count = probe.get("frame_count") or 0
+    count = min(workers, frame_count // max(1, min_frames))
+    if count < 2 or not keyframes:
+        return [0]
+
+    target = frame_count / count
+    starts = [0]
+    for index in range(1, count):
+        # Keyframe más cercano al corte ideal, sin producir segmentos demasiado cortos
+        ideal = index * target
+        candidate = min(keyframes, key=lambda keyframe: abs(keyframe - ideal))
+        if candidate - starts[-1] >= min_frames // 2 and frame_count - candidate >= min_frames // 2:
+            starts.append(candidate)
+    return sorted(set(starts))
+
+def split_video(video_path, starts, fps: float, output_dir):
+    """Cortar el video en los keyframes indicados sin re-codificar (ffmpeg segment + copy)"""
+    pattern = os.path.join(str(output_dir), "segment_%03d.mp4")
+    command = ['ffmpeg', '-y', '-v', 'error', '-i', str(video_path), '-map', '0:v:0', '-an', '-c', 'copy']
+    if len(starts) > 1:
+        # Medio frame antes de cada keyframe para que el redondeo de pts no desplace el corte
+        times = ",".join(f"{max(0.0, (start - 0.5) / fps):.6f}" for start in starts[1:])
+        command += ['-f', 'segment', '-segment_times', times, '-reset_timestamps', '1', pattern]
+    else:
+        command += [pattern % 0]
+    subprocess.run(command, check=True)
+    return sorted(
+        os.path.join(str(output_dir), name)
+        for name in os.listdir(str(output_dir))
+        if name.startswith("segment_") and name.endswith(".mp4")
+    )
+
+def concat_segments(segment_paths, output_path):
+    """Unir los segmentos codificados con el demuxer concat de ffmpeg (sin re-codificar)"""
+    list_path = f"{output_path}.txt"
+    with open(list_path, "w") as f:
+        for path in segment_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    try:
+        subprocess.run([
+            'ffmpeg', '-y', '-v', 'error',
+            '-f', 'concat', '-safe', '0', '-i', list_path,
+            '-c', 'copy', '-movflags', '+faststart',
+            str(output_path)
+        ], check=True)
+    finally:
+        os.remove(list_path)
+    return str(output_path)
+
+def _init_worker(threads: int):
+    """Repartir los núcleos entre procesos antes de cargar el runtime de inferencia"""
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    import config
+    config.INFERENCE_THREADS = threads
+
+def _process_segment(task):
+    """Detectar y anotar un segmento en un proceso worker (el modelo se carga una vez por proceso)"""
+    from pipeline import generate_metadata, process_video_with_metadata
+    from detections import encode_detections
+
+    index, segment_path, output_path, video_name, fps = task
+    # El desplazamiento del segmento son los frames realmente decodificados, no los que declara el contenedor
+    metadata, frames = generate_metadata(segment_path, video_name, return_frames=True)
+    asyncio.run(process_video_with_metadata(segment_path, output_path, encode_detections(metadata), fps=fps))
+    return index, metadata, frames
+
+def merge_metadata(results):
+    """Unir la metadata de los segmentos desplazando los frames al índice global"""
+    merged = []
+    offset = 0
+    for _, metadata, frames in sorted(results, key=lambda result: result[0]):
+        for entry in metadata:
+            merged.append({"frame": entry["frame"] + offset, "objects": entry["objects"]})
+        offset += frames
+    return merged, offset
+
+def process_segmented(video_name: str, video_path, output_path, probe: dict, workers: int = SEGMENT_WORKERS):
+    """Dividir en keyframes, detectar y anotar los segmentos en paralelo y unir el resultado
+
+    Devuelve la metadata con frames globales; el video anotado queda en output_path.
+    """
+    starts = plan_segments(probe, workers)
+    work_dir = f"{output_path}_segments"
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        segment_paths = split_video(video_path, starts, probe["fps"], work_dir)
+        tasks = [
+            (index, path, os.path.join(work_dir, f"processed_{index:03d}.mp4"), video_name, probe["fps"])
+            for index, path in enumerate(segment_paths)
+        ]
+        processes = min(workers, len(tasks))
+        threads = max(1, (os.cpu_count() or 1) // processes)
+        logger.info(f"Processing {video_name} in {len(tasks)} segments with {processes} processes")
+
+        # 'spawn' evita heredar hilos y el estado del runtime del proceso padre
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(threads,)) as pool:
+            results = list(pool.map(_process_segment, tasks))
+
+        metadata, total_frames = merge_metadata(results)
+        if probe.get("frame_count") and total_frames != probe["frame_count"]:
+            logger.warning(f"Segment frames ({total_frames}) differ from probe ({probe['frame_count']}) for {video_name}")
+
+        concat_segments([task[2] for task in tasks], output_path)
+        return metadata
+    finally:
+        for name in os.listdir(work_dir):
+            os.remove(os.path.join(work_dir, name))
+        os.rmdir(work_dir)
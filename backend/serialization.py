@@ -0,0 +1,41 @@
+import decimal
+import orjson
+from fastapi.responses import JSONResponse
+
+# Tipos NumPy (arrays y escalares) se serializan de forma nativa
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def _default(obj):
+    """Tipos que orjson no serializa por sí mismo"""
+    # Escalares y arrays NumPy no cubiertos por OPT_SERIALIZE_NUMPY (sin importar numpy aquí)
+    if type(obj).__module__ == "numpy":
+        if hasattr(obj, "tolist"):
+            return obj.tolist()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(obj) -> bytes:
+    """Serializar a JSON (bytes) con orjson"""
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+def dumps_str(obj) -> str:
+    """Serializar a JSON (str), p. ej. para parámetros JSONB de psycopg2"""
+    return dumps(obj).decode()
+
+loads = orjson.loads
+
+def raw_json(text):
+    """Envolver JSON ya serializado (p. ej. texto JSONB de Postgres) para incrustarlo sin re-codificar"""
+    if text is None:
+        return None
+    return orjson.Fragment(text)
+
+class ORJSONResponse(JSONResponse):
+    """Respuesta JSON serializada con orjson (acepta tipos NumPy y fragmentos crudos)"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
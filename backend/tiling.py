@@ -0,0 +1,133 @@
+import json
+import logging
+import numpy as np
+from config import *
+
+logger = logging.getLogger(__name__)
+
+_roi_config = None
+
+def load_roi_config():
+    """Cargar la configuración de regiones de interés (cacheada)
+
+    Formato de ROI_CONFIG_PATH:
+        {
+            "default": [[x1, y1, x2, y2], ...],
+            "cameras": {"<prefijo del nombre del video>": [[x1, y1, x2, y2], ...]},
+            "videos": {"<nombre del video>": [[x1, y1, x2, y2], ...]}
+        }
+    Las coordenadas pueden ser píxeles o fracciones (0-1) del ancho/alto del frame.
+    """
+    global _roi_config
+    if _roi_config is None:
+        if ROI_CONFIG_PATH.exists():
+            with open(ROI_CONFIG_PATH) as f:
+                _roi_config = json.load(f)
+        else:
+            _roi_config = {}
+    return _roi_config
+
+def video_regions(video_name: str):
+    """Regiones configuradas para un video (sin convertir): por video, por cámara (prefijo) o por defecto"""
+    config = load_roi_config()
+    regions = None
+    if video_name:
+        regions = config.get("videos", {}).get(video_name)
+        if regions is None:
+            # El prefijo más largo que coincida identifica la cámara
+            for prefix in sorted(config.get("cameras", {}), key=len, reverse=True):
+                if video_name.startswith(prefix):
+                    regions = config["cameras"][prefix]
+                    break
+    if regions is None:
+        regions = config.get("default")
+    return regions or None
+
+def get_regions(video_name: str, width: int, height: int):
+    """Regiones de interés en píxeles para un video: por video, por cámara (prefijo) o por defecto"""
+    regions = video_regions(video_name)
+    if not regions:
+        return None
+
+    pixel_regions = []
+    for x1, y1, x2, y2 in regions:
+        if max(x1, y1, x2, y2) <= 1:
+            x1, x2 = x1 * width, x2 * width
+            y1, y2 = y1 * height, y2 * height
+        x1, x2 = int(max(0, min(x1, width))), int(max(0, min(x2, width)))
+        y1, y2 = int(max(0, min(y1, height))), int(max(0, min(y2, height)))
+        if x2 > x1 and y2 > y1:
+            pixel_regions.append((x1, y1, x2, y2))
+    return pixel_regions or None
+
+def _axis_starts(start: int, end: int, tile: int, stride: int):
+    if end - start <= tile:
+        return [start]
+    starts = list(range(start, end - tile, stride))
+    starts.append(end - tile)
+    return starts
+
+def make_tiles(regions, tile_size: int = TILE_SIZE, overlap: float = TILE_OVERLAP):
+    """Ventanas (x1, y1, x2, y2) solapadas de tile_size que cubren cada región"""
+    stride = max(1, int(tile_size * (1 - overlap)))
+    tiles = []
+    for x1, y1, x2, y2 in regions:
+        for ty in _axis_starts(y1, y2, tile_size, stride):
+            for tx in _axis_starts(x1, x2, tile_size, stride):
+                tiles.append((tx, ty, min(tx + tile_size, x2), min(ty + tile_size, y2)))
+    return tiles
+
+def nms(boxes, scores, classes, iou_threshold: float):
+    """NMS por clase; devuelve los índices conservados ordenados por confianza"""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.intp)
+    # Desplazar las cajas por clase para que solo se supriman entre sí las de la misma clase
+    offsets = classes.astype(np.float32)[:, None] * (boxes.max() + 1)
+    shifted = boxes + offsets
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind="stable")
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        intersection = inter_w * inter_h
+        iou = intersection / np.maximum(areas[i] + areas[rest] - intersection, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.intp)
+
+def detect_tiled(predict_batch, frame, tiles, regions=None, iou_threshold: float = TILE_NMS_IOU):
+    """Inferir todas las ventanas del frame en un solo lote y fusionar con NMS entre ventanas
+
+    predict_batch recibe una lista de imágenes y devuelve, por imagen, un array (N, 6)
+    con x1, y1, x2, y2, confianza, clase en coordenadas de la imagen.
+    """
+    crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+    outputs = predict_batch(crops)
+
+    merged = []
+    for (x1, y1, _, _), output in zip(tiles, outputs):
+        if len(output):
+            output = output.copy()
+            output[:, [0, 2]] += x1
+            output[:, [1, 3]] += y1
+            merged.append(output)
+    if not merged:
+        return np.empty((0, 6), dtype=np.float32)
+    detections = np.concatenate(merged)
+
+    # Descartar cajas cuyo centro cae fuera de las regiones de interés
+    if regions:
+        centers_x = (detections[:, 0] + detections[:, 2]) / 2
+        centers_y = (detections[:, 1] + detections[:, 3]) / 2
+        inside = np.zeros(len(detections), dtype=bool)
+        for rx1, ry1, rx2, ry2 in regions:
+            inside |= (centers_x >= rx1) & (centers_x < rx2) & (centers_y >= ry1) & (centers_y < ry2)
+        detections = detections[inside]
+
+    keep = nms(detections[:, :4], detections[:, 4], detections[:, 5], iou_threshold)
+    return detections[keep]
@@ -0,0 +1,106 @@
+import numpy as np
+from config import *
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU entre cada caja de boxes_a (N, 4) y de boxes_b (M, 4), en formato x1, y1, x2, y2"""
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+class _Track:
+    __slots__ = ("track_id", "label_id", "box", "start_frame", "last_frame",
+                 "count", "conf_sum", "keypoints", "last_sample")
+
+    def __init__(self, track_id, label_id, frame, box, conf):
+        self.track_id = track_id
+        self.label_id = label_id
+        self.box = box
+        self.start_frame = frame
+        self.last_frame = frame
+        self.count = 1
+        self.conf_sum = conf
+        self.keypoints = [[frame] + box.astype(int).tolist()]
+        self.last_sample = frame
+
+    def update(self, frame, box, conf, sample_interval):
+        self.box = box
+        self.last_frame = frame
+        self.count += 1
+        self.conf_sum += conf
+        if frame - self.last_sample >= sample_interval:
+            self.keypoints.append([frame] + box.astype(int).tolist())
+            self.last_sample = frame
+
+    def to_record(self, labels):
+        keypoints = self.keypoints
+        if keypoints[-1][0] != self.last_frame:
+            keypoints = keypoints + [[self.last_frame] + self.box.astype(int).tolist()]
+        return {
+            "track_id": self.track_id,
+            "label": labels[self.label_id],
+            "start_frame": self.start_frame,
+            "end_frame": self.last_frame,
+            "detections": self.count,
+            "average_confidence": round(self.conf_sum / self.count, 3),
+            "keypoints": keypoints
+        }
+
+def build_tracks(detections, iou_threshold: float = TRACK_IOU_THRESHOLD, max_gap: int = TRACK_MAX_GAP,
+                 sample_interval: int = TRACK_SAMPLE_INTERVAL, min_detections: int = TRACK_MIN_DETECTIONS):
+    """Asociar detecciones entre frames (IoU voraz por etiqueta) y devolver un registro por objeto
+
+    Cada track guarda frame inicial/final, número de detecciones, confianza media y
+    keypoints [frame, x1, y1, x2, y2] muestreados cada sample_interval frames.
+    """
+    active = []
+    finished = []
+    next_id = 0
+
+    for frame, rows in detections.iter_frames():
+        # Cerrar los tracks que llevan demasiados frames sin detección
+        still_active = []
+        for track in active:
+            (finished if frame - track.last_frame > max_gap else still_active).append(track)
+        active = still_active
+
+        boxes = rows["box"].astype(np.float32)
+        label_ids = rows["label_id"]
+        confidences = rows["conf"].astype(np.float32).tolist()
+        assigned = [False] * len(rows)
+
+        if active:
+            track_boxes = np.array([track.box for track in active], dtype=np.float32)
+            track_labels = np.array([track.label_id for track in active])
+            iou = iou_matrix(track_boxes, boxes)
+            iou[track_labels[:, None] != label_ids[None, :]] = 0
+
+            # Emparejamiento voraz por IoU descendente
+            pairs = np.argwhere(iou >= iou_threshold)
+            order = np.argsort(-iou[pairs[:, 0], pairs[:, 1]], kind="stable")
+            used_tracks = set()
+            for track_index, detection_index in pairs[order].tolist():
+                if track_index in used_tracks or assigned[detection_index]:
+                    continue
+                active[track_index].update(frame, boxes[detection_index], confidences[detection_index], sample_interval)
+                used_tracks.add(track_index)
+                assigned[detection_index] = True
+
+        for detection_index, is_assigned in enumerate(assigned):
+            if not is_assigned:
+                active.append(_Track(next_id, int(label_ids[detection_index]), frame,
+                                     boxes[detection_index], confidences[detection_index]))
+                next_id += 1
+
+    finished.extend(active)
+    finished.sort(key=lambda track: (track.start_frame, track.track_id))
+    return [
+        track.to_record(detections.labels)
+        for track in finished
+        if track.count >= min_detections
+    ]
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import logging
+from functools import lru_cache
+from config import *
+from database import get_video_versions
+from tiling import video_regions
+
+logger = logging.getLogger(__name__)
+
+# Etapas versionadas; las claves posteriores incluyen la de inferencia, así que
+# un cambio de contenido, modelo o umbral invalida todo lo que depende de él
+STAGES = ("inference", "tracks", "video", "heatmap")
+
+def _digest(config: dict) -> str:
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def content_hash(blob) -> str:
+    """Huella del video original a partir de los metadatos de GCS (sin descargarlo)"""
+    return f"{blob.crc32c or blob.md5_hash}-{blob.size}"
+
+@lru_cache(maxsize=None)
+def model_id() -> str:
+    """Identificador del modelo: hash del archivo de pesos (nombre si aún no existe)"""
+    if not MODEL_PATH.exists():
+        return MODEL_PATH.name
+    sha = hashlib.sha256()
+    with open(MODEL_PATH, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return f"{MODEL_PATH.stem}-{sha.hexdigest()[:12]}"
+
+def expected_versions(video_name: str, blob) -> dict:
+    """Claves de versión que tendrían las salidas si se procesaran ahora con la configuración actual"""
+    regions = video_regions(video_name)
+    inference = {
+        "content": content_hash(blob),
+        "model": model_id(),
+        "backend": INFERENCE_BACKEND,
+        "int8": INFERENCE_INT8,
+        "imgsz": INFERENCE_IMGSZ,
+        "confidence": CONFIDENCE_THRESHOLD,
+        "nms_iou": INFERENCE_NMS_IOU,
+        "max_detections": INFERENCE_MAX_DETECTIONS,
+    }
+    if regions or INFERENCE_MODE == "tiled":
+        inference["tiling"] = {
+            "regions": regions,
+            "tile_size": TILE_SIZE,
+            "overlap": TILE_OVERLAP,
+            "nms_iou": TILE_NMS_IOU,
+        }
+    inference_key = _digest(inference)
+
+    return {
+        "inference": inference_key,
+        "tracks": _digest({
+            "inference": inference_key,
+            "enabled": TRACKING_ENABLED,
+            "iou": TRACK_IOU_THRESHOLD,
+            "max_gap": TRACK_MAX_GAP,
+            "sample_interval": TRACK_SAMPLE_INTERVAL,
+            "min_detections": TRACK_MIN_DETECTIONS,
+        }),
+        "video": _digest({
+            "inference": inference_key,
+            "preset": RENDER_PRESET,
+            "crf": RENDER_CRF,
+            "box_thickness": RENDER_BOX_THICKNESS,
+            "font_scale": RENDER_FONT_SCALE,
+            "color_by_label": RENDER_COLOR_BY_LABEL,
+            "label_colors": RENDER_LABEL_COLORS,
+        }),
+        "heatmap": _digest({
+            "inference": inference_key,
+            "background_alpha": HEATMAP_BACKGROUND_ALPHA,
+            "overlay_weight": HEATMAP_OVERLAY_WEIGHT,
+            "min_intensity": HEATMAP_MIN_INTENSITY,
+        }),
+    }
+
+def plan_stages(video_name: str, blob, force: bool = False):
+    """Etapas a ejecutar para un video y sus claves esperadas: (conjunto de etapas, versiones)"""
+    versions = expected_versions(video_name, blob)
+    if force:
+        return set(STAGES), versions
+
+    state = get_video_versions(video_name)
+    if not state:
+        return set(STAGES), versions
+
+    stored = state["versions"]
+    stale = {stage for stage in STAGES if stored.get(stage) != versions[stage]}
+    if not state["has_detections"]:
+        stale.add("inference")
+    if not state["processed_video_path"]:
+        stale.add("video")
+    if not state["heatmap_path"]:
+        stale.add("heatmap")
+    if "inference" in stale:
+        stale = set(STAGES)
+    return stale, versions
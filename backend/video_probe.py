@@ -0,0 +1,116 @@
+import json
+import bisect
+import logging
+import subprocess
+from fractions import Fraction
+
+logger = logging.getLogger(__name__)
+
+def _parse_rate(rate: str):
+    """Convertir una tasa de ffprobe ("30000/1001") a float"""
+    try:
+        value = float(Fraction(rate))
+        return value if value > 0 else None
+    except (ValueError, ZeroDivisionError, TypeError):
+        return None
+
+def _ffprobe(args):
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0'] + args,
+        check=True, capture_output=True, text=True
+    )
+    return result.stdout
+
+def _probe_with_ffprobe(video_path: str):
+    stream_info = json.loads(_ffprobe([
+        '-show_entries', 'stream=codec_name,width,height,avg_frame_rate,r_frame_rate,nb_frames,duration,start_time',
+        '-of', 'json', video_path
+    ]))["streams"][0]
+
+    fps = _parse_rate(stream_info.get("avg_frame_rate")) or _parse_rate(stream_info.get("r_frame_rate"))
+    start_time = float(stream_info.get("start_time") or 0)
+
+    # Leer solo los paquetes (sin decodificar) para obtener los keyframes y el total de frames
+    packets = _ffprobe(['-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path])
+    keyframes = []
+    packet_count = 0
+    for line in packets.splitlines():
+        parts = line.strip().split(',')
+        if len(parts) < 2 or parts[0] in ('', 'N/A'):
+            continue
+        packet_count += 1
+        if 'K' in parts[1] and fps:
+            keyframes.append(int(round((float(parts[0]) - start_time) * fps)))
+    keyframes = sorted(set(keyframes))
+
+    frame_count = int(stream_info["nb_frames"]) if stream_info.get("nb_frames", "N/A") != "N/A" else packet_count
+    duration = float(stream_info["duration"]) if stream_info.get("duration", "N/A") != "N/A" else None
+    if duration is None and fps:
+        duration = frame_count / fps
+
+    return {
+        "fps": fps,
+        "frame_count": frame_count,
+        "duration": duration,
+        "codec": stream_info.get("codec_name"),
+        "width": int(stream_info.get("width") or 0),
+        "height": int(stream_info.get("height") or 0),
+        "keyframes": keyframes
+    }
+
+def _probe_with_opencv(video_path: str):
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise Exception("Could not open video")
+        fps = cap.get(cv2.CAP_PROP_FPS) or None
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        return {
+            "fps": fps,
+            "frame_count": frame_count,
+            "duration": frame_count / fps if fps else None,
+            "codec": "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip() or None,
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "keyframes": []
+        }
+    finally:
+        cap.release()
+
+def probe_video(video_path) -> dict:
+    """Obtener fps real, número de frames, duración, codec, resolución e índice de keyframes"""
+    try:
+        return _probe_with_ffprobe(str(video_path))
+    except (FileNotFoundError, subprocess.CalledProcessError, KeyError, IndexError, ValueError) as e:
+        logger.warning(f"ffprobe no disponible o falló ({str(e)}), usando OpenCV")
+        return _probe_with_opencv(str(video_path))
+
+def nearest_keyframe(keyframes, frame: int) -> int:
+    """Keyframe más cercano anterior o igual a un frame (inicio de su GOP)"""
+    index = bisect.bisect_right(keyframes or [], frame) - 1
+    return keyframes[index] if index >= 0 else 0
+
+def frame_to_timestamp(frame: int, fps) -> float:
+    """Convertir un número de frame a segundos"""
+    return frame / fps if fps else 0.0
+
+def read_frame(video_path, frame: int, keyframes=None):
+    """Leer un frame saltando directamente a su GOP y decodificando solo desde el keyframe"""
+    import cv2
+
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        if not cap.isOpened():
+            return None
+        start = nearest_keyframe(keyframes, frame) if keyframes else frame
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        for _ in range(frame - start):
+            if not cap.grab():
+                return None
+        ret, image = cap.read()
+        return image if ret else None
+    finally:
+        cap.release()
@@ -1,27 +1,24 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File
+from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File, Query
 from fastapi.responses import JSONResponse, StreamingResponse
-from google.cloud import storage
+from pydantic import BaseModel
+from typing import List, Optional
 import os
-import json
-import cv2
-import numpy as np
 import asyncio
 import logging
 from config import *
-from database import insert_or_update_video_data, get_video_data
-from ultralytics import YOLO
-import subprocess
-from heatmap import generate_heatmap_background
-import io
+from database import get_video_data, get_video_probe
+from video_probe import nearest_keyframe, frame_to_timestamp
+from serialization import ORJSONResponse
+from catalog import get_catalog_page, catalog_size, record_video
+from batch import submit_batch, load_batch_status, resolve_videos
+from versioning import STAGES, plan_stages
+from metrics import JOBS, QUEUE_DEPTH
+from profiling import JobProfiler, current_profiler, profiled
+from jobs import job_registry, current_job, JobRejected, JobInterrupted
+from gcs import get_blob, buckets_ready, iter_blob_chunks, list_blobs, upload_bytes, NotFound
 
 logger = logging.getLogger(__name__)
-video_router = APIRouter()
-
-# Inicializar cliente de Google Cloud Storage
-storage_client = storage.Client()
-original_bucket = storage_client.bucket(ORIGINAL_VIDEOS_BUCKET)
-processed_bucket = storage_client.bucket(PROCESSED_VIDEOS_BUCKET)
-heatmaps_bucket = storage_client.bucket(HEATMAPS_BUCKET)
+video_router = APIRouter(default_response_class=ORJSONResponse)
 
 class ProcessingStatus:
     def __init__(self):
@@ -38,6 +35,21 @@ class ProcessingStatus:
                     "step": step
                 }
 
+    async def start(self, video_name: str, step: str = "starting"):
+        """Reiniciar el progreso al lanzar un (re)procesado"""
+        async with self._lock:
+            self.status[video_name] = {"status": "processing", "progress": 0, "step": step}
+
+    async def fail(self, video_name: str, step: str, message: str = None, status: str = "error"):
+        """Marcar el trabajo como terminado sin éxito ('error' o 'interrupted'), sea cual sea su progreso"""
+        async with self._lock:
+            self.status[video_name] = {
+                "status": status,
+                "progress": -1,
+                "step": step,
+                "message": message or step
+            }
+
     async def get_progress(self, video_name: str):
         async with self._lock:
             if video_name not in self.status:
@@ -61,11 +73,26 @@ class ProcessingStatus:
 processing_status = ProcessingStatus()
 
 @video_router.get("/available-videos")
-async def get_available_videos():
+def get_available_videos(
+    limit: int = Query(CATALOG_PAGE_SIZE, ge=1, le=CATALOG_MAX_PAGE_SIZE),
+    cursor: str = None,
+    sort: str = Query("name", pattern="^(name|size|duration|updated)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$")
+):
+    """Listar videos desde el catálogo en Postgres con paginación por cursor"""
     try:
-        blobs = list(storage_client.list_blobs(ORIGINAL_VIDEOS_BUCKET))
-        videos = [blob.name for blob in blobs if blob.name.lower().endswith(tuple(ALLOWED_EXTENSIONS))]
-        return {"videos": videos}
+        items, next_cursor = get_catalog_page(limit, sort=sort, descending=order == "desc", cursor=cursor)
+        response = {
+            "videos": [item["video_name"] for item in items],
+            "items": items,
+            "next_cursor": next_cursor
+        }
+        # El total solo se calcula en la primera página; las siguientes lo reutilizan
+        if cursor is None:
+            response["total"] = catalog_size()
+        return response
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting available videos: {str(e)}")
         return JSONResponse(
@@ -98,11 +125,8 @@ async def upload_video(file: UploadFile = File(...)):
             )
 
         # Subir a GCS usando BytesIO
-        blob = original_bucket.blob(file.filename)
-        blob.upload_from_string(
-            content,
-            content_type='video/mp4'
-        )
+        blob = upload_bytes(ORIGINAL_VIDEOS_BUCKET, file.filename, content, content_type='video/mp4')
+        record_video(file.filename, size_bytes=file_size, generation=blob.generation, state="uploaded")
 
         return JSONResponse(
             status_code=200,
@@ -113,130 +137,215 @@ async def upload_video(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @video_router.get("/process/{video_name}")
-async def process_video(video_name: str, background_tasks: BackgroundTasks):
+async def process_video(video_name: str, background_tasks: BackgroundTasks, force: bool = False, profile: bool = PROFILE_JOBS):
     try:
         logger.info(f"Processing request for video: {video_name}")
 
-        # Verificar si el video existe en GCS
-        if not original_bucket.blob(video_name).exists():
+        # Obtener metadatos del video en GCS (una sola consulta que se reutiliza en el trabajo)
+        blob = get_blob(ORIGINAL_VIDEOS_BUCKET, video_name)
+        if blob is None:
             raise HTTPException(status_code=404, detail="Video not found in storage")
 
         # Verificar si ya está en proceso
         current_status = await processing_status.get_progress(video_name)
         if current_status["status"] == "processing":
             return current_status
-        
-        # Verificar base de datos
-        video_data = get_video_data(video_name)
-        logger.info(f"Video data from DB: {video_data}")
 
-        # Verificar si ya está procesado en la base de datos
-        video_data = get_video_data(video_name)
-        if video_data and video_data.get("processed_video_path"):
+        # Comparar las versiones guardadas con (contenido, modelo, umbral, configuración)
+        stages, versions = plan_stages(video_name, blob, force=force)
+        if not stages:
+            video_data = get_video_data(video_name)
             return {
                 "status": "completed",
                 "progress": 100,
-                "step": "completed",
+                "step": "up_to_date",
                 "processed_video_path": video_data["processed_video_path"],
                 "heatmap_path": video_data["heatmap_path"]
             }
+        logger.info(f"Stages to run for {video_name}: {sorted(stages)}")
+
+        # Directorio temporal propio del trabajo (rechazado si el servidor se está cerrando o no hay disco)
+        workspace = job_registry.open(video_name, size_hint=blob.size or 0)
 
         # Iniciar procesamiento
+        await processing_status.start(video_name)
+        QUEUE_DEPTH.labels("jobs").inc()
         background_tasks.add_task(
             process_video_background,
-            video_name
+            video_name,
+            blob,
+            stages,
+            versions,
+            profile,
+            workspace
         )
 
         return {
             "status": "processing",
             "progress": 0,
-            "step": "starting"
+            "step": "starting",
+            "stages": sorted(stages),
+            "profile": profile
         }
 
+    except HTTPException:
+        raise
+    except JobRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     except Exception as e:
         logger.error(f"Error in process_video: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_video_background(video_name: str):
-    temp_video_path = TEMP_DIR / video_name
-    temp_processed_path = TEMP_DIR / f"processed_{video_name}"
+async def process_video_background(video_name: str, blob=None, stages=None, versions=None, profile: bool = PROFILE_JOBS, workspace=None):
+    """Ejecutar un trabajo; con profile, el perfil (pilas plegadas + resumen) se sube junto a sus salidas"""
+    if not profile:
+        return await run_video_job(video_name, blob, stages, versions, workspace)
+
+    profiler = JobProfiler(video_name).start()
+    token = current_profiler.set(profiler)
+    try:
+        return await run_video_job(video_name, blob, stages, versions, workspace)
+    finally:
+        current_profiler.reset(token)
+        profiler.stop()
+        try:
+            paths = await asyncio.to_thread(profiler.upload, video_name)
+            logger.info(f"Profile for {video_name} stored at {paths['summary']}")
+        except Exception as e:
+            logger.error(f"Error uploading profile for {video_name}: {str(e)}")
+
+@profiled("process_video_background")
+async def run_video_job(video_name: str, blob=None, stages=None, versions=None, workspace=None):
+    """Ejecutar las etapas pendientes; sin inferencia se reutilizan las detecciones guardadas"""
+    workspace = workspace or job_registry.open(video_name, size_hint=(blob.size or 0) if blob is not None else 0)
+    token = current_job.set(workspace)
+    temp_video_path = workspace.path(video_name)
+    temp_processed_path = workspace.path(f"processed_{video_name}")
+    stages = set(STAGES) if stages is None else set(stages)
+    finished = True
 
     try:
         logger.info(f"Starting processing for {video_name}")
-        logger.info(f"Checking GCS buckets...")
-        
-        # Verificar buckets
-        if not original_bucket.exists():
-            logger.error("Original bucket doesn't exist")
-            return
-        if not processed_bucket.exists():
-            logger.error("Processed bucket doesn't exist")
-            return
-        if not heatmaps_bucket.exists():
-            logger.error("Heatmaps bucket doesn't exist")
-            return
-            
-        # Verificar existencia del video en bucket original
-        blob = original_bucket.blob(video_name)
-        if not blob.exists():
-            logger.error(f"Video {video_name} not found in original bucket")
+
+        # Verificar buckets (validados una vez al inicio)
+        if not buckets_ready([ORIGINAL_VIDEOS_BUCKET, PROCESSED_VIDEOS_BUCKET, HEATMAPS_BUCKET]):
+            logger.error("One or more GCS buckets don't exist")
+            JOBS.labels("failed").inc()
+            await processing_status.fail(video_name, "storage_unavailable", "Storage buckets are not available")
             return
-    
- 
-        # Descargar video original de GCS
-        logger.info(f"Downloading video {video_name} from GCS")
-        blob = original_bucket.blob(video_name)
-        blob.download_to_filename(str(temp_video_path))
-
-        # Generar metadata
-        await processing_status.set_progress(video_name, 0, "generating_metadata")
-        metadata = generate_metadata(str(temp_video_path))
-        
-        # Guardar metadata en PostgreSQL
-        insert_or_update_video_data(video_name, metadata=json.dumps(metadata))
-        await processing_status.set_progress(video_name, 33, "metadata_complete")
-
-        # Procesar video
-        await processing_status.set_progress(video_name, 33, "processing_video")
-        await process_video_with_metadata(temp_video_path, temp_processed_path, metadata)
-
-        # Subir video procesado a GCS
-        processed_blob = processed_bucket.blob(f"processed_{video_name}")
-        processed_blob.upload_from_filename(str(temp_processed_path))
-        gcs_processed_path = f"gs://{PROCESSED_VIDEOS_BUCKET}/processed_{video_name}"
-        
-        # Actualizar base de datos con la ruta del video procesado
-        insert_or_update_video_data(video_name, processed_video_path=gcs_processed_path)
+
+        # La pila de inferencia/OpenCV solo se importa en el proceso que ejecuta trabajos
+        from pipeline import fetch_video, prepare_detections, render_video, publish_heatmap, use_segments, analyze_and_render_segments
+
+        # Descargar video original de GCS y registrar sus propiedades reales
+        # (no hace falta si solo cambian los parámetros de seguimiento)
+        probe = None
+        if stages & {"inference", "video", "heatmap"}:
+            logger.info(f"Downloading video {video_name} from GCS")
+            try:
+                probe = fetch_video(video_name, temp_video_path, blob)
+            except NotFound:
+                logger.error(f"Video {video_name} not found in original bucket")
+                JOBS.labels("failed").inc()
+                await processing_status.fail(video_name, "video_not_found", f"Video {video_name} not found in storage")
+                return
+            workspace.check_quota()
+
+        if probe and use_segments(stages, probe):
+            # Videos largos: detección y anotación por segmentos en procesos paralelos
+            await processing_status.set_progress(video_name, 1, "processing_segments")
+            detections = await asyncio.to_thread(
+                analyze_and_render_segments, video_name, temp_video_path, temp_processed_path, probe, versions
+            )
+        else:
+            # Generar metadata (o cargar la guardada si el modelo y la configuración no cambiaron)
+            await processing_status.set_progress(video_name, 1, "generating_metadata" if "inference" in stages else "loading_metadata")
+            detections = await asyncio.to_thread(prepare_detections, video_name, temp_video_path, stages, versions)
+            await processing_status.set_progress(video_name, 33, "metadata_complete")
+
+            # Procesar video y subirlo a GCS
+            if "video" in stages:
+                await processing_status.set_progress(video_name, 34, "processing_video")
+                await render_video(video_name, temp_video_path, temp_processed_path, detections, probe, versions)
+                workspace.check_quota()
         await processing_status.set_progress(video_name, 66, "video_complete")
 
         # Generar y subir heatmap
-        await processing_status.set_progress(video_name, 66, "generating_heatmap")
-        heatmap_path = await generate_heatmap_background(video_name, metadata)
-        
-        if heatmap_path and os.path.exists(heatmap_path):
-            # Subir heatmap a GCS
-            heatmap_blob = heatmaps_bucket.blob(f"heatmap_{video_name.replace('.mp4', '.png')}")
-            heatmap_blob.upload_from_filename(str(heatmap_path))
-            gcs_heatmap_path = f"gs://{HEATMAPS_BUCKET}/heatmap_{video_name.replace('.mp4', '.png')}"
-            
-            # Actualizar base de datos con la ruta del heatmap
-            insert_or_update_video_data(video_name, heatmap_path=gcs_heatmap_path)
-            
-            # Limpiar archivo temporal del heatmap
-            os.remove(str(heatmap_path))
+        if "heatmap" in stages:
+            await processing_status.set_progress(video_name, 67, "generating_heatmap")
+            await publish_heatmap(video_name, temp_video_path, probe, detections, versions)
 
+        record_video(video_name, state="processed")
         await processing_status.set_progress(video_name, 100, "completed")
-
+        JOBS.labels("processed").inc()
+
+    except JobInterrupted as e:
+        # Cierre del servidor: la inferencia dejó un checkpoint y lo ya guardado no se repite
+        logger.warning(f"Processing of {video_name} interrupted by shutdown: {str(e)}")
+        JOBS.labels("interrupted").inc()
+        record_video(video_name, state="interrupted")
+        await processing_status.fail(video_name, "interrupted", "Processing interrupted by a server shutdown; process the video again to resume", status="interrupted")
+    except asyncio.CancelledError:
+        # Tarea cancelada sin drenar: un hilo del trabajo puede seguir escribiendo en su directorio
+        workspace.interrupt()
+        finished = False
+        await processing_status.fail(video_name, "interrupted", "Processing was cancelled", status="interrupted")
+        raise
     except Exception as e:
         logger.error(f"Error in background processing: {str(e)}")
-        await processing_status.set_progress(video_name, -1, f"error: {str(e)}")
+        JOBS.labels("failed").inc()
+        record_video(video_name, state="error")
+        await processing_status.fail(video_name, "error", str(e))
         raise
     finally:
-        # Limpiar archivos temporales
-        if os.path.exists(str(temp_video_path)):
-            os.remove(str(temp_video_path))
-        if os.path.exists(str(temp_processed_path)):
-            os.remove(str(temp_processed_path))
+        current_job.reset(token)
+        QUEUE_DEPTH.labels("jobs").dec()
+        # Limpiar solo el directorio de este trabajo
+        job_registry.close(workspace, remove=finished)
+
+class BatchRequest(BaseModel):
+    videos: Optional[List[str]] = None
+    prefix: Optional[str] = None
+    force: bool = False
+
+@video_router.post("/batch")
+def create_batch(request: BatchRequest):
+    """Encolar un lote de videos (lista y/o prefijo); lo procesan los procesos `batch.py worker`"""
+    try:
+        if not request.videos and request.prefix is None:
+            raise HTTPException(status_code=400, detail="Provide a list of videos or a prefix")
+        job_registry.check_accepting()
+
+        videos = resolve_videos(request.videos, request.prefix)
+        if not videos:
+            raise HTTPException(status_code=404, detail="No videos matched")
+        if len(videos) > BATCH_MAX_VIDEOS:
+            raise HTTPException(status_code=400, detail=f"Batch exceeds maximum of {BATCH_MAX_VIDEOS} videos")
+
+        batch_id = submit_batch(videos, force=request.force)
+        return load_batch_status(batch_id)
+
+    except HTTPException:
+        raise
+    except JobRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+    except Exception as e:
+        logger.error(f"Error creating batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@video_router.get("/batch/{batch_id}")
+def get_batch_status(batch_id: str, include_videos: bool = True):
+    """Progreso del lote, throughput agregado y ETA (desde PostgreSQL, igual en cualquier worker)"""
+    try:
+        status = load_batch_status(batch_id, include_videos=include_videos)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        return status
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting batch {batch_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @video_router.get("/stream/{video_name}")
 async def stream_video(video_name: str):
@@ -246,33 +355,76 @@ async def stream_video(video_name: str):
         
         if video_data and video_data.get("processed_video_path"):
             # Extraer nombre del blob de la ruta GCS
+            bucket_name = PROCESSED_VIDEOS_BUCKET
             blob_name = video_data["processed_video_path"].split('/')[-1]
-            blob = processed_bucket.blob(blob_name)
         else:
             # Usar video original
-            blob = original_bucket.blob(video_name)
+            bucket_name = ORIGINAL_VIDEOS_BUCKET
+            blob_name = video_name
 
-        if not blob.exists():
+        # Configurar streaming por rangos (el primer rango detecta si el video no existe)
+        try:
+            chunks = iter_blob_chunks(bucket_name, blob_name)
+        except NotFound:
             raise HTTPException(status_code=404, detail="Video not found")
 
-        # Configurar streaming
-        def generate():
-            download_stream = blob.download_as_bytes()
-            yield download_stream
-
         return StreamingResponse(
-            generate(),
+            chunks,
             media_type="video/mp4",
             headers={
                 "Accept-Ranges": "bytes",
-                "Content-Disposition": f'attachment; filename="{blob.name}"'
+                "Content-Disposition": f'attachment; filename="{blob_name}"'
             }
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error streaming video: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@video_router.get("/profile/{video_name}")
+def get_video_profile(video_name: str, format: str = Query("json", pattern="^(json|folded)$")):
+    """Último perfil de procesamiento del video: resumen JSON o pilas plegadas para un flamegraph"""
+    try:
+        suffix = f".{format}"
+        names = [
+            blob.name for blob in list_blobs(PROCESSED_VIDEOS_BUCKET, prefix=f"{PROFILE_PREFIX}/{video_name}/")
+            if blob.name.endswith(suffix)
+        ]
+        if not names:
+            raise HTTPException(status_code=404, detail="Profile not found")
+
+        # Los nombres llevan la marca de tiempo UTC del trabajo: el mayor es el más reciente
+        blob_name = max(names)
+        return StreamingResponse(
+            iter_blob_chunks(PROCESSED_VIDEOS_BUCKET, blob_name),
+            media_type="application/json" if format == "json" else "text/plain",
+            headers={"Content-Disposition": f'attachment; filename="{os.path.basename(blob_name)}"'}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting profile: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@video_router.get("/seek/{video_name}")
+def seek_to_frame(video_name: str, frame: int = Query(..., ge=0)):
+    """Resolver un frame de detección a su timestamp y al keyframe de inicio de su GOP"""
+    probe = get_video_probe(video_name, include_keyframes=True)
+    if not probe:
+        raise HTTPException(status_code=404, detail="Video probe not found")
+
+    keyframe = nearest_keyframe(probe["keyframes"], frame)
+    return {
+        "frame": frame,
+        "timestamp": frame_to_timestamp(frame, probe["fps"]),
+        "keyframe": keyframe,
+        "keyframe_timestamp": frame_to_timestamp(keyframe, probe["fps"]),
+        "fps": probe["fps"]
+    }
+
 @video_router.get("/status/{video_name}")
 async def get_processing_status(video_name: str):
     try:
@@ -292,144 +444,32 @@ async def get_processing_status(video_name: str):
         logger.error(f"Error getting status: {str(e)}")
         return {"status": "error", "message": str(e)}
 
-def generate_metadata(video_path: str):
-    """Generar metadata para el video usando YOLO"""
-    model = YOLO(str(MODEL_PATH))
-    cap = cv2.VideoCapture(str(video_path))
-    if not cap.isOpened():
-        raise Exception("Could not open video")
-
-    metadata = []
-    frame_count = 0
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        results = model(frame)
-        detections = []
-
-        for r in results[0]:
-            for box, cls, conf in zip(r.boxes.xyxy, r.boxes.cls, r.boxes.conf):
-                if conf > 0.3:
-                    coords = box.cpu().numpy()
-                    detections.append({
-                        "label": model.names[int(cls)],
-                        "confidence": float(conf),
-                        "coordinates": [[int(c) for c in coords]]
-                    })
-
-        if detections:
-            metadata.append({
-                "frame": frame_count,
-                "objects": detections
-            })
-
-        frame_count += 1
-
-    cap.release()
-    return metadata
-
-async def process_video_with_metadata(input_path, output_path, metadata):
-    """Procesar video añadiendo las detecciones"""
-    cap = cv2.VideoCapture(str(input_path))
-    if not cap.isOpened():
-        raise Exception("Could not open video for processing")
-
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-    temp_output = str(output_path).replace('.mp4', '_temp.mp4')
-    
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    writer = cv2.VideoWriter(temp_output, fourcc, fps, (width, height))
-
-    frame_count = 0
-    try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            frame_metadata = next((m for m in metadata if m["frame"] == frame_count), None)
-            
-            if frame_metadata:
-                for obj in frame_metadata["objects"]:
-                    try:
-                        x1, y1, x2, y2 = map(int, obj["coordinates"][0])
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        cv2.putText(frame, f"{obj['label']} {obj['confidence']:.2f}",
-                                 (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                    except (ValueError, IndexError) as e:
-                        logger.error(f"Error drawing detection: {str(e)}")
-                        continue
-
-            writer.write(frame)
-            frame_count += 1
-
-    finally:
-        cap.release()
-        writer.release()
-
-    try:
-        # Convertir video temporal a MP4 compatible con web
-        subprocess.run([
-            'ffmpeg', '-i', temp_output,
-            '-c:v', 'libx264',
-            '-preset', 'ultrafast',
-            '-crf', '28',
-            '-movflags', '+faststart',
-            '-pix_fmt', 'yuv420p',
-            str(output_path)
-        ], check=True)
-        
-        # Limpiar archivo temporal
-        if os.path.exists(temp_output):
-            os.remove(temp_output)
-            
-    except subprocess.CalledProcessError as e:
-        raise Exception(f"Error converting video: {str(e)}")
-    except Exception as e:
-        raise Exception(f"Unexpected error: {str(e)}")
-
-    if not os.path.exists(str(output_path)):
-        raise Exception("Processed video file was not generated")
-        
-    if os.path.getsize(str(output_path)) == 0:
-        os.remove(str(output_path))
-        raise Exception("Generated video file is empty")
-        
-    return str(output_path)
-
+@video_router.get("/live/{video_name}")
 @video_router.get("/rtsp/stream/{video_name}")
-async def stream_frame(video_name: str):
+async def live_stream(video_name: str):
+    """Vista en vivo MJPEG con las detecciones dibujadas; los espectadores de un video comparten el decode"""
     try:
-        video_data = get_video_data(video_name)
-        if video_data and video_data.get("processed_video_path"):
-            # Usar video procesado si existe
-            blob_name = video_data["processed_video_path"].split('/')[-1]
-            blob = processed_bucket.blob(blob_name)
-        else:
-            # Usar video original
-            blob = original_bucket.blob(video_name)
+        # OpenCV solo se importa en el worker que sirve la vista en vivo
+        from live import live_hub, BOUNDARY
 
-        if not blob.exists():
+        try:
+            channel = await live_hub.open(video_name)
+        except NotFound:
             raise HTTPException(status_code=404, detail="Video not found")
+        if channel is None:
+            raise HTTPException(status_code=503, detail="Too many live streams on this worker")
 
-        # Descargar el contenido
-        content = blob.download_as_bytes()
-        
         return StreamingResponse(
-            io.BytesIO(content),
-            media_type="video/mp4",
+            channel.mjpeg(),
+            media_type=f"multipart/x-mixed-replace; boundary={BOUNDARY}",
             headers={
                 "Cache-Control": "no-cache",
-                "Access-Control-Allow-Origin": "*"
+                "X-Accel-Buffering": "no"
             }
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error streaming frame: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        logger.error(f"Error starting live stream: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,9 @@
 const API_URL = 'http://35.226.34.108';
 
+// Videos por página al recorrer el catálogo (máximo del backend: CATALOG_MAX_PAGE_SIZE)
+const CATALOG_PAGE_LIMIT = 1000;
+
 let processingMonitorInterval = null;
-let streamInterval = null;
 let currentProgress = 0;
 
 // Event Listeners
@@ -80,24 +82,33 @@ async function uploadVideo() {
 
 async function loadVideoList() {
     try {
-        const response = await fetch(`${API_URL}/api/videos/available-videos`);
-        if (!response.ok) throw new Error('Error al obtener la lista de videos');
-        const data = await response.json();
-        
         const select = document.getElementById('video-select');
         select.innerHTML = '<option value="">Seleccione un video</option>';
-        
-        if (data.videos && Array.isArray(data.videos)) {
-            data.videos.forEach(video => {
-                const option = document.createElement('option');
-                option.value = video;
-                option.textContent = video;
-                select.appendChild(option);
-            });
-        }
+
+        // El catálogo se sirve por páginas: seguir next_cursor hasta la última
+        let cursor = null;
+        let total = null;
+        do {
+            const params = new URLSearchParams({ limit: CATALOG_PAGE_LIMIT });
+            if (cursor) params.set('cursor', cursor);
+            const response = await fetch(`${API_URL}/api/videos/available-videos?${params}`);
+            if (!response.ok) throw new Error('Error al obtener la lista de videos');
+            const data = await response.json();
+
+            if (total === null && typeof data.total === 'number') total = data.total;
+            if (data.videos && Array.isArray(data.videos)) {
+                data.videos.forEach(video => {
+                    const option = document.createElement('option');
+                    option.value = video;
+                    option.textContent = video;
+                    select.appendChild(option);
+                });
+            }
+            cursor = data.next_cursor;
+        } while (cursor);
 
         // Actualizar estadísticas
-        updateStorageInfo();
+        updateStorageInfo(total);
     } catch (error) {
         console.error('Error:', error);
         showError('Error al cargar la lista de videos: ' + error.message);
@@ -156,7 +167,7 @@ function startProgressMonitoring(videoName) {
             const response = await fetch(`${API_URL}/api/videos/status/${videoName}`);
             const data = await response.json();
 
-            if (data.status === 'error') {
+            if (data.status === 'error' || data.status === 'interrupted') {
                 clearInterval(processingMonitorInterval);
                 showError(data.message || 'Error en el procesamiento');
                 hideProgress();
@@ -367,27 +378,14 @@ async function startStreamSimulation() {
         streamButton.style.display = 'none';
         stopStreamButton.style.display = 'inline-block';
 
-        streamInterval = setInterval(async () => {
-            try {
-                const response = await fetch(`${API_URL}/api/videos/rtsp/stream/${videoName}?t=${Date.now()}`);
-                if (!response.ok) throw new Error('Error en el stream');
-                
-                const blob = await response.blob();
-                const url = URL.createObjectURL(blob);
-                
-                // Liberar URL anterior si existe
-                if (streamView.src) {
-                    URL.revokeObjectURL(streamView.src);
-                }
-                
-                streamView.src = url;
-                streamView.classList.remove('loading-stream');
-            } catch (error) {
-                console.error('Error en stream:', error);
-                stopStreamSimulation();
-                showError('Error en el streaming: ' + error.message);
-            }
-        }, 100);
+        // Stream MJPEG: el navegador reemplaza la imagen con cada frame recibido por la misma conexión
+        streamView.onload = () => streamView.classList.remove('loading-stream');
+        streamView.onerror = () => {
+            console.error('Error en stream');
+            stopStreamSimulation();
+            showError('Error en el streaming');
+        };
+        streamView.src = `${API_URL}/api/videos/live/${videoName}`;
     } catch (error) {
         console.error('Error iniciando stream:', error);
         showError('Error iniciando el streaming');
@@ -395,15 +393,13 @@ async function startStreamSimulation() {
 }
 
 function stopStreamSimulation() {
-    if (streamInterval) {
-        clearInterval(streamInterval);
-        streamInterval = null;
-    }
-
     const streamView = document.getElementById('stream-view');
     const streamButton = document.getElementById('stream-button');
     const stopStreamButton = document.getElementById('stop-stream-button');
 
+    // Cerrar la conexión del stream
+    streamView.onerror = null;
+    streamView.removeAttribute('src');
     streamView.style.display = 'none';
     streamView.classList.remove('loading-stream');
     streamButton.style.display = 'inline-block';
@@ -423,7 +419,9 @@ async function loadVideoObjects(videoName) {
             data.objects.forEach(obj => {
                 const option = document.createElement('option');
                 option.value = obj.label;
-                option.textContent = `${obj.label} (${obj.total_detections} detecciones)`;
+                option.textContent = obj.tracks && obj.tracks.length
+                    ? `${obj.label} (${obj.total_tracks} objetos, ${obj.total_detections} detecciones)`
+                    : `${obj.label} (${obj.total_detections} detecciones)`;
                 objectSelect.appendChild(option);
             });
         }
@@ -449,8 +447,34 @@ async function searchObjects() {
         
         if (data.status === 'found') {
             const objectData = data.objects.find(obj => obj.label === objectLabel);
-            if (objectData) {
-                const resultsHTML = objectData.occurrences.map(occurrence => `
+            if (objectData && objectData.tracks && objectData.tracks.length) {
+                // Un resultado por objeto seguido en lugar de uno por frame
+                const resultsHTML = objectData.tracks.map(track => `
+                    <div class="result-card">
+                        <div class="result-info">
+                            <span>Frames: ${track.start_frame} - ${track.end_frame}</span>
+                            <span>Tiempo: ${track.timestamp.toFixed(2)}s - ${track.end_timestamp.toFixed(2)}s</span>
+                            <span>Confianza: ${(track.average_confidence * 100).toFixed(1)}%</span>
+                        </div>
+                        <button class="jump-button" onclick="jumpToTimestamp(${track.timestamp})">
+                            Ir al momento
+                        </button>
+                    </div>
+                `).join('');
+
+                searchResults.innerHTML = `
+                    <h3>Resultados para "${objectLabel}"</h3>
+                    <div class="results-container">
+                        ${resultsHTML}
+                    </div>
+                `;
+            } else if (objectData) {
+                // Videos sin tracks: apariciones por frame solo de esta etiqueta
+                const occurrencesResponse = await fetch(
+                    `${API_URL}/api/metadata/objects/${videoName}/occurrences?label=${encodeURIComponent(objectLabel)}&format=json`
+                );
+                const occurrences = await occurrencesResponse.json();
+                const resultsHTML = occurrences.map(occurrence => `
                     <div class="result-card">
                         <div class="result-info">
                             <span>Frame: ${occurrence.frame}</span>
@@ -533,15 +557,13 @@ function clearDisplays() {
     if (processingMonitorInterval) {
         clearInterval(processingMonitorInterval);
     }
-    if (streamInterval) {
-        clearInterval(streamInterval);
-    }
-
     videoPlayer.style.display = 'none';
     videoPlayer.src = '';
     heatmapContainer.innerHTML = '';
     progressContainer.style.display = 'none';
     searchResults.innerHTML = '';
+    streamView.onerror = null;
+    streamView.removeAttribute('src');
     streamView.style.display = 'none';
     
     if (videoError) {
@@ -609,15 +631,18 @@ function updateProcessingTime() {
     }
 }
 
-async function updateStorageInfo() {
+async function updateStorageInfo(total) {
     try {
-        const response = await fetch(`${API_URL}/api/videos/available-videos`);
-        const data = await response.json();
-        
+        // Total del catálogo (no el tamaño de una página); se pide solo si no se conoce ya
+        if (typeof total !== 'number') {
+            const response = await fetch(`${API_URL}/api/videos/available-videos?limit=1`);
+            const data = await response.json();
+            total = typeof data.total === 'number' ? data.total : 0;
+        }
+
         const storageElement = document.getElementById('storage-info');
         if (storageElement) {
-            const totalVideos = data.videos ? data.videos.length : 0;
-            storageElement.textContent = `${totalVideos} videos almacenados`;
+            storageElement.textContent = `${total} videos almacenados`;
         }
     } catch (error) {
         console.error('Error actualizando información de almacenamiento:', error);